@@ -82,6 +82,7 @@ from sabnzbd.constants import (
     DEF_STD_CONFIG,
     DEF_LOG_CHERRY,
     CONFIG_BACKUP_HTTPS,
+    DEF_WEB_THREADS,
 )
 import sabnzbd.newsunpack
 from sabnzbd.misc import (
@@ -644,11 +645,17 @@ def get_webhost(web_host, web_port, https_port):
     return web_host, web_port, browserhost, https_port
 
 
+def web_thread_pool() -> int:
+    """Every event stream keeps a thread of the web server busy"""
+    return DEF_WEB_THREADS + sabnzbd.cfg.max_event_streams()
+
+
 def attach_server(host, port, cert=None, key=None, chain=None):
     """Define and attach server, optionally HTTPS"""
     if sabnzbd.cfg.ipv6_hosting() or "::1" not in host:
         http_server = cherrypy._cpserver.Server()
         http_server.bind_addr = (host, port)
+        http_server.thread_pool = web_thread_pool()
         if cert and key:
             http_server.ssl_module = "builtin"
             http_server.ssl_certificate = cert
@@ -1271,6 +1278,7 @@ def main():
             "server.socket_host": web_host,
             "server.socket_port": web_port,
             "server.shutdown_timeout": 0,
+            "server.thread_pool": web_thread_pool(),
             "engine.autoreload.on": False,
             "tools.encode.on": True,
             "tools.gzip.on": True,
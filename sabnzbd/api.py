@@ -27,9 +27,12 @@ import gc
 import socket
 import time
 import getpass
+import hashlib
+import itertools
 import cherrypy
-from threading import Thread
-from typing import Optional, Any, Union, Generator
+from collections import OrderedDict
+from threading import Thread, Lock
+from typing import Optional, Any, Union, Generator, Callable, Hashable, Iterable, Iterator
 
 # For json.dumps, orjson is magnitudes faster than ujson, but it is harder to
 # compile due to Rust dependency. Since the output is the same, we support all modules.
@@ -89,6 +92,7 @@ from sabnzbd.lang import is_rtl
 from sabnzbd.nzb import TryList, NzbObject
 from sabnzbd.newswrapper import NewsWrapper, NNTPPermanentError
 import sabnzbd.emailer
+import sabnzbd.events
 import sabnzbd.sorting
 
 ##############################################################################
@@ -104,6 +108,15 @@ _MSG_NO_PATH = "file does not exist"
 _MSG_OUTPUT_FORMAT = "Format not supported"
 _MSG_NO_SUCH_CONFIG = "Config item does not exist"
 _MSG_CONFIG_LOCKED = "Configuration locked"
+_MSG_MAX_EVENT_STREAMS = "Maximum number of event streams reached"
+
+# Number of recently sent queue and history responses to remember,
+# clients that have one of them can request only the changes since then
+API_SENT_SLOTS = 16
+
+# Responses with more slots are sent in chunks of this size, instead of building the full output first
+API_STREAM_SLOTS = 250
+API_STREAM_CHUNK_SIZE = 64 * KIBI
 
 
 def api_handler(kwargs: dict[str, Union[str, list[str]]]) -> bytes:
@@ -272,7 +285,7 @@ def _api_queue_sort(value: str, kwargs: dict[str, Union[str, list[str]]]) -> byt
 
 
 def _api_queue_default(value: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
-    """API: accepts sort, dir, start, limit and search terms"""
+    """API: accepts sort, dir, start, limit, since and search terms"""
     start = int_conv(kwargs.get("start"))
     limit = int_conv(kwargs.get("limit"))
     search = kwargs.get("search")
@@ -280,24 +293,28 @@ def _api_queue_default(value: str, kwargs: dict[str, Union[str, list[str]]]) ->
     priorities = clean_comma_separated_list(kwargs.get("priority"))
     statuses = clean_comma_separated_list(kwargs.get("status"))
     nzo_ids = clean_comma_separated_list(kwargs.get("nzo_ids"))
+    since = int_conv(kwargs.get("since"))
 
     if priorities:
         # Make sure it's an integer
         priorities = [int_conv(prio) for prio in priorities]
 
-    return report(
-        keyword="queue",
-        data=build_queue(
-            start=start,
-            limit=limit,
-            search=search,
-            categories=categories,
-            priorities=priorities,
-            statuses=statuses,
-            nzo_ids=nzo_ids,
-        ),
+    queue = build_queue(
+        start=start,
+        limit=limit,
+        search=search,
+        categories=categories,
+        priorities=priorities,
+        statuses=statuses,
+        nzo_ids=nzo_ids,
+        since=since,
     )
 
+    # The slots are represented by their version, so they don't have to be compared
+    if not_modified({key: value for key, value in queue.items() if key != "slots"}):
+        return b""
+    return report(keyword="queue", data=queue, stream=len(queue["slots"]) > API_STREAM_SLOTS)
+
 
 def _api_translate(name: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
     """API: accepts value(=acronym)"""
@@ -554,8 +571,10 @@ def _api_history_mark_as_completed(value: str, kwargs: dict[str, Union[str, list
 
 
 def _api_history_default(value: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
-    """API: accepts start, limit, search, failed_only, archive, cat, status, nzo_ids"""
+    """API: accepts start, after, limit, search, failed_only, archive, cat, status, nzo_ids, lean, since"""
     start = int_conv(kwargs.get("start"))
+    after = kwargs.get("after")
+    lean = bool_conv(kwargs.get("lean"))
     limit = int_conv(kwargs.get("limit"))
     last_history_update = int_conv(kwargs.get("last_history_update", 0))
     search = kwargs.get("search")
@@ -563,6 +582,7 @@ def _api_history_default(value: str, kwargs: dict[str, Union[str, list[str]]]) -
     statuses = clean_comma_separated_list(kwargs.get("status"))
     failed_only = bool_conv(kwargs.get("failed_only"))
     nzo_ids = clean_comma_separated_list(kwargs.get("nzo_ids"))
+    since = int_conv(kwargs.get("since"))
 
     # Snapshot the counter once to avoid racing with history_updated() calls
     # between the staleness check and the response — if the counter changes
@@ -574,6 +594,11 @@ def _api_history_default(value: str, kwargs: dict[str, Union[str, list[str]]]) -
     if last_history_update == current_history_update:
         return report(keyword="history", data=False)
 
+    # Jobs in post-processing are always sent, as their progress is not part of the history version
+    sums = sabnzbd.BPSMeter.get_sums()
+    if not sabnzbd.PostProcessor.history_queue and not_modified(current_history_update, sums):
+        return b""
+
     if failed_only:
         # We ignore any other statuses, having both doesn't make sense
         statuses = [Status.FAILED]
@@ -585,12 +610,12 @@ def _api_history_default(value: str, kwargs: dict[str, Union[str, list[str]]]) -
     archive = bool(int_conv(kwargs.get("archive")))
 
     history = {}
-    grand, month, week, day = sabnzbd.BPSMeter.get_sums()
+    grand, month, week, day = sums
     history["total_size"] = to_units(grand)
     history["month_size"] = to_units(month)
     history["week_size"] = to_units(week)
     history["day_size"] = to_units(day)
-    history["slots"], history["ppslots"], history["noofslots"] = build_history(
+    history["slots"], history["ppslots"], history["noofslots"], next_page = build_history(
         start=start,
         limit=limit,
         archive=archive,
@@ -598,17 +623,38 @@ def _api_history_default(value: str, kwargs: dict[str, Union[str, list[str]]]) -
         categories=categories,
         statuses=statuses,
         nzo_ids=nzo_ids,
+        after=after,
+        lean=lean,
+    )
+    history["next_page"] = lambda: next_page() or ""
+
+    params = (
+        start,
+        after,
+        lean,
+        limit,
+        search,
+        archive,
+        tuple(categories or ()),
+        tuple(statuses or ()),
+        tuple(nzo_ids or ()),
     )
+    add_streamed_slots(history, HISTORY_SLOTS, params, history["slots"], since)
+
     history["last_history_update"] = current_history_update
     history["version"] = sabnzbd.__version__
-    return report(keyword="history", data=history)
+    # The jobs are only read from the database while the output is made
+    page_size = min(limit, history["noofslots"]) if limit else history["noofslots"]
+    return report(keyword="history", data=history, stream=page_size > API_STREAM_SLOTS)
 
 
 def _api_get_files(name: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
     """API: accepts value(=nzo_id)"""
     value = kwargs.get("value")
     if value:
-        return report(keyword="files", data=build_file_list(value))
+        nzo = sabnzbd.NzbQueue.get_nzo(value)
+        number_of_files = len(nzo.finished_files) + len(nzo.files) if nzo else 0
+        return report(keyword="files", data=build_file_list(value), stream=number_of_files > API_STREAM_SLOTS)
     else:
         return report(_MSG_NO_VALUE)
 
@@ -743,6 +789,18 @@ def _api_showlog(name: str, kwargs: dict[str, Union[str, list[str]]]) -> Generat
             yield sanitize_line(line)
 
 
+def _api_events(name: str, kwargs: dict[str, Union[str, list[str]]]) -> Union[bytes, Generator[bytes, Any, None]]:
+    """API: accepts interval, streams the changes of the queue, speed, history and warnings"""
+    if not (client := sabnzbd.events.subscribe(int_conv(kwargs.get("interval")))):
+        return report(_MSG_MAX_EVENT_STREAMS)
+    cherrypy.response.headers["Content-Type"] = "text/event-stream"
+    cherrypy.response.headers["Cache-Control"] = "no-cache"
+    cherrypy.response.stream = True
+    # Prevent the gzip-tool from holding back the events
+    cherrypy.request.cached = True
+    return client.stream()
+
+
 def _api_get_cats(name: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
     return report(keyword="categories", data=list_cats(False))
 
@@ -823,7 +881,8 @@ def _api_rss_now(name: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
 
 def _api_retry_all(name: str, kwargs: dict[str, Union[str, list[str]]]) -> bytes:
     """API: Retry all failed items in History"""
-    items = sabnzbd.api.build_history()[0]
+    # Retrying changes the history, so first read all jobs
+    items = list(sabnzbd.api.build_history()[0])
     nzo_ids = []
     for item in items:
         if item["retry"]:
@@ -1059,6 +1118,7 @@ _api_table = {
     "resume": (_api_resume, 2),
     "shutdown": (_api_shutdown, 3),
     "warnings": (_api_warnings, 2),
+    "events": (_api_events, 2),
     "showlog": (_api_showlog, 3),
     "config": (_api_config, 2),
     "get_cats": (_api_get_cats, 2),
@@ -1142,12 +1202,18 @@ def api_level(mode: str, name: str) -> int:
     return 4
 
 
-def report(error: Optional[str] = None, keyword: str = "value", data: Optional[Any] = None) -> bytes:
+def report(
+    error: Optional[str] = None, keyword: str = "value", data: Optional[Any] = None, stream: bool = False
+) -> Union[bytes, Generator[bytes, None, None]]:
     """Report message in json, xml or plain text
     If error is set, only a status/error report is made.
     If no error and no data, only a status report is made.
     Else, a data report is made (optional 'keyword' for outer XML section).
+    With stream, the data report is returned in chunks as they are made.
     """
+    if not stream:
+        data = build_values(data)
+
     if cherrypy.request.params.get("output") == "xml":
         if not keyword:
             # xml always needs an outer keyword, even when json doesn't
@@ -1158,9 +1224,17 @@ def report(error: Optional[str] = None, keyword: str = "value", data: Optional[A
             status_str = xmlmaker.run("result", {"status": False, "error": error})
         elif data is None:
             status_str = xmlmaker.run("result", {"status": True})
+        elif stream:
+            status_str = xmlmaker.chunks(keyword, data)
         else:
             status_str = xmlmaker.run(keyword, data)
-        response = '<?xml version="1.0" encoding="UTF-8" ?>\n%s\n' % status_str
+
+        if isinstance(status_str, str):
+            response = '<?xml version="1.0" encoding="UTF-8" ?>\n%s\n' % status_str
+        else:
+            response = stream_chunks(
+                itertools.chain(('<?xml version="1.0" encoding="UTF-8" ?>\n',), status_str, ("\n",))
+            )
     else:
         content = "application/json;charset=UTF-8"
         if error:
@@ -1173,13 +1247,198 @@ def report(error: Optional[str] = None, keyword: str = "value", data: Optional[A
             else:
                 info = {keyword: data}
 
-        response = utob(json.dumps(info))
+        if stream and not error and data is not None:
+            response = stream_chunks(json_chunks(info))
+        else:
+            response = utob(json.dumps(info))
 
     cherrypy.response.headers["Content-Type"] = content
     cherrypy.response.headers["Pragma"] = "no-cache"
+    if isinstance(response, Generator):
+        cherrypy.response.stream = True
     return response
 
 
+def build_values(value: Any) -> Any:
+    """Build the lists and the values that are only made while streaming, in the same order"""
+    if isinstance(value, dict):
+        return {key: build_values(item) for key, item in value.items()}
+    elif isinstance(value, Iterator):
+        return list(value)
+    elif callable(value):
+        return value()
+    return value
+
+
+def json_chunks(value: Any) -> Generator[Union[str, bytes], None, None]:
+    """Same output as json.dumps, but the dicts and lists are made item by item.
+    Lists can be iterators and values that are only known after the previous items can be functions.
+    """
+    if callable(value):
+        yield from json_chunks(value())
+    elif isinstance(value, dict):
+        yield "{"
+        for position, (key, item) in enumerate(value.items()):
+            if position:
+                yield ","
+            yield json.dumps(str(key))
+            yield ":"
+            yield from json_chunks(item)
+        yield "}"
+    elif isinstance(value, (list, tuple, Iterator)):
+        yield "["
+        for position, item in enumerate(value):
+            if position:
+                yield ","
+            # The slots themselves are small enough to do at once
+            yield json.dumps(item)
+        yield "]"
+    else:
+        yield json.dumps(value)
+
+
+def stream_chunks(chunks: Iterable[Union[str, bytes]]) -> Generator[bytes, None, None]:
+    """Combine the small parts of the output to chunks of at least API_STREAM_CHUNK_SIZE"""
+    output = []
+    output_size = 0
+    for chunk in chunks:
+        chunk = utob(chunk)
+        output.append(chunk)
+        output_size += len(chunk)
+        if output_size >= API_STREAM_CHUNK_SIZE:
+            yield b"".join(output)
+            output = []
+            output_size = 0
+    if output:
+        yield b"".join(output)
+
+
+def not_modified(*state: Any) -> bool:
+    """Set the ETag based on the state the response is built from and the request parameters.
+    Returns True if the client already has this response, it then gets an empty 304 response.
+    """
+    etag = '"%s"' % hashlib.sha1(utob(repr((state, sorted(cherrypy.request.params.items()))))).hexdigest()
+    cherrypy.response.headers["ETag"] = etag
+    if_none_match = cherrypy.request.headers.get("If-None-Match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        cherrypy.response.status = 304
+        return True
+    return False
+
+
+class SentSlots:
+    """Remember the slots recently sent for the queue or history, so unchanged slots
+    don't have to be rebuilt and clients can request only the changes since their version.
+    Only a hash of the output of the slots of older versions is kept.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version: int = 0
+        # Per version the parameters of the request and the hash of the slots by nzo_id
+        self.sent: OrderedDict[int, tuple[Hashable, dict[str, int]]] = OrderedDict()
+        # Per request parameters the state the slots were built from, their version and the slots themselves
+        self.last: OrderedDict[Hashable, tuple[Hashable, int, Optional[list[dict[str, Any]]]]] = OrderedDict()
+
+    def get(
+        self, params: Hashable, state: Hashable, build_slots: Callable[[], list[dict[str, Any]]]
+    ) -> tuple[int, list[dict[str, Any]]]:
+        """Return the version and the slots, which are only built if the state changed"""
+        with self.lock:
+            if (last := self.last.get(params)) and last[0] == state and last[1] in self.sent and last[2] is not None:
+                return last[1], last[2]
+        slots = build_slots()
+        return self.add(params, slots, state), slots
+
+    def add(self, params: Hashable, slots: list[dict[str, Any]], state: Hashable = None) -> int:
+        """Remember the slots, the version only increases if they differ from the previous ones"""
+        return self.store(params, {slot["nzo_id"]: slot_hash(slot) for slot in slots}, state, slots)
+
+    def store(
+        self,
+        params: Hashable,
+        slot_hashes: dict[str, int],
+        state: Hashable = None,
+        slots: Optional[list[dict[str, Any]]] = None,
+    ) -> int:
+        """Remember the hashes of the slots, the slots themselves are only kept to be returned by get"""
+        with self.lock:
+            if (last := self.last.get(params)) and last[1] in self.sent and self.sent[last[1]][1] == slot_hashes:
+                version = last[1]
+            else:
+                self.version += 1
+                version = self.version
+                self.sent[version] = (params, slot_hashes)
+                while len(self.sent) > API_SENT_SLOTS:
+                    self.sent.popitem(last=False)
+            self.last[params] = (state, version, slots)
+            self.last.move_to_end(params)
+            while len(self.last) > API_SENT_SLOTS:
+                self.last.popitem(last=False)
+        return version
+
+    def sent_hashes(self, params: Hashable, version: int) -> Optional[dict[str, int]]:
+        """Return the hashes of the slots of a version, or None if that version is no longer known"""
+        with self.lock:
+            if version in self.sent and self.sent[version][0] == params:
+                return self.sent[version][1]
+        return None
+
+    def changes(
+        self, params: Hashable, since: int, version: int, slots: list[dict[str, Any]]
+    ) -> Optional[tuple[list[dict[str, Any]], list[str]]]:
+        """Return the slots that were added or changed since version `since` and the
+        nzo_id's of the removed slots, or None if that version is no longer known"""
+        old_slots = self.sent_hashes(params, since)
+        new_slots = self.sent_hashes(params, version)
+        if old_slots is None or new_slots is None:
+            return None
+        changed = [slot for slot in slots if old_slots.get(slot["nzo_id"]) != slot_hash(slot)]
+        removed = [nzo_id for nzo_id in old_slots if nzo_id not in new_slots]
+        return changed, removed
+
+
+def slot_hash(slot: dict[str, Any]) -> int:
+    """Slots are compared using the hash of their output"""
+    return hash(json.dumps(slot))
+
+
+QUEUE_SLOTS = SentSlots()
+HISTORY_SLOTS = SentSlots()
+
+
+def add_slot_changes(info: dict[str, Any], sent_slots: SentSlots, params: Hashable, since: int):
+    """Replace the slots by only the slots that changed since the version the client has,
+    if that version is unknown all slots are sent and "delta" is False"""
+    if (changes := sent_slots.changes(params, since, info["slots_version"], info["slots"])) is not None:
+        info["slots"], info["removed"] = changes
+        info["delta"] = True
+    else:
+        info["removed"] = []
+        info["delta"] = False
+
+
+def add_streamed_slots(
+    info: dict[str, Any], sent_slots: SentSlots, params: Hashable, slots: Iterable[dict[str, Any]], since: int
+):
+    """Same as SentSlots.add and add_slot_changes, but the slots are only remembered while they are sent.
+    The version and the removed slots are only known after that, so they are added as functions."""
+    old_slots = sent_slots.sent_hashes(params, since) if since else None
+    slot_hashes = {}
+
+    def send_slots() -> Generator[dict[str, Any], None, None]:
+        for slot in slots:
+            slot_hashes[slot["nzo_id"]] = current_hash = slot_hash(slot)
+            if old_slots is None or old_slots.get(slot["nzo_id"]) != current_hash:
+                yield slot
+
+    info["slots"] = send_slots()
+    info["slots_version"] = lambda: sent_slots.store(params, slot_hashes)
+    if since:
+        info["removed"] = lambda: [nzo_id for nzo_id in old_slots or () if nzo_id not in slot_hashes]
+        info["delta"] = old_slots is not None
+
+
 class XmlOutputFactory:
     """Recursive xml string maker. Feed it a mixed tuple/dict/item object and will output into an xml string
     Current limitations:
@@ -1202,20 +1461,23 @@ class XmlOutputFactory:
         else:
             return ""
 
+    def _list_item(self, keyw, cat):
+        if isinstance(cat, dict):
+            return self._dict(plural_to_single(keyw, "slot"), cat)
+        elif isinstance(cat, list):
+            return self._list(plural_to_single(keyw, "list"), cat)
+        elif isinstance(cat, tuple):
+            return self._tuple(plural_to_single(keyw, "tuple"), cat)
+        else:
+            if not isinstance(cat, str):
+                cat = str(cat)
+            name = plural_to_single(keyw, "item")
+            return "<%s>%s</%s>\n" % (name, xml_name(cat), name)
+
     def _list(self, keyw, lst):
         text = []
         for cat in lst:
-            if isinstance(cat, dict):
-                text.append(self._dict(plural_to_single(keyw, "slot"), cat))
-            elif isinstance(cat, list):
-                text.append(self._list(plural_to_single(keyw, "list"), cat))
-            elif isinstance(cat, tuple):
-                text.append(self._tuple(plural_to_single(keyw, "tuple"), cat))
-            else:
-                if not isinstance(cat, str):
-                    cat = str(cat)
-                name = plural_to_single(keyw, "item")
-                text.append("<%s>%s</%s>\n" % (name, xml_name(cat), name))
+            text.append(self._list_item(keyw, cat))
         if keyw:
             return "<%s>%s</%s>\n" % (keyw, "".join(text), keyw)
         else:
@@ -1234,6 +1496,23 @@ class XmlOutputFactory:
             text = ""
         return text
 
+    def chunks(self, keyw, lst) -> Generator[str, None, None]:
+        """Same output as run, but the dicts and lists are made item by item"""
+        if callable(lst):
+            yield from self.chunks(keyw, lst())
+        elif isinstance(lst, dict) and keyw:
+            yield "<%s>" % keyw
+            for key in lst.keys():
+                yield from self.chunks(key, lst[key])
+            yield "</%s>\n" % keyw
+        elif isinstance(lst, (list, Iterator)) and keyw:
+            yield "<%s>" % keyw
+            for cat in lst:
+                yield self._list_item(keyw, cat)
+            yield "</%s>\n" % keyw
+        else:
+            yield self.run(keyw, lst)
+
 
 def handle_server_api(kwargs: dict[str, Union[str, list[str]]]) -> str:
     """Special handler for API-call 'set_config' [servers]"""
@@ -1508,6 +1787,9 @@ def build_status(calculate_performance: bool = False, skip_dashboard: bool = Fal
     # How often did we delay?
     info["delayed_assembler"] = sabnzbd.BPSMeter.delayed_assembler
 
+    # How often could the analysis of job names be reused?
+    info["guess_cache"] = sabnzbd.sorting.GUESS_CACHE.stats()
+
     # Dashboard: Speed and load of System
     info["loadavg"] = loadavg()
     info["pystone"] = sabnzbd.PYSTONE_SCORE
@@ -1587,7 +1869,9 @@ def build_queue(
     priorities: Optional[list[str]] = None,
     statuses: Optional[list[str]] = None,
     nzo_ids: Optional[list[str]] = None,
+    since: int = 0,
 ) -> dict[str, Any]:
+    """Build the queue output, with `since` only the slots that changed since that slots_version"""
     info = build_header(for_template=False)
     (
         queue_bytes_total,
@@ -1627,71 +1911,90 @@ def build_queue(
     info["status"] = status
     info["timeleft"] = calc_timeleft(queue_bytes_left, sabnzbd.BPSMeter.bps)
 
-    n = start
-    running_bytes = bytes_left_previous_page
-    slotinfo = []
-    for nzo in nzo_list:
-        mbleft = nzo.remaining / MEBI
-        mb = nzo.bytes / MEBI
-
-        slot = {}
-        slot["index"] = n
-        slot["nzo_id"] = str(nzo.nzo_id)
-        slot["unpackopts"] = str(opts_to_pp(nzo.repair, nzo.unpack, nzo.delete))
-        slot["priority"] = INTERFACE_PRIORITIES.get(nzo.priority, NORMAL_PRIORITY)
-        slot["script"] = nzo.script if nzo.script else "None"
-        slot["filename"] = nzo.final_name
-        slot["labels"] = nzo.labels
-        slot["password"] = nzo.password if nzo.password else ""
-        slot["cat"] = nzo.cat if nzo.cat else "None"
-        slot["mbleft"] = "%.2f" % mbleft
-        slot["mb"] = "%.2f" % mb
-        slot["size"] = to_units(nzo.bytes, "B")
-        slot["sizeleft"] = to_units(nzo.remaining, "B")
-        slot["percentage"] = "%s" % (int(((mb - mbleft) / mb) * 100)) if mb != mbleft else "0"
-        slot["mbmissing"] = "%.2f" % (nzo.bytes_missing / MEBI)
-        slot["direct_unpack"] = nzo.direct_unpack_progress
-
-        if not sabnzbd.Downloader.paused and nzo.status not in (Status.PAUSED, Status.FETCHING, Status.GRABBING):
-            if nzo.propagation_delay_left:
-                slot["status"] = Status.PROPAGATING
-            elif nzo.status == Status.CHECKING:
-                slot["status"] = Status.CHECKING
+    def build_slots() -> list[dict[str, Any]]:
+        n = start
+        running_bytes = bytes_left_previous_page
+        slotinfo = []
+        for nzo in nzo_list:
+            mbleft = nzo.remaining / MEBI
+            mb = nzo.bytes / MEBI
+
+            slot = {}
+            slot["index"] = n
+            slot["nzo_id"] = str(nzo.nzo_id)
+            slot["unpackopts"] = str(opts_to_pp(nzo.repair, nzo.unpack, nzo.delete))
+            slot["priority"] = INTERFACE_PRIORITIES.get(nzo.priority, NORMAL_PRIORITY)
+            slot["script"] = nzo.script if nzo.script else "None"
+            slot["filename"] = nzo.final_name
+            slot["labels"] = nzo.labels
+            slot["password"] = nzo.password if nzo.password else ""
+            slot["cat"] = nzo.cat if nzo.cat else "None"
+            slot["mbleft"] = "%.2f" % mbleft
+            slot["mb"] = "%.2f" % mb
+            slot["size"] = to_units(nzo.bytes, "B")
+            slot["sizeleft"] = to_units(nzo.remaining, "B")
+            slot["percentage"] = "%s" % (int(((mb - mbleft) / mb) * 100)) if mb != mbleft else "0"
+            slot["mbmissing"] = "%.2f" % (nzo.bytes_missing / MEBI)
+            slot["direct_unpack"] = nzo.direct_unpack_progress
+
+            if not sabnzbd.Downloader.paused and nzo.status not in (Status.PAUSED, Status.FETCHING, Status.GRABBING):
+                if nzo.propagation_delay_left:
+                    slot["status"] = Status.PROPAGATING
+                elif nzo.status == Status.CHECKING:
+                    slot["status"] = Status.CHECKING
+                else:
+                    slot["status"] = Status.DOWNLOADING
             else:
-                slot["status"] = Status.DOWNLOADING
-        else:
-            # Ensure compatibility of API status
-            if nzo.status == Status.DELETED or nzo.priority == FORCE_PRIORITY:
-                nzo.status = Status.DOWNLOADING
-            slot["status"] = nzo.status
-
-        if (
-            sabnzbd.Downloader.paused
-            or sabnzbd.Downloader.paused_for_postproc
-            or nzo.propagation_delay_left
-            or nzo.status not in (Status.DOWNLOADING, Status.FETCHING, Status.QUEUED)
-        ) and nzo.priority != FORCE_PRIORITY:
-            slot["timeleft"] = "0:00:00"
-        else:
-            running_bytes += nzo.remaining
-            slot["timeleft"] = calc_timeleft(running_bytes, sabnzbd.BPSMeter.bps)
-
-        # Do not show age when it's not known
-        if nzo.avg_date.year < 2000:
-            slot["avg_age"] = "-"
-        else:
-            slot["avg_age"] = calc_age(nzo.avg_date)
-
-        # Add timestamp when the item was added to the queue
-        slot["time_added"] = nzo.time_added
-
-        slotinfo.append(slot)
-        n += 1
+                # Ensure compatibility of API status
+                if nzo.status == Status.DELETED or nzo.priority == FORCE_PRIORITY:
+                    nzo.status = Status.DOWNLOADING
+                slot["status"] = nzo.status
+
+            if (
+                sabnzbd.Downloader.paused
+                or sabnzbd.Downloader.paused_for_postproc
+                or nzo.propagation_delay_left
+                or nzo.status not in (Status.DOWNLOADING, Status.FETCHING, Status.QUEUED)
+            ) and nzo.priority != FORCE_PRIORITY:
+                slot["timeleft"] = "0:00:00"
+            else:
+                running_bytes += nzo.remaining
+                slot["timeleft"] = calc_timeleft(running_bytes, sabnzbd.BPSMeter.bps)
 
-    if slotinfo:
-        info["slots"] = slotinfo
-    else:
-        info["slots"] = []
+            # Do not show age when it's not known
+            if nzo.avg_date.year < 2000:
+                slot["avg_age"] = "-"
+            else:
+                slot["avg_age"] = calc_age(nzo.avg_date)
+
+            # Add timestamp when the item was added to the queue
+            slot["time_added"] = nzo.time_added
+
+            slotinfo.append(slot)
+            n += 1
+        return slotinfo
+
+    # The slots are only rebuilt if the queue or the state of the downloader changed,
+    # the current minute is included because the age and propagation delay depend on it
+    params = (
+        start,
+        limit,
+        search,
+        tuple(categories or ()),
+        tuple(priorities or ()),
+        tuple(statuses or ()),
+        tuple(nzo_ids or ()),
+    )
+    state = (
+        sabnzbd.NzbQueue.version,
+        sabnzbd.Downloader.paused,
+        sabnzbd.Downloader.paused_for_postproc,
+        sabnzbd.BPSMeter.bps,
+        int(time.time() // 60),
+    )
+    info["slots_version"], info["slots"] = QUEUE_SLOTS.get(params, state, build_slots)
+    if since:
+        add_slot_changes(info, QUEUE_SLOTS, params, since)
 
     return info
 
@@ -1705,57 +2008,49 @@ def fast_queue() -> tuple[bool, int, float, str]:
     return paused, bytes_left, bpsnow, time_left
 
 
-def build_file_list(nzo_id: str) -> list[dict[str, Any]]:
-    """Build file lists for specified job"""
-    jobs = []
+def build_file_list(nzo_id: str) -> Generator[dict[str, Any], None, None]:
+    """Build file lists for specified job, the files are made while iterating over them"""
     nzo = sabnzbd.sabnzbd.NzbQueue.get_nzo(nzo_id)
     if nzo:
-        for nzf in nzo.finished_files:
-            jobs.append(
-                {
-                    "filename": nzf.filename,
-                    "mbleft": "%.2f" % (nzf.bytes_left / MEBI),
-                    "mb": "%.2f" % (nzf.bytes / MEBI),
-                    "bytes": "%.2f" % nzf.bytes,
-                    "age": calc_age(nzf.date),
-                    "nzf_id": nzf.nzf_id,
-                    "status": "finished",
-                }
-            )
-
-        for nzf in nzo.files:
-            jobs.append(
-                {
-                    "filename": nzf.filename,
-                    "mbleft": "%.2f" % (nzf.bytes_left / MEBI),
-                    "mb": "%.2f" % (nzf.bytes / MEBI),
-                    "bytes": "%.2f" % nzf.bytes,
-                    "age": calc_age(nzf.date),
-                    "nzf_id": nzf.nzf_id,
-                    "status": "active",
-                }
-            )
+        # Files move between the lists while downloading, so only their references are copied
+        for nzf in nzo.finished_files[:]:
+            yield {
+                "filename": nzf.filename,
+                "mbleft": "%.2f" % (nzf.bytes_left / MEBI),
+                "mb": "%.2f" % (nzf.bytes / MEBI),
+                "bytes": "%.2f" % nzf.bytes,
+                "age": calc_age(nzf.date),
+                "nzf_id": nzf.nzf_id,
+                "status": "finished",
+            }
+
+        for nzf in nzo.files[:]:
+            yield {
+                "filename": nzf.filename,
+                "mbleft": "%.2f" % (nzf.bytes_left / MEBI),
+                "mb": "%.2f" % (nzf.bytes / MEBI),
+                "bytes": "%.2f" % nzf.bytes,
+                "age": calc_age(nzf.date),
+                "nzf_id": nzf.nzf_id,
+                "status": "active",
+            }
 
         # extrapars can change during iteration
-        for parset in nzo.extrapars.keys():
+        for parset in list(nzo.extrapars.keys()):
             extrapar_set = nzo.extrapars.get(parset, [])
             for nzf in extrapar_set[:]:
                 # Prevent listing files twice
                 if nzf not in nzo.files and nzf not in nzo.finished_files:
-                    jobs.append(
-                        {
-                            "filename": nzf.filename,
-                            "set": nzf.setname,
-                            "mbleft": "%.2f" % (nzf.bytes_left / MEBI),
-                            "mb": "%.2f" % (nzf.bytes / MEBI),
-                            "bytes": "%.2f" % nzf.bytes,
-                            "age": calc_age(nzf.date),
-                            "nzf_id": nzf.nzf_id,
-                            "status": "queued",
-                        }
-                    )
-
-    return jobs
+                    yield {
+                        "filename": nzf.filename,
+                        "set": nzf.setname,
+                        "mbleft": "%.2f" % (nzf.bytes_left / MEBI),
+                        "mb": "%.2f" % (nzf.bytes / MEBI),
+                        "bytes": "%.2f" % nzf.bytes,
+                        "age": calc_age(nzf.date),
+                        "nzf_id": nzf.nzf_id,
+                        "status": "queued",
+                    }
 
 
 def retry_job(
@@ -1890,8 +2185,14 @@ def build_history(
     categories: Optional[list[str]] = None,
     statuses: Optional[list[str]] = None,
     nzo_ids: Optional[list[str]] = None,
-) -> tuple[list[dict[str, Any]], int, int]:
-    """Combine the jobs still in post-processing and the database history"""
+    after: Optional[str] = None,
+    lean: bool = False,
+) -> tuple[Iterator[dict[str, Any]], int, int, Callable[[], Optional[str]]]:
+    """Combine the jobs still in post-processing and the database history.
+    When continuing `after` a previous page, the post-processing jobs were already on the first page.
+    The jobs are read from the database while iterating over them, the cursor to the
+    next page is returned as a function because it is only known after that.
+    """
     if not archive:
         # Grab any items that are active or queued in postproc
         postproc_queue = sabnzbd.PostProcessor.get_queue(
@@ -1903,7 +2204,10 @@ def build_history(
 
         # Multi-page support for postproc items
         postproc_queue_size = len(postproc_queue)
-        if start > postproc_queue_size:
+        if after:
+            postproc_queue = []
+            database_history_limit = limit
+        elif start > postproc_queue_size:
             # On a page where we shouldn't show postproc items
             postproc_queue = []
             database_history_limit = limit
@@ -1931,39 +2235,44 @@ def build_history(
         close_db = True
 
     # Fetch history items
+    items, total_items = history_db.iter_history(
+        start=database_history_start,
+        limit=database_history_limit or 1,
+        archive=archive,
+        search=search,
+        categories=categories,
+        statuses=statuses,
+        nzo_ids=nzo_ids,
+        after=after,
+        lean=lean,
+    )
     if not database_history_limit:
-        items, total_items = history_db.fetch_history(
-            start=database_history_start,
-            limit=1,
-            archive=archive,
-            search=search,
-            categories=categories,
-            statuses=statuses,
-            nzo_ids=nzo_ids,
-        )
-        items = []
-    else:
-        items, total_items = history_db.fetch_history(
-            start=database_history_start,
-            limit=database_history_limit,
-            archive=archive,
-            search=search,
-            categories=categories,
-            statuses=statuses,
-            nzo_ids=nzo_ids,
-        )
-
-    # Add the postproc items to the top of the history
-    # Reverse the queue to add items to the top (faster than insert)
-    items.reverse()
-    add_active_history(postproc_queue, items)
+        items = iter(())
     total_items += postproc_queue_size
-    items.reverse()
 
-    if close_db:
-        history_db.close()
+    # Jobs that were already added to the history are skipped
+    in_history = history_db.in_history([nzo.nzo_id for nzo in postproc_queue])
+    postproc_queue = [nzo for nzo in postproc_queue if nzo.nzo_id not in in_history]
 
-    return items, postproc_queue_size, total_items
+    def combine_items() -> Generator[dict[str, Any], None, None]:
+        """Add the postproc items to the top of the history"""
+        try:
+            added_nzo_ids = set()
+            for nzo in postproc_queue:
+                added_nzo_ids.add(nzo.nzo_id)
+                yield active_history_item(nzo)
+            for item in items:
+                # Skip jobs that were added to the history in the meantime
+                if item["nzo_id"] not in added_nzo_ids:
+                    yield item
+        finally:
+            if close_db:
+                history_db.close()
+
+    def next_page() -> Optional[str]:
+        return history_db.next_page if database_history_limit else None
+
+    return combine_items(), postproc_queue_size, total_items, next_page
 
 
 def add_active_history(postproc_queue: list[NzbObject], items: list[dict[str, Any]]):
@@ -1974,48 +2283,51 @@ def add_active_history(postproc_queue: list[NzbObject], items: list[dict[str, An
         # Skip already in history
         if nzo.nzo_id in nzo_ids:
             continue
-
-        # This output has to be the same as fetch_history!
-        item = {
-            "completed": int(time.time()),
-            "name": nzo.final_name,
-            "nzb_name": nzo.filename,
-            "category": nzo.cat,
-            "pp": PP_LOOKUP.get(opts_to_pp(nzo.repair, nzo.unpack, nzo.delete), "X"),
-            "script": nzo.script,
-            "report": "",
-            "url": nzo.url,
-            "status": nzo.status,
-            "nzo_id": nzo.nzo_id,
-            "storage": "",
-            "path": clip_path(nzo.download_path),
-            "script_line": "",
-            "download_time": nzo.nzo_info.get("download_time", 0),
-            "postproc_time": 0,
-            "stage_log": [],
-            "downloaded": nzo.bytes_downloaded,
-            "completeness": None,
-            "fail_message": nzo.fail_msg,
-            "url_info": nzo.nzo_info.get("details", "") or nzo.nzo_info.get("more_info", ""),
-            "bytes": nzo.bytes_downloaded,
-            "size": to_units(nzo.bytes_downloaded, "B"),
-            "meta": None,
-            "series": "",
-            "duplicate_key": nzo.duplicate_key,
-            "md5sum": "",
-            "password": nzo.correct_password,
-            "action_line": nzo.action_line,
-            "loaded": nzo.pp_active,
-            "retry": False,
-            "archive": False,
-            "time_added": nzo.time_added,
-        }
-        # Add stage information, in the correct order
-        for stage in STAGES:
-            if stage in nzo.unpack_info:
-                item["stage_log"].append({"name": stage, "actions": nzo.unpack_info[stage]})
-
-        items.append(item)
+        items.append(active_history_item(nzo))
+
+
+def active_history_item(nzo: NzbObject) -> dict[str, Any]:
+    """History item of a job in post-processing"""
+    # This output has to be the same as fetch_history!
+    item = {
+        "completed": int(time.time()),
+        "name": nzo.final_name,
+        "nzb_name": nzo.filename,
+        "category": nzo.cat,
+        "pp": PP_LOOKUP.get(opts_to_pp(nzo.repair, nzo.unpack, nzo.delete), "X"),
+        "script": nzo.script,
+        "report": "",
+        "url": nzo.url,
+        "status": nzo.status,
+        "nzo_id": nzo.nzo_id,
+        "storage": "",
+        "path": clip_path(nzo.download_path),
+        "script_line": "",
+        "download_time": nzo.nzo_info.get("download_time", 0),
+        "postproc_time": 0,
+        "stage_log": [],
+        "downloaded": nzo.bytes_downloaded,
+        "completeness": None,
+        "fail_message": nzo.fail_msg,
+        "url_info": nzo.nzo_info.get("details", "") or nzo.nzo_info.get("more_info", ""),
+        "bytes": nzo.bytes_downloaded,
+        "size": to_units(nzo.bytes_downloaded, "B"),
+        "meta": None,
+        "series": "",
+        "duplicate_key": nzo.duplicate_key,
+        "md5sum": "",
+        "password": nzo.correct_password,
+        "action_line": nzo.action_line,
+        "loaded": nzo.pp_active,
+        "retry": False,
+        "archive": False,
+        "time_added": nzo.time_added,
+    }
+    # Add stage information, in the correct order
+    for stage in STAGES:
+        if stage in nzo.unpack_info:
+            item["stage_log"].append({"name": stage, "actions": nzo.unpack_info[stage]})
+    return item
 
 
 def calc_timeleft(bytesleft: float, bps: float) -> str:
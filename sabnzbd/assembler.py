@@ -510,6 +510,8 @@ class Assembler(Thread):
                 written += Assembler._write(fd, nzf, mv[written:], pos + written)
 
         nzf.update_crc32(article.crc32, len(data))
+        if nzf.par2_parser or (pos == 0 and data[:8] == par2file.PAR_PKT_ID):
+            Assembler.parse_par2_data(nzf, data, pos)
         article.on_disk = True
         sabnzbd.Assembler.update_ready_bytes(nzf, -len(data))
         with nzf.lock:
@@ -525,6 +527,18 @@ class Assembler(Thread):
                 nzf.assembler_next_index += 1
         return written
 
+    @staticmethod
+    def parse_par2_data(nzf: NzbFile, data: bytearray, pos: int) -> None:
+        """Parse the par2 packets while the file is written, so it doesn't have to be read again when done"""
+        with nzf.lock:
+            if not nzf.par2_parser:
+                nzf.par2_parser = par2file.Par2Parser(nzf.filename, nzf.bytes)
+            try:
+                nzf.par2_parser.feed(data, pos)
+            except Exception:
+                logging.debug("Failed to parse par2 data of %s", nzf.filename, exc_info=True)
+                nzf.par2_parser.failed = True
+
     @staticmethod
     def _write(fd: int, nzf: NzbFile, data: Union[bytearray, memoryview], offset: int) -> int:
         if sabnzbd.WINDOWS:
@@ -54,6 +54,7 @@ from sabnzbd.constants import (
     DEF_HTTPS_KEY_FILE,
     DEF_MAX_ASSEMBLER_QUEUE,
     DEF_DOWNLOAD_FREE,
+    DEF_EVENT_STREAMS,
 )
 from sabnzbd.filesystem import same_directory, real_path, is_valid_script, is_network_path
 
@@ -395,6 +396,7 @@ admin_dir = OptionDir("misc", "admin_dir", DEF_ADMIN_DIR, validation=validate_sa
 backup_dir = OptionDir("misc", "backup_dir")
 dirscan_dir = OptionDir("misc", "dirscan_dir", writable=False)
 dirscan_speed = OptionNumber("misc", "dirscan_speed", DEF_SCANRATE, minval=0, maxval=3600)
+dirscan_inotify = OptionBool("misc", "dirscan_inotify", False)
 password_file = OptionDir("misc", "password_file", "", create=False)
 log_dir = OptionDir("misc", "log_dir", "logs", validation=validate_default_if_empty)
 
@@ -427,6 +429,7 @@ ignore_samples = OptionBool("misc", "ignore_samples", False)
 deobfuscate_final_filenames = OptionBool("misc", "deobfuscate_final_filenames", True)
 auto_sort = OptionStr("misc", "auto_sort")
 direct_unpack = OptionBool("misc", "direct_unpack", False)
+direct_unpack_priority = OptionBool("misc", "direct_unpack_priority", True)
 propagation_delay = OptionNumber("misc", "propagation_delay", 0, minval=0)
 folder_rename = OptionBool("misc", "folder_rename", True)
 replace_spaces = OptionBool("misc", "replace_spaces", False)
@@ -518,7 +521,9 @@ movie_rename_limit = OptionStr("misc", "movie_rename_limit", "100M")
 episode_rename_limit = OptionStr("misc", "episode_rename_limit", "20M")
 size_limit = OptionStr("misc", "size_limit", "0")
 direct_unpack_threads = OptionNumber("misc", "direct_unpack_threads", 3, minval=1)
+pp_max_parallel_sets = OptionNumber("misc", "pp_max_parallel_sets", 0, minval=0)
 history_limit = OptionNumber("misc", "history_limit", 10, minval=0)
+max_event_streams = OptionNumber("misc", "max_event_streams", DEF_EVENT_STREAMS, minval=0)
 wait_ext_drive = OptionNumber("misc", "wait_ext_drive", 5, minval=1, maxval=60)
 max_foldername_length = OptionNumber("misc", "max_foldername_length", DEF_FOLDER_MAX, minval=20, maxval=65000)
 marker_file = OptionStr("misc", "nomedia_marker")
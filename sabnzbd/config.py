@@ -19,6 +19,7 @@
 sabnzbd.config - Configuration Support
 """
 
+import contextlib
 import logging
 import os
 import re
@@ -43,6 +44,7 @@ from sabnzbd.constants import (
     DEF_INI_FILE,
     DEF_SORTER_RENAME_SIZE,
     DEF_PIPELINING_REQUESTS,
+    DB_HISTORY_NAME,
 )
 from sabnzbd.decorators import synchronized
 from sabnzbd.filesystem import clip_path, real_path, create_real_path, renamer, remove_file, is_writable
@@ -1037,6 +1039,8 @@ def create_config_backup() -> Union[str, bool]:
             with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_ref:
                 for filename in CONFIG_BACKUP_FILES:
                     full_path = os.path.join(admin_path, filename)
+                    if filename == DB_HISTORY_NAME:
+                        sabnzbd.database.checkpoint_history_db(full_path)
                     if os.path.isfile(full_path):
                         with open(full_path, "rb") as data:
                             zip_ref.writestr(filename, data.read())
@@ -1091,7 +1095,12 @@ def restore_config_backup(config_backup_data: bytes):
                         zip_ref.getinfo(filename)
                         destination_file = os.path.join(adminpath, filename)
                         logging.debug("Writing backup of %s to %s", filename, destination_file)
-                        with open(destination_file, "wb") as destination_ref:
+                        # The connections to the history database have to be closed while it is replaced
+                        if filename == DB_HISTORY_NAME:
+                            replacing = sabnzbd.database.history_db_closed()
+                        else:
+                            replacing = contextlib.nullcontext()
+                        with replacing, open(destination_file, "wb") as destination_ref:
                             destination_ref.write(zip_ref.read(filename))
                         # For HTTPS config files, point the associated setting to the restored file
                         if setting := CONFIG_BACKUP_HTTPS.get(filename):
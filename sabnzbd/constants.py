@@ -85,6 +85,8 @@ DEF_HTTPS_CERT_FILE = "server.cert"
 DEF_HTTPS_KEY_FILE = "server.key"
 DEF_SORTER_RENAME_SIZE = "50M"
 MAX_WARNINGS = 20
+DEF_WEB_THREADS = 10
+DEF_EVENT_STREAMS = 40
 MAX_BAD_ARTICLES = 5
 
 CONFIG_BACKUP_FILES = [
@@ -19,15 +19,18 @@
 sabnzbd.database - Database Support
 """
 
+import contextlib
 import os
 import time
 import zlib
 import logging
 import sys
 import threading
+import queue
 import sqlite3
+from concurrent.futures import Future
 from sqlite3 import Connection, Cursor
-from typing import Optional, Sequence, Any
+from typing import Optional, Sequence, Any, Iterator, Generator
 
 import sabnzbd
 import sabnzbd.cfg
@@ -35,16 +38,95 @@ from sabnzbd.constants import DB_HISTORY_NAME, STAGES, Status, PP_LOOKUP
 from sabnzbd.bpsmeter import this_week, this_month
 from sabnzbd.decorators import synchronized
 from sabnzbd.encoding import ubtou, utob
-from sabnzbd.misc import caller_name, opts_to_pp, to_units, bool_conv, match_str
+from sabnzbd.misc import caller_name, opts_to_pp, to_units, bool_conv, match_str, history_updated
 from sabnzbd.filesystem import remove_file, clip_path
 
 DB_LOCK = threading.Lock()
+POOL_LOCK = threading.Lock()
+WRITE_LOCK = threading.Lock()
+
+# Idle connections that are reused, so not every HistoryDB-instance has to open the database
+CONNECTION_POOL: list[tuple[int, Connection]] = []
+MAX_POOLED_CONNECTIONS = 4
+
+# Maximum number of changes combined in a single transaction by the HistoryWriter
+MAX_WRITE_BATCH = 50
+
+# Only reclaim unused space during maintenance when it's a significant part of the database
+VACUUM_FREE_PAGES_RATIO = 0.25
+
+# Columns needed to list the history, the compressed script-log is only fetched when requested
+HISTORY_COLUMNS = (
+    "id",
+    "completed",
+    "name",
+    "nzb_name",
+    "category",
+    "pp",
+    "script",
+    "report",
+    "url",
+    "status",
+    "nzo_id",
+    "storage",
+    "path",
+    "script_line",
+    "download_time",
+    "postproc_time",
+    "stage_log",
+    "downloaded",
+    "completeness",
+    "fail_message",
+    "url_info",
+    "bytes",
+    "meta",
+    "series",
+    "md5sum",
+    "password",
+    "duplicate_key",
+    "archive",
+    "time_added",
+)
+HISTORY_LEAN_COLUMNS = tuple(column for column in HISTORY_COLUMNS if column != "stage_log")
+
+# Statements used by the triggers to keep the history_stats in sync with the history.
+# The totals are kept per hour since the epoch, independent of the timezone, so the
+# triggers always find the row they added before. The local periods of the BPSMeter
+# are converted to hours when reading.
+HISTORY_STATS_KEY = """
+    {row}.completed / 3600, IFNULL({row}.category, ''), IFNULL({row}.status, ''), IFNULL({row}.archive, 0)
+"""
+HISTORY_STATS_ADD = """
+    INSERT INTO history_stats (hour, category, status, archive, jobs, bytes)
+    VALUES (%s, 1, IFNULL({row}.bytes, 0))
+    ON CONFLICT (hour, category, status, archive)
+    DO UPDATE SET jobs = jobs + 1, bytes = bytes + excluded.bytes;
+""" % HISTORY_STATS_KEY
+HISTORY_STATS_SUBTRACT = """
+    UPDATE history_stats SET jobs = jobs - 1, bytes = bytes - IFNULL({row}.bytes, 0)
+    WHERE (hour, category, status, archive) = (%s);
+    DELETE FROM history_stats WHERE (hour, category, status, archive) = (%s) AND jobs <= 0;
+""" % (HISTORY_STATS_KEY, HISTORY_STATS_KEY)
+
+
+def search_index_supported() -> bool:
+    """The search index needs FTS5 with the trigram tokenizer (SQLite 3.34+), which not every build has"""
+    try:
+        connection = sqlite3.connect(":memory:")
+        try:
+            connection.execute("CREATE VIRTUAL TABLE test_index USING fts5(name, tokenize='trigram')")
+        finally:
+            connection.close()
+        return True
+    except sqlite3.Error:
+        return False
 
 
 class HistoryDB:
     """Class to access the History database
     Each class-instance will create an access channel that
-    can be used in one thread.
+    can be used in one thread. After closing, the connection
+    is kept for reuse. All changes are done by the HistoryWriter.
     Each thread needs its own class-instance!
     """
 
@@ -52,23 +134,44 @@ class HistoryDB:
     # they need to be shared by all instances
     db_path = None  # Full path to history database
     startup_done = False
+    generation = 0  # Increased on every startup, connections of older generations are not reused
+    search_index = False  # Is the full-text search index available
 
     @synchronized(DB_LOCK)
     def __init__(self):
         """Determine database path and create connection"""
         self.connection: Optional[Connection] = None
         self.cursor: Optional[Cursor] = None
+        self.next_page: Optional[str] = None  # Cursor to the page after the last fetch_history call
         self.connect()
 
     def connect(self):
-        """Create a connection to the database"""
+        """Create a connection to the database, or reuse an idle one"""
         if not HistoryDB.db_path:
             HistoryDB.db_path = os.path.join(sabnzbd.cfg.admin_dir.get_path(), DB_HISTORY_NAME)
         create_table = not HistoryDB.startup_done and not os.path.exists(HistoryDB.db_path)
-
-        self.connection = sqlite3.connect(HistoryDB.db_path)
-        self.connection.isolation_level = None  # autocommit attribute only introduced in Python 3.12
-        self.connection.row_factory = sqlite3.Row
+        if not HistoryDB.startup_done:
+            HistoryDB.generation += 1
+
+        self.connection = None
+        if HistoryDB.startup_done:
+            with POOL_LOCK:
+                while CONNECTION_POOL and not self.connection:
+                    generation, connection = CONNECTION_POOL.pop()
+                    if generation == HistoryDB.generation:
+                        self.connection = connection
+                    else:
+                        connection.close()
+
+        if not self.connection:
+            # The pool makes sure that a connection is only used by one thread at a time
+            self.connection = sqlite3.connect(HistoryDB.db_path, check_same_thread=False)
+            self.connection.isolation_level = None  # autocommit attribute only introduced in Python 3.12
+            self.connection.row_factory = sqlite3.Row
+            # Safe in WAL-mode, only the last transactions could be lost in case of a power failure
+            self.connection.execute("PRAGMA synchronous = NORMAL;")
+        self.db_path = HistoryDB.db_path
+        self.generation = HistoryDB.generation
         self.cursor = self.connection.cursor()
 
         # Perform initialization only once
@@ -76,9 +179,12 @@ class HistoryDB:
             if create_table:
                 self.create_history_db()
 
-            # When an object (table, index, or trigger) is dropped from the database, it leaves behind empty space
-            # http://www.sqlite.org/lang_vacuum.html
-            self.execute("VACUUM")
+            # With Write-Ahead Logging reading doesn't block writing and the other way around
+            # It's a persistent setting, but it's not supported on all (network) filesystems
+            if self.execute("PRAGMA journal_mode = WAL;"):
+                journal_mode = self.cursor.fetchone()
+                if journal_mode and journal_mode[0] != "wal":
+                    logging.info("History database could not use WAL-mode, using %s-mode", journal_mode[0])
 
             # See if we need to perform any updates
             self.execute("PRAGMA user_version;")
@@ -120,11 +226,32 @@ class HistoryDB:
                     and self.execute("CREATE UNIQUE INDEX idx_history_nzo_id ON history(nzo_id);")
                     and self.execute("CREATE INDEX idx_history_archive_completed ON history(archive, completed DESC);")
                 )
+            if version < 7:
+                _ = self.execute("PRAGMA user_version = 7;") and self.create_search_index()
+            if version < 8:
+                _ = self.execute("PRAGMA user_version = 8;") and self.create_duplicate_indexes()
+            if version < 9:
+                _ = self.execute("PRAGMA user_version = 9;") and self.create_history_stats()
+            if version < 10:
+                # The totals used to be kept per day in local time, which changes with the timezone
+                _ = (
+                    self.execute("PRAGMA user_version = 10;")
+                    and self.drop_history_stats()
+                    and self.create_history_stats()
+                )
+
+            # Older SQLite versions don't support the index, we then have to search the whole table.
+            # The index is created as soon as it is supported, for example after an upgrade of SQLite.
+            HistoryDB.search_index = self.search_index_exists()
+            if not HistoryDB.search_index and search_index_supported():
+                HistoryDB.search_index = self.create_search_index() and self.search_index_exists()
+            if not HistoryDB.search_index:
+                logging.info("History search index not available, using slower search")
 
             HistoryDB.startup_done = True
 
-    def execute(self, command: str, args: Sequence = ()) -> bool:
-        """Wrapper for executing SQL commands"""
+    def execute(self, command: str, args: Sequence = (), quiet: bool = False) -> bool:
+        """Wrapper for executing SQL commands, quiet when a failure is handled by the caller"""
         for tries in (4, 3, 2, 1, 0):
             try:
                 self.cursor.execute(command, args)
@@ -142,7 +269,8 @@ class HistoryDB:
                 elif match_str(error, ("not a database", "malformed", "no such table", "duplicate column name")):
                     logging.error(T("Damaged History database, created empty replacement"))
                     logging.info("Traceback: ", exc_info=True)
-                    self.close()
+                    self.close(reuse=False)
+                    close_pooled_connections()
                     try:
                         remove_file(HistoryDB.db_path)
                     except Exception:
@@ -153,7 +281,10 @@ class HistoryDB:
                     # because the column addition in connect() must be terminated
                     return True
                 else:
-                    logging.error(T("SQL Command Failed, see log"))
+                    if quiet:
+                        logging.debug("SQL command failed: %s", error)
+                    else:
+                        logging.error(T("SQL Command Failed, see log"))
                     logging.info("SQL: %s", command)
                     logging.info("Arguments: %s", repr(args))
                     logging.info("Traceback: ", exc_info=True)
@@ -200,54 +331,200 @@ class HistoryDB:
             "time_added" INTEGER
         )
         """)
-        self.execute("PRAGMA user_version = 6;")
+        self.execute("PRAGMA user_version = 10;")
         self.execute("CREATE UNIQUE INDEX idx_history_nzo_id ON history(nzo_id);")
         self.execute("CREATE INDEX idx_history_archive_completed ON history(archive, completed DESC);")
+        self.create_search_index()
+        self.create_duplicate_indexes()
+        self.create_history_stats()
+
+    def create_duplicate_indexes(self) -> bool:
+        """Indexes for the columns used by the duplicate detection"""
+        return (
+            self.execute("CREATE INDEX IF NOT EXISTS idx_history_name ON history(name COLLATE NOCASE);")
+            and self.execute("CREATE INDEX IF NOT EXISTS idx_history_md5sum ON history(md5sum);")
+            and self.execute("CREATE INDEX IF NOT EXISTS idx_history_duplicate_key ON history(duplicate_key);")
+        )
 
-    def close(self):
-        """Close database connection"""
+    def create_history_stats(self) -> bool:
+        """Create the table with the totals per hour, category, status and archive-state,
+        kept up-to-date by triggers. The totals don't require reading the whole history.
+        """
+        return (
+            self.execute("""
+            CREATE TABLE IF NOT EXISTS history_stats (
+                "hour" INTEGER NOT NULL,
+                "category" TEXT NOT NULL,
+                "status" TEXT NOT NULL,
+                "archive" INTEGER NOT NULL,
+                "jobs" INTEGER NOT NULL,
+                "bytes" INTEGER NOT NULL,
+                PRIMARY KEY (hour, category, status, archive)
+            )
+            """)
+            and self.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS history_stats_insert AFTER INSERT ON history BEGIN
+                {HISTORY_STATS_ADD.format(row="new")}
+            END
+            """)
+            and self.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS history_stats_delete AFTER DELETE ON history BEGIN
+                {HISTORY_STATS_SUBTRACT.format(row="old")}
+            END
+            """)
+            and self.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS history_stats_update
+            AFTER UPDATE OF completed, category, status, archive, bytes ON history BEGIN
+                {HISTORY_STATS_SUBTRACT.format(row="old")}
+                {HISTORY_STATS_ADD.format(row="new")}
+            END
+            """)
+            # Count the existing jobs
+            and self.execute("""
+            INSERT OR REPLACE INTO history_stats (hour, category, status, archive, jobs, bytes)
+            SELECT completed / 3600, IFNULL(category, ''), IFNULL(status, ''),
+                IFNULL(archive, 0), COUNT(*), IFNULL(SUM(bytes), 0)
+            FROM history GROUP BY 1, 2, 3, 4
+            """)
+        )
+
+    def drop_history_stats(self) -> bool:
+        return (
+            self.execute("DROP TRIGGER IF EXISTS history_stats_insert")
+            and self.execute("DROP TRIGGER IF EXISTS history_stats_delete")
+            and self.execute("DROP TRIGGER IF EXISTS history_stats_update")
+            and self.execute("DROP TABLE IF EXISTS history_stats")
+        )
+
+    def create_search_index(self) -> bool:
+        """Create the full-text index on the job names, kept up-to-date by triggers.
+        The trigram tokenizer allows the LIKE-patterns of the search to use the index.
+        """
+        if not search_index_supported():
+            return True
+        return (
+            self.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+            USING fts5(name, content='history', content_rowid='id', tokenize='trigram')
+            """)
+            and self.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts(rowid, name) VALUES (new.id, new.name);
+            END
+            """)
+            and self.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts(history_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END
+            """)
+            and self.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF name ON history BEGIN
+                INSERT INTO history_fts(history_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO history_fts(rowid, name) VALUES (new.id, new.name);
+            END
+            """)
+            # Index the existing jobs
+            and self.execute("""INSERT INTO history_fts(history_fts) VALUES ('rebuild')""")
+        )
+
+    def search_index_exists(self) -> bool:
+        """Check if the full-text index on the job names was created"""
+        if self.execute("""SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"""):
+            return bool(self.cursor.fetchone())
+        return False
+
+    def close(self, reuse: bool = True):
+        """Close database connection, or keep it for reuse by another instance"""
         try:
             self.cursor.close()
+            if reuse and not self.connection.in_transaction and self.generation == HistoryDB.generation:
+                with POOL_LOCK:
+                    if len(CONNECTION_POOL) < MAX_POOLED_CONNECTIONS:
+                        CONNECTION_POOL.append((self.generation, self.connection))
+                        return
             self.connection.close()
         except Exception:
             logging.error(T("Failed to close database, see log"))
             logging.info("Traceback: ", exc_info=True)
 
+    def write(self, command: str, args: Sequence = ()) -> bool:
+        """Let the HistoryWriter perform the change, so changes of multiple threads don't
+        have to wait for each other's lock but are combined in a single transaction.
+        Every change increases the version of the history, so the API knows it changed."""
+        result = get_history_writer().write(command, args)
+        history_updated()
+        return result
+
+    def execute_batch(self, commands: list[tuple[str, Sequence]]) -> list[bool]:
+        """Execute all commands in a single transaction.
+        If that fails, they are executed separately so only the failing one is lost."""
+        if len(commands) > 1 and self.execute("BEGIN IMMEDIATE;"):
+            if all(self.execute(command, args, quiet=True) for command, args in commands) and self.execute("COMMIT;"):
+                return [True] * len(commands)
+            if self.connection.in_transaction:
+                self.execute("ROLLBACK;")
+            logging.debug("Executing the %s changes separately", len(commands))
+        return [self.execute(command, args) for command, args in commands]
+
+    def maintenance(self):
+        """Reclaim unused space, but only if a significant part of the database is unused,
+        and let SQLite update the statistics it uses to optimize queries"""
+        if self.execute("PRAGMA page_count;"):
+            page_count = self.cursor.fetchone()[0]
+            if self.execute("PRAGMA freelist_count;"):
+                free_pages = self.cursor.fetchone()[0]
+                if page_count and free_pages / page_count > VACUUM_FREE_PAGES_RATIO:
+                    logging.info("Reclaiming %s unused pages of the History database", free_pages)
+                    # When rows, tables or indexes are removed, it leaves behind empty space
+                    # http://www.sqlite.org/lang_vacuum.html
+                    self.execute("VACUUM;")
+        self.execute("PRAGMA optimize;")
+
     def archive(self, job: str):
         """Move job to the archive"""
-        self.execute("""UPDATE history SET archive = 1 WHERE nzo_id = ?""", (job,))
+        self.write("""UPDATE history SET archive = 1 WHERE nzo_id = ?""", (job,))
         logging.info("[%s] Moved job %s to archive", caller_name(), job)
 
     def remove(self, job: str):
         """Permanently remove job from the history"""
-        self.execute("""DELETE FROM history WHERE nzo_id = ?""", (job,))
+        self.write("""DELETE FROM history WHERE nzo_id = ?""", (job,))
         logging.info("[%s] Removing job %s from history", caller_name(), job)
 
+    @staticmethod
+    def search_condition(search: Optional[str]) -> tuple[str, list[str]]:
+        """Return the SQL-condition and its arguments to match the job names with `search`,
+        using the search index if available"""
+        if not search or not isinstance(search, str):
+            return "1 = 1", []
+        if HistoryDB.search_index:
+            return "id IN (SELECT rowid FROM history_fts WHERE name LIKE ?)", [convert_search(search)]
+        return "name LIKE ?", [convert_search(search)]
+
     def archive_with_status(self, status: str, search: Optional[str] = None):
         """Archive all jobs with a specific status, optional with `search` pattern"""
-        search = convert_search(search)
+        search_cmd, command_args = self.search_condition(search)
         logging.info("Archiving all jobs with status=%s", status)
-        self.execute(
-            """UPDATE history SET archive = 1 WHERE archive IS NULL AND name LIKE ? AND status = ?""",
-            (search, status),
+        self.write(
+            """UPDATE history SET archive = 1 WHERE archive IS NULL AND %s AND status = ?""" % search_cmd,
+            command_args + [status],
         )
 
     def remove_with_status(self, status: str, search: Optional[str] = None):
         """Remove all jobs from the database with a specific status, optional with `search` pattern"""
-        search = convert_search(search)
+        search_cmd, command_args = self.search_condition(search)
         logging.info("Removing all jobs with status=%s", status)
-        self.execute("""DELETE FROM history WHERE name LIKE ? AND status = ?""", (search, status))
+        self.write("""DELETE FROM history WHERE %s AND status = ?""" % search_cmd, command_args + [status])
 
     def mark_as_completed(self, job: str):
         """Mark a job as completed in the history"""
-        self.execute("""UPDATE history SET status = ? WHERE nzo_id = ?""", (Status.COMPLETED, job))
+        self.write("""UPDATE history SET status = ? WHERE nzo_id = ?""", (Status.COMPLETED, job))
         logging.info("[%s] Marked job %s as completed", caller_name(), job)
 
     def get_failed_paths(self, search: Optional[str] = None) -> list[str]:
         """Return list of all storage paths of failed jobs (may contain non-existing or empty paths)"""
-        search = convert_search(search)
+        search_cmd, command_args = self.search_condition(search)
         fetch_ok = self.execute(
-            """SELECT path FROM history WHERE name LIKE ? AND status = ?""", (search, Status.FAILED)
+            """SELECT path FROM history WHERE %s AND status = ?""" % search_cmd, command_args + [Status.FAILED]
         )
         if fetch_ok:
             return [item["path"] for item in self.cursor.fetchall()]
@@ -264,7 +541,7 @@ class HistoryDB:
         elif history_retention_option == "number-archive":
             # Archive if more than X jobs
             logging.info("Archiving all but last %s completed jobs", to_keep)
-            self.execute(
+            self.write(
                 """UPDATE history SET archive = 1 WHERE status = ? AND  archive IS NULL AND id NOT IN (
                     SELECT id FROM history WHERE status = ? AND archive IS NULL ORDER BY completed DESC LIMIT ?
                 )""",
@@ -273,7 +550,7 @@ class HistoryDB:
         elif history_retention_option == "number-delete":
             # Delete if more than X jobs
             logging.info("Removing all but last %s completed jobs from history", to_keep)
-            self.execute(
+            self.write(
                 """DELETE FROM history WHERE status = ? AND id NOT IN (
                     SELECT id FROM history WHERE status = ? ORDER BY completed DESC LIMIT ?
                 )""",
@@ -283,7 +560,7 @@ class HistoryDB:
             # Archive jobs older dan X days
             seconds_to_keep = int(time.time()) - to_keep * 86400
             logging.info("Archiving completed jobs older than %s days from history", to_keep)
-            self.execute(
+            self.write(
                 """UPDATE history SET archive = 1 WHERE status = ? AND archive IS NULL AND completed < ?""",
                 (Status.COMPLETED, seconds_to_keep),
             )
@@ -291,7 +568,7 @@ class HistoryDB:
             # Delete jobs older dan X days
             seconds_to_keep = int(time.time()) - to_keep * 86400
             logging.info("Removing completed jobs older than %s days from history", to_keep)
-            self.execute(
+            self.write(
                 """DELETE FROM history WHERE status = ? AND completed < ?""",
                 (Status.COMPLETED, seconds_to_keep),
             )
@@ -306,7 +583,7 @@ class HistoryDB:
         """Add a new job entry to the database"""
         t = build_history_info(nzo, storage, postproc_time, script_output, script_line)
 
-        self.execute(
+        self.write(
             """INSERT INTO history (completed, name, nzb_name, category, pp, script, report,
             url, status, nzo_id, storage, path, script_log, script_line, download_time, postproc_time, stage_log,
             downloaded, fail_message, url_info, bytes, duplicate_key, md5sum, password, time_added)
@@ -324,9 +601,35 @@ class HistoryDB:
         categories: Optional[list[str]] = None,
         statuses: Optional[list[str]] = None,
         nzo_ids: Optional[list[str]] = None,
+        after: Optional[str] = None,
+        lean: bool = False,
     ) -> tuple[list[dict[str, Any]], int]:
-        """Return records for specified jobs"""
-        command_args = [convert_search(search)]
+        """Return records for specified jobs.
+        Pages can be requested using `start` or, independent of how deep the page is, by passing
+        the `next_page` of the previous call as `after`. The `lean` records don't contain the stage-log.
+        """
+        items, total_items = self.iter_history(
+            start, limit, archive, search, categories, statuses, nzo_ids, after, lean
+        )
+        return list(items), total_items
+
+    def iter_history(
+        self,
+        start: Optional[int] = None,
+        limit: Optional[int] = None,
+        archive: Optional[bool] = None,
+        search: Optional[str] = None,
+        categories: Optional[list[str]] = None,
+        statuses: Optional[list[str]] = None,
+        nzo_ids: Optional[list[str]] = None,
+        after: Optional[str] = None,
+        lean: bool = False,
+    ) -> tuple[Iterator[dict[str, Any]], int]:
+        """Same as fetch_history, but the records are read one by one while iterating over them.
+        The `next_page` is set once all records were read.
+        """
+        search_cmd, search_args = self.search_condition(search)
+        command_args = list(search_args)
 
         post = ""
         if archive:
@@ -350,28 +653,58 @@ class HistoryDB:
             post += ")"
             command_args.extend(nzo_ids)
 
-        cmd = "SELECT COUNT(*) FROM history WHERE name LIKE ?"
-        total_items = -1
-        if self.execute(cmd + post, command_args):
-            total_items = self.cursor.fetchone()["COUNT(*)"]
+        # Only filtering on names requires counting the matching jobs
+        if search_args or nzo_ids:
+            cmd = "SELECT COUNT(*) FROM history WHERE " + search_cmd
+            total_items = -1
+            if self.execute(cmd + post, command_args):
+                total_items = self.cursor.fetchone()["COUNT(*)"]
+        else:
+            total_items = self.count_history(archive, categories, statuses)
 
         if not start:
             start = 0
         if not limit:
             limit = total_items
 
+        # Continue after the last job of the previous page, so no need to skip over all the previous pages
+        if page_key := parse_page_key(after):
+            post += " AND (completed < ? OR (completed = ? AND id > ?))"
+            command_args.extend([page_key[0], page_key[0], page_key[1]])
+            start = 0
+
         command_args.extend([start, limit])
-        cmd = "SELECT * FROM history WHERE name LIKE ?"
-        if self.execute(cmd + post + " ORDER BY completed desc LIMIT ?, ?", command_args):
-            items = self.cursor.fetchall()
-        else:
-            items = []
+        cmd = "SELECT %s FROM history WHERE %s" % (
+            ", ".join(HISTORY_LEAN_COLUMNS if lean else HISTORY_COLUMNS),
+            search_cmd,
+        )
+        # The id is added to the order, so the index can also be used for the pages
+        self.next_page = None
+        if not self.execute(cmd + post + " ORDER BY completed DESC, id ASC LIMIT ?, ?", command_args):
+            return iter(()), total_items
 
-        # Unpack the single line stage log
-        # Stage Name is separated by ::: stage lines by ; and stages by \r\n
-        items = [unpack_history_info(item) for item in items]
+        # Other commands get a new cursor, so they don't interfere with reading the records
+        cursor = self.cursor
+        self.cursor = self.connection.cursor()
 
-        return items, total_items
+        def read_items() -> Generator[dict[str, Any], None, None]:
+            item = None
+            for number_of_items, item in enumerate(cursor, start=1):
+                # Unpack the single line stage log
+                # Stage Name is separated by ::: stage lines by ; and stages by \r\n
+                yield unpack_history_info(item)
+            if item and number_of_items == limit:
+                self.next_page = "%d_%d" % (item["completed"], item["id"])
+
+        return read_items(), total_items
+
+    def in_history(self, nzo_ids: list[str]) -> set[str]:
+        """Return the nzo_id's of the jobs that are already in the history"""
+        if nzo_ids and self.execute(
+            """SELECT nzo_id FROM history WHERE nzo_id IN (%s)""" % ", ".join("?" * len(nzo_ids)), nzo_ids
+        ):
+            return {item["nzo_id"] for item in self.cursor.fetchall()}
+        return set()
 
     def have_duplicate_key(self, duplicate_key: str) -> bool:
         """Check whether History contains this duplicate key"""
@@ -410,25 +743,42 @@ class HistoryDB:
         """
         # Total Size of the history
         total = 0
-        if self.execute("""SELECT sum(bytes) FROM history"""):
-            total = self.cursor.fetchone()["sum(bytes)"]
-
-        # Amount downloaded this month
-        month_timest = int(this_month(time.time()))
-
-        month = 0
-        if self.execute("""SELECT sum(bytes) FROM history WHERE completed > ?""", (month_timest,)):
-            month = self.cursor.fetchone()["sum(bytes)"]
-
-        # Amount downloaded this week
-        week_timest = int(this_week(time.time()))
+        if self.execute("""SELECT IFNULL(SUM(bytes), 0) AS bytes FROM history_stats"""):
+            total = self.cursor.fetchone()["bytes"]
 
-        week = 0
-        if self.execute("""SELECT sum(bytes) FROM history WHERE completed > ?""", (week_timest,)):
-            week = self.cursor.fetchone()["sum(bytes)"]
+        # Amount downloaded this month and this week
+        month = week = 0
+        if self.execute(
+            """SELECT
+                IFNULL(SUM(CASE WHEN hour >= ? THEN bytes END), 0) AS month,
+                IFNULL(SUM(CASE WHEN hour >= ? THEN bytes END), 0) AS week
+            FROM history_stats""",
+            (int(this_month(time.time())) // 3600, int(this_week(time.time())) // 3600),
+        ):
+            row = self.cursor.fetchone()
+            month, week = row["month"], row["week"]
 
         return total, month, week
 
+    def count_history(
+        self,
+        archive: Optional[bool] = None,
+        categories: Optional[list[str]] = None,
+        statuses: Optional[list[str]] = None,
+    ) -> int:
+        """Number of jobs in the history, using the totals instead of counting all jobs"""
+        cmd = "SELECT IFNULL(SUM(jobs), 0) AS jobs FROM history_stats WHERE archive = ?"
+        command_args = [1 if archive else 0]
+        if categories:
+            cmd += " AND category IN (%s)" % ", ".join("?" * len(categories))
+            command_args.extend(categories)
+        if statuses:
+            cmd += " AND status IN (%s)" % ", ".join("?" * len(statuses))
+            command_args.extend(statuses)
+        if self.execute(cmd, command_args):
+            return self.cursor.fetchone()["jobs"]
+        return -1
+
     def get_script_log(self, nzo_id: str) -> str:
         """Return decompressed log file"""
         data = ""
@@ -505,6 +855,15 @@ def convert_search(search: str) -> str:
     return search
 
 
+def parse_page_key(page: Optional[str]) -> Optional[tuple[int, int]]:
+    """Convert the page-cursor of fetch_history to the (completed, id) of the last job of the previous page"""
+    try:
+        completed, job_id = page.split("_")
+        return int(completed), int(job_id)
+    except (AttributeError, ValueError):
+        return None
+
+
 def build_history_info(
     nzo: "sabnzbd.nzb.NzbObject",
     workdir_complete: str,
@@ -574,7 +933,7 @@ def unpack_history_info(item: sqlite3.Row) -> dict[str, Any]:
     item = dict(item)
 
     # Stage Name is separated by ::: stage lines by ; and stages by \r\n
-    lst = item["stage_log"]
+    lst = item.get("stage_log")
     if lst:
         parsed_stage_log = []
         try:
@@ -611,7 +970,7 @@ def unpack_history_info(item: sqlite3.Row) -> dict[str, Any]:
     item["size"] = to_units(item["bytes"], "B")
 
     # We do not want the raw script output here
-    item.pop("script_log")
+    item.pop("script_log", None)
 
     # The action line and loaded is only available for items in the postproc queue
     item["action_line"] = ""
@@ -629,3 +988,102 @@ def unpack_history_info(item: sqlite3.Row) -> dict[str, Any]:
 def scheduled_history_purge():
     with HistoryDB() as history_db:
         history_db.auto_history_purge()
+
+
+def scheduled_history_maintenance():
+    with HistoryDB() as history_db:
+        history_db.maintenance()
+
+
+def checkpoint_history_db(db_path: str):
+    """Move all changes from the write-ahead log into the database file itself,
+    so the file can be copied. Only needed if the database is in use."""
+    if HistoryDB.startup_done and HistoryDB.db_path == db_path:
+        with HistoryDB() as history_db:
+            history_db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+
+def close_pooled_connections():
+    """Close all idle connections"""
+    with POOL_LOCK:
+        for _, connection in CONNECTION_POOL:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        CONNECTION_POOL.clear()
+
+
+@contextlib.contextmanager
+def history_db_closed():
+    """Close all connections while the database file is replaced, otherwise they would
+    keep using the write-ahead log of the old file. The next connection performs the startup again."""
+    with WRITE_LOCK:
+        HistoryDB.startup_done = False
+        HistoryDB.generation += 1
+        close_pooled_connections()
+        if HISTORY_WRITER:
+            HISTORY_WRITER.close()
+        if HistoryDB.db_path:
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(HistoryDB.db_path + suffix):
+                    remove_file(HistoryDB.db_path + suffix)
+        yield
+
+
+class HistoryWriter(threading.Thread):
+    """Performs the changes to the History database of all threads. Changes that
+    are requested at the same time are combined in a single transaction."""
+
+    def __init__(self):
+        super().__init__(name="HistoryWriter", daemon=True)
+        self.queue: queue.Queue[tuple[str, Sequence, Future]] = queue.Queue()
+        self.history_db: Optional[HistoryDB] = None
+
+    def write(self, command: str, args: Sequence = ()) -> bool:
+        """Queue the change and wait for it to be written"""
+        result = Future()
+        self.queue.put((command, args, result))
+        return result.result()
+
+    def close(self):
+        """Close the connection, only when holding the WRITE_LOCK"""
+        if self.history_db:
+            self.history_db.close(reuse=False)
+            self.history_db = None
+
+    def run(self):
+        while 1:
+            # Wait for a change, then add all others that were requested in the meantime
+            changes = [self.queue.get()]
+            while len(changes) < MAX_WRITE_BATCH:
+                try:
+                    changes.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            with WRITE_LOCK:
+                try:
+                    if not self.history_db or self.history_db.generation != HistoryDB.generation:
+                        self.close()
+                        self.history_db = HistoryDB()
+                    results = self.history_db.execute_batch([(command, args) for command, args, _ in changes])
+                except Exception:
+                    logging.info("Traceback: ", exc_info=True)
+                    results = [False] * len(changes)
+
+            for (_, _, result), success in zip(changes, results):
+                result.set_result(success)
+
+
+HISTORY_WRITER: Optional[HistoryWriter] = None
+
+
+@synchronized(DB_LOCK)
+def get_history_writer() -> HistoryWriter:
+    """Start the HistoryWriter when it's needed for the first time"""
+    global HISTORY_WRITER
+    if not HISTORY_WRITER:
+        HISTORY_WRITER = HistoryWriter()
+        HISTORY_WRITER.start()
+    return HISTORY_WRITER
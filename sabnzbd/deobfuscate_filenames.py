@@ -35,7 +35,7 @@ import re
 
 import sabnzbd
 from sabnzbd.filesystem import get_unique_filename, renamer, get_ext, get_basename
-from sabnzbd.par2file import is_par2_file, parse_par2_file
+from sabnzbd.par2file import is_par2_file, parse_par2_file, analyse_par2
 import sabnzbd.utils.file_extension as file_extension
 from sabnzbd.misc import match_str
 from sabnzbd.constants import IGNORED_MOVIE_FOLDERS
@@ -47,33 +47,58 @@ MIN_FILE_SIZE = 10 * 1024 * 1024
 
 def decode_par2(parfile: str) -> list[str]:
     """Parse a par2 file and rename files listed in the par2 to their real name. Return list of generated files"""
-    # Check if really a par2 file
-    if not is_par2_file(parfile):
-        logging.info("Par2 file %s was not really a par2 file")
-        return []
+    return decode_par2_files([parfile])
 
-    # Parse the par2 file
-    md5of16k = {}
-    parse_par2_file(parfile, md5of16k)
 
-    # Parse all files in the folder
-    dirname = os.path.dirname(parfile)
+def decode_par2_files(par2_files: list[str]) -> list[str]:
+    """Parse par2 files and rename files listed in them to their real name. Return list of generated files
+    All files of a par2 set list the same files, so only the smallest one of each set is parsed.
+    The files in a folder are read once, after which the sets are applied in order.
+    """
+    # Smallest par2 file of each set, per folder
+    par2_sets: dict[str, dict[str, str]] = {}
+    for parfile in par2_files:
+        # Check if really a par2 file
+        if not is_par2_file(parfile):
+            logging.info("Par2 file %s was not really a par2 file", parfile)
+            continue
+        setname, _, _ = analyse_par2(os.path.basename(parfile))
+        sets = par2_sets.setdefault(os.path.dirname(parfile), {})
+        if setname not in sets or os.path.getsize(parfile) < os.path.getsize(sets[setname]):
+            sets[setname] = parfile
+
     new_files = []  # list of new files generated
-    for fn in os.listdir(dirname):
-        filepath = os.path.join(dirname, fn)
-        # Only check files
-        if os.path.isfile(filepath):
+    for dirname, sets in par2_sets.items():
+        # Parse the par2 files, each set can use a different name for the same data
+        set_md5of16k = []
+        for parfile in sets.values():
+            md5of16k = {}
+            parse_par2_file(parfile, md5of16k)
+            set_md5of16k.append(md5of16k)
+
+        # Parse all files in the folder
+        for fn in os.listdir(dirname):
+            filepath = os.path.join(dirname, fn)
+            # Only check files
+            if not os.path.isfile(filepath):
+                continue
             with open(filepath, "rb") as fileToMatch:
                 first16k_data = fileToMatch.read(16384)
+            file_md5of16k = hashlib.md5(first16k_data).digest()
 
             # Check if we have this hash and the filename is different
-            file_md5of16k = hashlib.md5(first16k_data).digest()
-            if file_md5of16k in md5of16k and fn != md5of16k[file_md5of16k]:
-                new_path = os.path.join(dirname, md5of16k[file_md5of16k])
-                # Make sure it's a unique name
-                unique_filename = get_unique_filename(new_path)
-                renamer(filepath, unique_filename)
-                new_files.append(unique_filename)
+            renamed = False
+            for md5of16k in set_md5of16k:
+                if file_md5of16k in md5of16k and fn != md5of16k[file_md5of16k]:
+                    new_path = os.path.join(dirname, md5of16k[file_md5of16k])
+                    # Make sure it's a unique name
+                    unique_filename = get_unique_filename(new_path)
+                    renamer(filepath, unique_filename)
+                    filepath = unique_filename
+                    fn = os.path.basename(unique_filename)
+                    renamed = True
+            if renamed:
+                new_files.append(filepath)
     return new_files
 
 
@@ -87,17 +112,14 @@ def recover_par2_names(filelist: list[str]) -> list[str]:
     if not par2_files:
         logging.debug("No additional par2 files found to process")
     else:
-        # Run par2 from SABnzbd on them
-        for par2_file in par2_files:
-            # Analyse data and analyse result
-            logging.debug("Deobfuscate par2: handling %s", par2_file)
-            new_files = decode_par2(par2_file)
-            if new_files:
-                logging.debug("Deobfuscate par2 repair/verify finished")
-                filelist += new_files
-                filelist = [f for f in filelist if os.path.isfile(f)]
-            else:
-                logging.debug("Deobfuscate par2 repair/verify did not find anything to rename")
+        # Analyse data and analyse result
+        logging.debug("Deobfuscate par2: handling %s", par2_files)
+        if new_files := decode_par2_files(par2_files):
+            logging.debug("Deobfuscate par2 repair/verify finished")
+            filelist += new_files
+            filelist = [f for f in filelist if os.path.isfile(f)]
+        else:
+            logging.debug("Deobfuscate par2 repair/verify did not find anything to rename")
     return filelist
 
 
@@ -173,10 +195,11 @@ def get_biggest_file(filelist: list[str]) -> str:
     If only one file exists, return that. If no file, return None
     Note: the files in filelist must exist, because their sizes on disk are checked"""
 
-    # sort from big to small
-    filelist = sorted(filelist, key=os.path.getsize)[::-1]  # reversed, so big to small. Format [start:stop:step]
+    # sort from big to small, only getting the size of each file once
+    filesizes = {file: os.path.getsize(file) for file in filelist}
+    filelist = sorted(filelist, key=filesizes.get)[::-1]  # reversed, so big to small. Format [start:stop:step]
     try:
-        factor = os.path.getsize(filelist[0]) / os.path.getsize(filelist[1])
+        factor = filesizes[filelist[0]] / filesizes[filelist[1]]
         if factor > 3:
             return filelist[0]
         else:
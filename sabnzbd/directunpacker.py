@@ -43,56 +43,38 @@ from sabnzbd.utils.diskspeed import diskspeedmeasure
 # Otherwise we could stop while the thread was still starting
 START_STOP_LOCK = threading.RLock()
 
-ACTIVE_UNPACKERS = []
+# The running unrar processes of all jobs, limited by cfg.direct_unpack_threads
+ACTIVE_UNPACKERS: list["DirectUnpackSet"] = []
+
+# Sets waiting for their first volume or for a free spot in ACTIVE_UNPACKERS
+WAITING_UNPACKERS: list["DirectUnpackSet"] = []
+
+# Number of volumes ahead of unrar that get download priority
+PRIORITY_VOLUMES = 2
 
 RAR_NR = re.compile(r"(.*?)(\.part(\d*).rar|\.r(\d*))$", re.IGNORECASE)
 
 
-class DirectUnpacker(threading.Thread):
-    def __init__(self, nzo: NzbObject):
-        super().__init__()
+class DirectUnpacker:
+    """Keeps track of the Direct Unpack of all the sets of a job.
+    Each set is unpacked by its own DirectUnpackSet, so multiple sets
+    of the same job can be unpacked at the same time.
+    """
 
+    def __init__(self, nzo: NzbObject):
         self.nzo: NzbObject = nzo
-        self.active_instance: Optional[subprocess.Popen] = None
         self.killed: bool = False
         self.next_file_lock = threading.Condition(threading.RLock())
 
         self.unpack_dir_info = None
-        self.rarfile_nzf: Optional[NzbFile] = None
-        self.cur_setname: Optional[str] = None
-        self.cur_volume: int = 0
         self.total_volumes: dict[str, int] = {}
-        self.unpack_time: float = 0.0
+        self.volume_nzfs: dict[tuple[str, int], NzbFile] = {}
 
         self.success_sets: dict[str, tuple[list[str], list[str]]] = {}
-        self.next_sets: list[NzbFile] = []
-
-        self.duplicate_lines: int = 0
+        self.set_unpackers: dict[str, DirectUnpackSet] = {}
 
         nzo.direct_unpacker = self
 
-    def stop(self):
-        pass
-
-    def save(self):
-        pass
-
-    def reset_active(self):
-        # make sure the process and file handlers are closed nicely:
-        try:
-            if self.active_instance:
-                self.active_instance.stdout.close()
-                self.active_instance.stdin.close()
-                self.active_instance.wait(timeout=2)
-        except Exception:
-            logging.debug("Exception in reset_active()", exc_info=True)
-            pass
-
-        self.active_instance = None
-        self.cur_setname = None
-        self.cur_volume = 0
-        self.rarfile_nzf = None
-
     def check_requirements(self):
         if (
             not cfg.enable_unrar()
@@ -111,11 +93,13 @@ class DirectUnpacker(threading.Thread):
         logging.debug("Parsing setname and volume information for %s" % self.nzo.final_name)
         none_counter = 0
         found_counter = 0
+        volume_nzfs = {}
         for nzf in self.nzo.files + self.nzo.finished_files:
             nzf.setname, nzf.vol = analyze_rar_filename(nzf.filename)
             # We matched?
             if nzf.setname:
                 found_counter += 1
+                volume_nzfs[(nzf.setname, nzf.vol)] = nzf
                 if nzf.setname not in self.total_volumes:
                     self.total_volumes[nzf.setname] = 0
                 self.total_volumes[nzf.setname] = max(self.total_volumes[nzf.setname], nzf.vol)
@@ -125,10 +109,11 @@ class DirectUnpacker(threading.Thread):
         # Too much not found? Obfuscated, ignore results
         if none_counter > found_counter:
             self.total_volumes = {}
+        self.volume_nzfs = volume_nzfs
 
     @synchronized(START_STOP_LOCK)
     def add(self, nzf: NzbFile):
-        """Add jobs and start instance of DirectUnpack"""
+        """Add jobs and start instances of DirectUnpack"""
         if not cfg.direct_unpack_tested():
             test_disk_performance()
 
@@ -137,33 +122,160 @@ class DirectUnpacker(threading.Thread):
             return
 
         # Is this the first set?
-        if not self.cur_setname:
+        if not self.set_unpackers:
             self.set_volumes_for_nzo()
-            self.cur_setname = nzf.setname
 
         # Analyze updated filenames
         nzf.setname, nzf.vol = analyze_rar_filename(nzf.filename)
+        if nzf.setname:
+            self.volume_nzfs[(nzf.setname, nzf.vol)] = nzf
+
+        # Need to create the unpacker only once per set!
+        if nzf.setname and nzf.setname not in self.set_unpackers:
+            logging.debug("DirectUnpack queued %s for %s", nzf.filename, nzf.setname)
+            set_unpacker = DirectUnpackSet(self, nzf.setname)
+            self.set_unpackers[nzf.setname] = set_unpacker
+            WAITING_UNPACKERS.append(set_unpacker)
 
-        # Are we doing this set?
-        if self.cur_setname and self.cur_setname == nzf.setname:
-            logging.debug("DirectUnpack queued %s for %s", nzf.filename, self.cur_setname)
-            # Is this the first one of the first set?
-            if not self.active_instance and not self.is_alive() and self.have_next_volume():
-                # Too many runners already?
-                if len(ACTIVE_UNPACKERS) >= cfg.direct_unpack_threads():
-                    logging.info("Too many DirectUnpackers currently to start %s", self.cur_setname)
-                    return
-
-                # Start the unrar command and the loop
-                self.create_unrar_instance()
-                self.start()
-        elif not any(test_nzf.setname == nzf.setname for test_nzf in self.next_sets):
-            # Need to store this for the future, only once per set!
-            self.next_sets.append(nzf)
-
-        # Wake up the thread to see if this is good to go
+        # Maybe this was the first volume of a waiting set
+        start_waiting_unpackers()
+
+        # Wake up the threads to see if this is good to go
         with self.next_file_lock:
-            self.next_file_lock.notify()
+            self.next_file_lock.notify_all()
+
+    def is_alive(self) -> bool:
+        """Is any of the sets still being unpacked"""
+        return any(set_unpacker.is_alive() for set_unpacker in self.set_unpackers.values())
+
+    def next_volumes(self) -> list[NzbFile]:
+        """The files that the sets need next, in the order they will be unpacked"""
+        next_volumes = []
+        for set_unpacker in list(self.set_unpackers.values()):
+            for vol in set_unpacker.next_volumes():
+                if nzf := self.volume_nzfs.get((set_unpacker.setname, vol)):
+                    next_volumes.append(nzf)
+        return next_volumes
+
+    def active_sets(self) -> list["DirectUnpackSet"]:
+        """The sets that currently have a running unrar process"""
+        return [set_unpacker for set_unpacker in self.set_unpackers.values() if set_unpacker.active_instance]
+
+    @synchronized(START_STOP_LOCK)
+    def abort(self, abort_input: bytes = b"Q"):
+        """Abort all running instances and delete generated files"""
+        if not self.killed and self.set_unpackers:
+            logging.info("Aborting DirectUnpack for %s", self.nzo.final_name)
+            self.killed = True
+
+            # Save reference to the first rarfile of each set
+            rarfile_nzfs = [
+                set_unpacker.rarfile_nzf for set_unpacker in self.set_unpackers.values() if set_unpacker.rarfile_nzf
+            ]
+
+            # Don't start any of the waiting sets
+            for set_unpacker in self.set_unpackers.values():
+                if set_unpacker in WAITING_UNPACKERS:
+                    WAITING_UNPACKERS.remove(set_unpacker)
+
+            # Abort all Unrar instances at the same time
+            active_sets = self.active_sets()
+            if active_sets:
+                # First we try to abort gracefully
+                for set_unpacker in active_sets:
+                    try:
+                        set_unpacker.active_instance.stdin.write(abort_input + b"\n")
+                    except IOError:
+                        pass
+                time.sleep(0.2)
+
+                # Now force kill and give it a bit of time
+                for set_unpacker in active_sets:
+                    try:
+                        set_unpacker.active_instance.kill()
+                    except AttributeError:
+                        # Already killed by the Quit command
+                        pass
+                time.sleep(0.2)
+
+            # Wake up the threads
+            with self.next_file_lock:
+                self.next_file_lock.notify_all()
+
+            # No results
+            self.success_sets = {}
+
+            # Remove files
+            if self.unpack_dir_info:
+                extraction_path, _, _, one_folder, _ = self.unpack_dir_info
+                # In case of flat-unpack we need to remove the files manually
+                if one_folder:
+                    for rarfile_nzf in rarfile_nzfs:
+                        # RarFile can fail for mysterious reasons
+                        try:
+                            rar_contents = SABRarFile(
+                                os.path.join(self.nzo.download_path, rarfile_nzf.filename), part_only=True
+                            ).filelist()
+                            for rm_file in rar_contents:
+                                # Flat-unpack, so remove foldername from RarFile output
+                                f = os.path.join(extraction_path, os.path.basename(rm_file))
+                                remove_file(f)
+                        except Exception:
+                            # The user will have to remove it themselves
+                            logging.info(
+                                "Failed to clean Direct Unpack after aborting %s", rarfile_nzf.filename, exc_info=True
+                            )
+                else:
+                    # We can just remove the whole path
+                    remove_all(extraction_path, recursive=True)
+                # Remove dir-info
+                self.unpack_dir_info = None
+
+            # Reset settings
+            for set_unpacker in self.set_unpackers.values():
+                set_unpacker.reset_active()
+
+    def get_formatted_stats(self, include_time_left: bool = False) -> str:
+        """Get percentage or number of rar's done of all active sets"""
+        return ", ".join(set_unpacker.get_formatted_stats(include_time_left) for set_unpacker in self.active_sets())
+
+
+class DirectUnpackSet(threading.Thread):
+    """Unpack a single set of a job using its own unrar process"""
+
+    def __init__(self, direct_unpacker: DirectUnpacker, setname: str):
+        super().__init__()
+
+        self.direct_unpacker: DirectUnpacker = direct_unpacker
+        self.nzo: NzbObject = direct_unpacker.nzo
+        self.setname: str = setname
+        self.active_instance: Optional[subprocess.Popen] = None
+        self.lock = threading.RLock()
+
+        self.rarfile_nzf: Optional[NzbFile] = None
+        self.cur_volume: int = 0
+        self.unpack_time: float = 0.0
+        self.duplicate_lines: int = 0
+
+    @property
+    def killed(self) -> bool:
+        return self.direct_unpacker.killed
+
+    def reset_active(self):
+        # make sure the process and file handlers are closed nicely:
+        with self.lock:
+            try:
+                if self.active_instance:
+                    self.active_instance.stdout.close()
+                    self.active_instance.stdin.close()
+                    self.active_instance.wait(timeout=2)
+            except Exception:
+                logging.debug("Exception in reset_active()", exc_info=True)
+                pass
+
+            self.active_instance = None
+            self.cur_volume = 0
+            self.rarfile_nzf = None
 
     def run(self):
         # Input and output
@@ -177,7 +289,7 @@ class DirectUnpacker(threading.Thread):
         # Need to read char-by-char because there's no newline after new-disk message
         while 1:
             # We need to lock, so we don't crash if unpacker is deleted while we read
-            with START_STOP_LOCK:
+            with self.lock:
                 if not self.active_instance or not self.active_instance.stdout:
                     break
 
@@ -224,14 +336,13 @@ class DirectUnpacker(threading.Thread):
                         "Unexpected end of archive",
                     )
                 ):
-                    logging.info("Error in DirectUnpack of %s: %s", self.cur_setname, linebuf_encoded)
-                    self.abort()
+                    logging.info("Error in DirectUnpack of %s: %s", self.setname, linebuf_encoded)
+                    self.direct_unpacker.abort()
 
                 elif linebuf_encoded.startswith("All OK"):
                     # Did we reach the end?
                     # Stop timer and finish
                     self.unpack_time += time.time() - start_time
-                    ACTIVE_UNPACKERS.remove(self)
 
                     # Take note of the correct password
                     if self.nzo.password and not self.nzo.correct_password:
@@ -239,51 +350,18 @@ class DirectUnpacker(threading.Thread):
 
                     # Add to success
                     rarfile_path = os.path.join(self.nzo.download_path, self.rarfile_nzf.filename)
-                    self.success_sets[self.cur_setname] = (
+                    self.direct_unpacker.success_sets[self.setname] = (
                         rar_volumelist(rarfile_path, self.nzo.correct_password, rarfiles),
                         extracted,
                     )
-                    logging.info("DirectUnpack completed for %s", self.cur_setname)
+                    logging.info("DirectUnpack completed for %s", self.setname)
                     self.nzo.set_action_line(T("Direct Unpack"), T("Completed"))
 
                     # List success in history-info
                     msg = T("Unpacked %s files/folders in %s") % (len(extracted), format_time_string(self.unpack_time))
                     msg = "%s - %s" % (T("Direct Unpack"), msg)
-                    self.nzo.set_unpack_info("Unpack", msg, self.cur_setname)
-
-                    # Write current log and clear
-                    logging.debug("DirectUnpack Unrar output: \n%s", "\n".join(unrar_log))
-                    unrar_log = []
-                    rarfiles = []
-                    extracted = []
-
-                    # Are there more files left?
-                    with self.next_file_lock:
-                        logging.debug("Direct Unpack for %s waiting for more sets", self.nzo.final_name)
-                        self.next_file_lock.wait_for(
-                            lambda: self.nzo.removed_from_queue or self.next_sets or self.killed
-                        )
-
-                    # Is there another set to do?
-                    logging.debug(
-                        "Direct Unpack for %s continuing: killed=%s, cur_setname=%s, next_sets=%s",
-                        self.nzo.final_name,
-                        self.killed,
-                        self.cur_setname,
-                        self.next_sets,
-                    )
-                    if self.next_sets:
-                        # Start new instance
-                        nzf = self.next_sets.pop(0)
-                        self.reset_active()
-                        self.cur_setname = nzf.setname
-                        # Wait for the 1st volume to appear
-                        self.wait_for_next_volume()
-                        self.create_unrar_instance()
-                        start_time = time.time()
-                    else:
-                        self.killed = True
-                        break
+                    self.nzo.set_unpack_info("Unpack", msg, self.setname)
+                    break
 
                 elif linebuf_encoded.startswith("Extracting from"):
                     # List files we used
@@ -296,7 +374,7 @@ class DirectUnpacker(threading.Thread):
                     unpacked_file = m.group(2)
                     if cfg.flat_unpack():
                         unpacked_file = os.path.basename(unpacked_file)
-                    extracted.append(real_path(self.unpack_dir_info[0], unpacked_file))
+                    extracted.append(real_path(self.direct_unpacker.unpack_dir_info[0], unpacked_file))
 
             if linebuf.endswith(b"[C]ontinue, [Q]uit "):
                 # Stop timer
@@ -317,23 +395,25 @@ class DirectUnpacker(threading.Thread):
                         self.active_instance.stdin.write(b"C\n")
                         start_time = time.time()
                         time.sleep(0.1)
-                    except IOError:
-                        self.abort()
+                    except (IOError, AttributeError):
+                        self.direct_unpacker.abort()
                         break
 
                     # Did we unpack a new volume? Sometimes UnRar hangs on 1 volume
                     if not last_volume_linebuf or last_volume_linebuf != linebuf:
                         # Next volume
                         self.cur_volume += 1
-                        self.nzo.set_action_line(T("Direct Unpack"), self.get_formatted_stats(include_time_left=True))
-                        logging.info("DirectUnpacked volume %s for %s", self.cur_volume, self.cur_setname)
+                        self.nzo.set_action_line(
+                            T("Direct Unpack"), self.direct_unpacker.get_formatted_stats(include_time_left=True)
+                        )
+                        logging.info("DirectUnpacked volume %s for %s", self.cur_volume, self.setname)
 
                     # If lines did not change and we don't have the next volume, this download is missing files!
                     # In rare occasions we can get stuck forever with repeating lines
                     if last_volume_linebuf == linebuf:
                         if not self.have_next_volume() or self.duplicate_lines > 10:
-                            logging.info("DirectUnpack failed due to missing files %s", self.cur_setname)
-                            self.abort()
+                            logging.info("DirectUnpack failed due to missing files %s", self.setname)
+                            self.direct_unpacker.abort()
                         else:
                             logging.debug('Duplicate output line detected: "%s"', platform_btou(last_volume_linebuf))
                             self.duplicate_lines += 1
@@ -342,8 +422,8 @@ class DirectUnpacker(threading.Thread):
                     last_volume_linebuf = linebuf
 
             elif linebuf.endswith(b"[R]etry, [A]bort "):
-                logging.info("Error in DirectUnpack of %s: %s", self.cur_setname, platform_btou(linebuf.strip()))
-                self.abort(b"A")
+                logging.info("Error in DirectUnpack of %s: %s", self.setname, platform_btou(linebuf.strip()))
+                self.direct_unpacker.abort(b"A")
 
         # Add last line and write any new output
         if linebuf:
@@ -352,13 +432,14 @@ class DirectUnpacker(threading.Thread):
             logging.debug("DirectUnpack Unrar output: \n%s", "\n".join(unrar_log))
 
         with START_STOP_LOCK:
-            # Set the thread to killed so it never gets restarted by accident
-            self.killed = True
             # Make more space
             self.reset_active()
             if self in ACTIVE_UNPACKERS:
                 ACTIVE_UNPACKERS.remove(self)
-            logging.debug("Closing DirectUnpack for %s", self.nzo.final_name)
+            logging.debug("Closing DirectUnpack for %s", self.setname)
+
+            # Give the free spot to the next set
+            start_waiting_unpackers()
 
     def have_next_volume(self):
         """Check if next volume of set is available, start
@@ -366,35 +447,43 @@ class DirectUnpacker(threading.Thread):
         Make sure that files are 100% written to disk by checking nzf.assembled
         """
         for nzf_search in reversed(self.nzo.finished_files):
-            if (
-                nzf_search.setname == self.cur_setname
-                and nzf_search.vol == (self.cur_volume + 1)
-                and nzf_search.assembled
-            ):
+            if nzf_search.setname == self.setname and nzf_search.vol == (self.cur_volume + 1) and nzf_search.assembled:
                 return nzf_search
         return False
 
+    def next_volumes(self) -> list[int]:
+        """The volume numbers this set needs next, if it is still running or waiting to be started"""
+        if self.active_instance:
+            first_volume = self.cur_volume + 1
+        elif self in WAITING_UNPACKERS:
+            first_volume = 1
+        else:
+            return []
+        return list(range(first_volume, first_volume + PRIORITY_VOLUMES))
+
     def wait_for_next_volume(self):
         """Wait for the correct volume to appear but stop if it was killed
         or the NZB is in post-processing and no new files will be downloaded.
         """
-        with self.next_file_lock:
-            self.next_file_lock.wait_for(lambda: self.have_next_volume() or self.killed or self.nzo.pp_active)
+        with self.direct_unpacker.next_file_lock:
+            self.direct_unpacker.next_file_lock.wait_for(
+                lambda: self.have_next_volume() or self.killed or self.nzo.pp_active
+            )
 
     @synchronized(START_STOP_LOCK)
     def create_unrar_instance(self):
         """Start the unrar instance using the user's options"""
-        # Generate extraction path and save for post-proc
-        if not self.unpack_dir_info:
+        # Generate extraction path and save for post-proc, shared by all sets
+        if not self.direct_unpacker.unpack_dir_info:
             try:
-                self.unpack_dir_info = prepare_extraction_path(self.nzo)
+                self.direct_unpacker.unpack_dir_info = prepare_extraction_path(self.nzo)
             except Exception:
                 # Prevent fatal crash if directory creation fails
-                self.abort()
+                self.direct_unpacker.abort()
                 return
 
         # Get the information
-        extraction_path, _, _, one_folder, _ = self.unpack_dir_info
+        extraction_path, _, _, one_folder, _ = self.direct_unpacker.unpack_dir_info
 
         # Set options
         if self.nzo.correct_password:
@@ -454,85 +543,58 @@ class DirectUnpacker(threading.Thread):
         ACTIVE_UNPACKERS.append(self)
 
         # Doing the first
-        logging.info("DirectUnpacked volume %s for %s", self.cur_volume, self.cur_setname)
-
-    @synchronized(START_STOP_LOCK)
-    def abort(self, abort_input: bytes = b"Q"):
-        """Abort running instance and delete generated files"""
-        if not self.killed and self.cur_setname:
-            logging.info("Aborting DirectUnpack for %s", self.cur_setname)
-            self.killed = True
-
-            # Save reference to the first rarfile
-            rarfile_nzf = self.rarfile_nzf
-
-            # Abort Unrar
-            if self.active_instance:
-                # First we try to abort gracefully
-                try:
-                    self.active_instance.stdin.write(abort_input + b"\n")
-                    time.sleep(0.2)
-                except IOError:
-                    pass
-
-                # Now force kill and give it a bit of time
-                try:
-                    self.active_instance.kill()
-                    time.sleep(0.2)
-                except AttributeError:
-                    # Already killed by the Quit command
-                    pass
-
-            # Wake up the thread
-            with self.next_file_lock:
-                self.next_file_lock.notify()
-
-            # No new sets
-            self.next_sets = []
-            self.success_sets = {}
-
-            # Remove files
-            if self.unpack_dir_info:
-                extraction_path, _, _, one_folder, _ = self.unpack_dir_info
-                # In case of flat-unpack we need to remove the files manually
-                if one_folder:
-                    # RarFile can fail for mysterious reasons
-                    try:
-                        rar_contents = SABRarFile(
-                            os.path.join(self.nzo.download_path, rarfile_nzf.filename), part_only=True
-                        ).filelist()
-                        for rm_file in rar_contents:
-                            # Flat-unpack, so remove foldername from RarFile output
-                            f = os.path.join(extraction_path, os.path.basename(rm_file))
-                            remove_file(f)
-                    except Exception:
-                        # The user will have to remove it themselves
-                        logging.info(
-                            "Failed to clean Direct Unpack after aborting %s", rarfile_nzf.filename, exc_info=True
-                        )
-                else:
-                    # We can just remove the whole path
-                    remove_all(extraction_path, recursive=True)
-                # Remove dir-info
-                self.unpack_dir_info = None
-
-            # Reset settings
-            self.reset_active()
+        logging.info("DirectUnpacked volume %s for %s", self.cur_volume, self.setname)
 
     def get_formatted_stats(self, include_time_left: bool = False) -> str:
         """Get percentage or number of rar's done"""
-        if self.cur_setname and self.cur_setname in self.total_volumes:
+        if self.setname in self.direct_unpacker.total_volumes:
             # This won't work on obfuscated posts
-            if self.total_volumes[self.cur_setname] >= self.cur_volume and self.cur_volume:
-                formatted_stats = "%02d/%02d" % (self.cur_volume, self.total_volumes[self.cur_setname])
+            total_volumes = self.direct_unpacker.total_volumes[self.setname]
+            if total_volumes >= self.cur_volume and self.cur_volume:
+                formatted_stats = "%02d/%02d" % (self.cur_volume, total_volumes)
                 if include_time_left:
                     formatted_stats += add_time_left(
-                        (self.cur_volume / self.total_volumes[self.cur_setname]) * 100, time_used=self.unpack_time
+                        (self.cur_volume / total_volumes) * 100, time_used=self.unpack_time
                     )
                 return formatted_stats
         return str(self.cur_volume)
 
 
+def unpacker_priority(set_unpacker: DirectUnpackSet) -> tuple[int, int]:
+    """Sort key for the waiting sets: first spread the unrar processes fairly
+    over the jobs, then prefer the job that is closest to being completed
+    """
+    return len(set_unpacker.direct_unpacker.active_sets()), set_unpacker.nzo.remaining
+
+
+@synchronized(START_STOP_LOCK)
+def start_waiting_unpackers():
+    """Start unrar for the waiting sets that have their first volume,
+    as long as the total number of unrar processes is below the limit
+    """
+    # Post-processing will take care of the sets that did not start in time
+    for set_unpacker in WAITING_UNPACKERS[:]:
+        if set_unpacker.killed or set_unpacker.nzo.pp_active:
+            WAITING_UNPACKERS.remove(set_unpacker)
+
+    while len(ACTIVE_UNPACKERS) < cfg.direct_unpack_threads():
+        # The order of the list is kept for sets with the same priority
+        if not (
+            ready_unpackers := [set_unpacker for set_unpacker in WAITING_UNPACKERS if set_unpacker.have_next_volume()]
+        ):
+            return
+        set_unpacker = min(ready_unpackers, key=unpacker_priority)
+        WAITING_UNPACKERS.remove(set_unpacker)
+
+        # Start the unrar command and the loop
+        set_unpacker.create_unrar_instance()
+        if set_unpacker.active_instance:
+            set_unpacker.start()
+
+    if WAITING_UNPACKERS:
+        logging.debug("Too many DirectUnpackers currently, %s sets waiting", len(WAITING_UNPACKERS))
+
+
 def analyze_rar_filename(filename):
     """Extract volume number and setname from rar-filenames
     Both ".part01.rar" and ".r01"
@@ -552,8 +614,8 @@ def analyze_rar_filename(filename):
 def abort_all():
     """Abort all running DirectUnpackers"""
     logging.info("Aborting all DirectUnpackers")
-    for direct_unpacker in ACTIVE_UNPACKERS:
-        direct_unpacker.abort()
+    for set_unpacker in ACTIVE_UNPACKERS[:]:
+        set_unpacker.direct_unpacker.abort()
 
 
 def test_disk_performance():
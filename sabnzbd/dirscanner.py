@@ -20,8 +20,12 @@ sabnzbd.dirscanner - Scanner for Watched Folder
 """
 
 import asyncio
+import ctypes
+import ctypes.util
 import os
 import logging
+import struct
+import sys
 import threading
 from typing import Generator, Optional
 
@@ -34,6 +38,24 @@ import sabnzbd.cfg as cfg
 DIR_SCANNER_LOCK = threading.RLock()
 VALID_EXTENSIONS = set(VALID_NZB_FILES + VALID_ARCHIVES)
 
+# Linux can notify us of the files written to the watched folder, see "man 7 inotify"
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_FILE_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+INOTIFY_FOLDER_MASK = INOTIFY_FILE_MASK | IN_CREATE
+
+HAVE_INOTIFY = False
+if sys.platform.startswith("linux"):
+    try:
+        LIBC = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        HAVE_INOTIFY = bool(LIBC.inotify_init1 and LIBC.inotify_add_watch)
+    except (OSError, AttributeError):
+        pass
+
 
 def compare_stat_tuple(tup1, tup2):
     """Test equality of two stat-tuples, content-related parts only"""
@@ -54,6 +76,47 @@ async def clean_file_list(inp_list, files):
         del inp_list[path]
 
 
+class Inotify:
+    """Minimal interface to the inotify API of Linux"""
+
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        if (fd := LIBC.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)) < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.fd = fd
+        self.watches: dict[int, str] = {}
+
+    def add_watch(self, folder: str, mask: int):
+        if (wd := LIBC.inotify_add_watch(self.fd, os.fsencode(folder), mask)) < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), folder)
+        self.watches[wd] = folder
+
+    def read_events(self) -> list[tuple[Optional[str], int, str]]:
+        """Return the folder, mask and filename of the events that are waiting"""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos + self.EVENT.size <= len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+            pos += self.EVENT.size
+            name = os.fsdecode(data[pos : pos + length].rstrip(b"\0"))
+            pos += length
+            # The watch is gone when the folder was removed
+            folder = self.watches.pop(wd, None) if mask & IN_IGNORED else self.watches.get(wd)
+            events.append((folder, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
 class DirScanner(threading.Thread):
     """Thread that periodically scans a given directory and picks up any
     valid NZB, NZB.GZ ZIP-with-only-NZB and even NZB.GZ named as .NZB
@@ -71,6 +134,9 @@ class DirScanner(threading.Thread):
         self.error_reported = False  # Prevents multiple reporting of missing watched folder
         self.dirscan_dir = cfg.dirscan_dir.get_path()
         self.dirscan_speed = cfg.dirscan_speed()
+        self.inotify: Optional[Inotify] = None
+        self.inotify_dir: Optional[str] = None
+        self.rescan = True  # Scan the folder even when notified of changes, as some changes could have been missed
         cfg.dirscan_dir.callback(self.newdir)
         cfg.dirscan_speed.callback(self.newspeed)
 
@@ -180,8 +246,8 @@ class DirScanner(threading.Thread):
                 logging.info("Traceback: ", exc_info=True)
                 self.error_reported = True
 
-    async def when_stable_add_nzbfile(self, path: str, catdir: Optional[str], stat_tuple: os.stat_result):
-        """Try and import the NZB but wait until the attributes are stable for 1 second, but give up after 3 sec"""
+    async def when_stable(self, path: str, stat_tuple: os.stat_result) -> Optional[os.stat_result]:
+        """Wait until the attributes are stable for 1 second, but give up after 3 sec"""
         logging.info("Trying to import %s", path)
 
         # Wait until the attributes are stable for 1 second, but give up after 3 sec
@@ -194,14 +260,19 @@ class DirScanner(threading.Thread):
             except OSError:
                 continue
             if compare_stat_tuple(stat_tuple, stat_tuple_tmp):
-                break
+                return stat_tuple
             stat_tuple = stat_tuple_tmp
-        else:
-            # Not stable
-            return
 
-        # Add the NZB's
+        # Not stable
+        return None
+
+    def add_nzbfile(self, path: str, catdir: Optional[str], stat_tuple: os.stat_result):
+        """Add the NZB's of a single file"""
         res, _ = sabnzbd.nzbparser.add_nzbfile(path, catdir=catdir, keep=False)
+        self.add_result(path, stat_tuple, res)
+
+    def add_result(self, path: str, stat_tuple: os.stat_result, res: AddNzbFileResult):
+        """Remember the files that could not be added"""
         if res is AddNzbFileResult.RETRY or res is AddNzbFileResult.ERROR:
             # Retry later, for example when we can't read the file
             self.suspected[path] = stat_tuple
@@ -230,7 +301,8 @@ class DirScanner(threading.Thread):
                 return
 
             files: set[str] = set()
-            futures: set[asyncio.Task] = set()
+            candidates: list[tuple[str, Optional[str]]] = []
+            futures: list[asyncio.Task] = []
 
             for path, catdir, stat_tuple in self.get_suspected_files(dirscan_dir):
                 files.add(path)
@@ -239,25 +311,133 @@ class DirScanner(threading.Thread):
                     continue
 
                 if stat_tuple.st_size > 0:
-                    futures.add(asyncio.create_task(self.when_stable_add_nzbfile(path, catdir, stat_tuple)))
+                    candidates.append((path, catdir))
+                    futures.append(asyncio.create_task(self.when_stable(path, stat_tuple)))
                     await asyncio.sleep(0)
 
             # Remove files from the bookkeeping that are no longer on the disk
-            # Wait for the paths found in this scan to finish
-            await asyncio.gather(clean_file_list(self.ignored, files), clean_file_list(self.suspected, files), *futures)
+            # Wait for the paths found in this scan to be stable
+            _, _, *stat_tuples = await asyncio.gather(
+                clean_file_list(self.ignored, files), clean_file_list(self.suspected, files), *futures
+            )
+
+            # Add them all at once, so the jobs can be created at the same time
+            stable = [(nzbfile, stat_tuple) for nzbfile, stat_tuple in zip(candidates, stat_tuples) if stat_tuple]
+            if stable:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, sabnzbd.nzbparser.add_nzbfiles, [nzbfile for nzbfile, _ in stable]
+                )
+                for ((path, _), stat_tuple), (res, _) in zip(stable, results):
+                    self.add_result(path, stat_tuple, res)
 
     async def scanner(self):
-        """Periodically scan the directory and add NZB files to the queue"""
-        while True:
-            if not (dirscan_speed := self.dirscan_speed):
-                break
+        """Periodically scan the directory and add NZB files to the queue.
+        When notified of changes, only scan when changes could have been missed.
+        """
+        try:
+            while True:
+                if not (dirscan_speed := self.dirscan_speed):
+                    break
+
+                if not (dirscan_dir := self.dirscan_dir):
+                    break
+
+                self.update_watch(dirscan_dir)
+                if not self.inotify or (self.rescan and not sabnzbd.PAUSED_ALL):
+                    self.rescan = False
+                    await self.scan_async(dirscan_dir)
+
+                await asyncio.sleep(dirscan_speed)
+        finally:
+            self.stop_watch()
 
-            if not (dirscan_dir := self.dirscan_dir):
-                break
+    def update_watch(self, dirscan_dir: str):
+        """Start or stop getting notified of the files written to the watched folder"""
+        if not HAVE_INOTIFY or not cfg.dirscan_inotify():
+            self.stop_watch()
+            return
+
+        if self.inotify and self.inotify_dir == dirscan_dir:
+            return
 
-            await self.scan_async(dirscan_dir)
+        self.stop_watch()
+        try:
+            inotify = Inotify()
+        except OSError:
+            logging.info("Cannot use inotify for the Watched Folder", exc_info=True)
+            return
+
+        try:
+            inotify.add_watch(dirscan_dir, INOTIFY_FOLDER_MASK)
+            cats = config.get_categories()
+            with os.scandir(dirscan_dir) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name.lower() in cats:
+                        inotify.add_watch(entry.path, INOTIFY_FILE_MASK)
+        except OSError:
+            logging.info("Cannot use inotify for %s, scanning it instead", dirscan_dir, exc_info=True)
+            inotify.close()
+            return
+
+        logging.debug("Using inotify for %s", dirscan_dir)
+        asyncio.get_running_loop().add_reader(inotify.fd, self.inotify_events)
+        self.inotify = inotify
+        self.inotify_dir = dirscan_dir
+        self.rescan = True
+
+    def stop_watch(self):
+        if self.inotify:
+            asyncio.get_running_loop().remove_reader(self.inotify.fd)
+            self.inotify.close()
+            self.inotify = None
+            self.inotify_dir = None
+
+    def inotify_events(self):
+        """Add the files that were written to or moved into the watched folder.
+        Files are closed after writing, so there is no need to wait until they are stable.
+        """
+        for folder, mask, name in self.inotify.read_events():
+            if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                # Events were lost or a watched folder was removed
+                self.rescan = True
+                if folder == self.inotify_dir:
+                    self.stop_watch()
+                    return
+                continue
+
+            if not folder or not name:
+                continue
+
+            path = os.path.join(folder, name)
+            catdir = None if folder == self.inotify_dir else os.path.basename(folder)
+            if mask & IN_ISDIR:
+                if not catdir and name.lower() in config.get_categories():
+                    try:
+                        self.inotify.add_watch(path, INOTIFY_FILE_MASK)
+                    except OSError:
+                        pass
+                    # It might already contain files
+                    self.rescan = True
+                continue
+
+            if not mask & INOTIFY_FILE_MASK or filesystem.get_ext(path) not in VALID_EXTENSIONS:
+                continue
+
+            if sabnzbd.PAUSED_ALL:
+                self.rescan = True
+                continue
+
+            try:
+                stat_tuple = os.stat(path)
+            except OSError:
+                continue
 
-            await asyncio.sleep(dirscan_speed)
+            if stat_tuple.st_size > 0:
+                # New content, so try again if it couldn't be added before
+                self.ignored.pop(path, None)
+                self.suspected.pop(path, None)
+                logging.info("Trying to import %s", path)
+                self.add_nzbfile(path, catdir, stat_tuple)
 
     async def shutdown(self):
         """Cancel all tasks and stop the loop"""
@@ -0,0 +1,218 @@
+#!/usr/bin/python3 -OO
+# Copyright 2007-2026 by The SABnzbd-Team (sabnzbd.org)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+sabnzbd.events - Push changes of the queue, speed, history and warnings to clients as server-sent events
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Generator
+
+import sabnzbd
+import sabnzbd.cfg as cfg
+from sabnzbd.constants import KIBI
+from sabnzbd.decorators import synchronized
+from sabnzbd.encoding import utob
+from sabnzbd.misc import to_units
+
+# Seconds between checks for changes and the minimum interval between events sent to a client
+EVENT_CHECK_INTERVAL = 1.0
+# Send a comment when there were no events, so proxies don't close the connection
+EVENT_KEEPALIVE = 15.0
+# Maximum number of history jobs that are followed, older jobs can be requested using the API
+EVENT_HISTORY_LIMIT = 100
+
+EVENTS_LOCK = threading.RLock()
+
+
+class EventClient:
+    """The events waiting to be sent to a single client.
+    Events about the same job are combined, so a slow client only gets the latest state.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = max(interval, EVENT_CHECK_INTERVAL)
+        self.condition = threading.Condition()
+        self.pending: OrderedDict[tuple[str, str], tuple[str, Any]] = OrderedDict()
+        self.event_id: int = 0
+
+    def put(self, group: str, key: str, event: str, data: Any):
+        """Add an event, replacing the pending event of the same group and key"""
+        with self.condition:
+            if previous := self.pending.pop((group, key), None):
+                previous_event = previous[0]
+                if previous_event.endswith("_added"):
+                    if event.endswith("_removed"):
+                        # The client never knew about it
+                        return
+                    # The client still has to add it
+                    event = previous_event
+            self.pending[(group, key)] = (event, data)
+            self.condition.notify()
+
+    def get(self, timeout: float) -> list[tuple[str, Any]]:
+        """Wait for events and return all that are pending"""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            events = list(self.pending.values())
+            self.pending.clear()
+        return events
+
+    def stream(self) -> Generator[bytes, None, None]:
+        """Format the events as server-sent events, at most one batch per interval"""
+        try:
+            yield b"retry: 5000\n\n"
+            while not sabnzbd.SABSTOP:
+                last_sent = time.time()
+                if events := self.get(EVENT_KEEPALIVE):
+                    output = []
+                    for event, data in events:
+                        self.event_id += 1
+                        output.append("id: %d\nevent: %s\ndata: %s\n\n" % (self.event_id, event, json.dumps(data)))
+                    yield utob("".join(output))
+                else:
+                    yield b": keepalive\n\n"
+                # Combine the events that arrive in the meantime
+                if (wait := self.interval - (time.time() - last_sent)) > 0:
+                    time.sleep(wait)
+        finally:
+            unsubscribe(self)
+
+
+class EventPublisher(threading.Thread):
+    """Check for changes while there are clients and send them as events"""
+
+    def __init__(self):
+        super().__init__(name="EventPublisher", daemon=True)
+        self.clients: list[EventClient] = []
+        self.stopped = False
+        self.speed: Optional[float] = None
+        self.queue_slots: dict[str, dict[str, Any]] = {}
+        self.history_update: Optional[int] = None
+        self.history_slots: dict[str, dict[str, Any]] = {}
+        self.warnings: list[dict[str, Any]] = []
+
+    def run(self):
+        while not sabnzbd.SABSTOP:
+            with EVENTS_LOCK:
+                if not self.clients:
+                    # A new one is started for the next client
+                    self.stopped = True
+                    break
+            try:
+                self.publish_changes()
+            except Exception:
+                logging.info("Traceback: ", exc_info=True)
+            time.sleep(EVENT_CHECK_INTERVAL)
+
+    def publish(self, group: str, key: str, event: str, data: Any, clients: Optional[list[EventClient]] = None):
+        for client in clients or self.clients:
+            client.put(group, key, event, data)
+
+    def publish_slots(
+        self, group: str, old_slots: dict[str, dict[str, Any]], new_slots: dict[str, dict[str, Any]]
+    ) -> dict[str, dict[str, Any]]:
+        """Send the added, updated and removed jobs"""
+        for nzo_id, slot in new_slots.items():
+            if nzo_id not in old_slots:
+                self.publish(group, nzo_id, group + "_added", slot)
+            elif old_slots[nzo_id] != slot:
+                self.publish(group, nzo_id, group + "_updated", slot)
+        for nzo_id in old_slots:
+            if nzo_id not in new_slots:
+                self.publish(group, nzo_id, group + "_removed", {"nzo_id": nzo_id})
+        return new_slots
+
+    def publish_changes(self):
+        # The state is built without holding the lock, so new clients don't have to wait for it
+        speed = sabnzbd.BPSMeter.bps
+
+        # The queue slots are only rebuilt by the API if the queue changed
+        queue_slots = slots_by_id(sabnzbd.api.build_queue()["slots"])
+
+        # Jobs in post-processing change without updating the history version
+        history_slots = None
+        history_update = sabnzbd.LAST_HISTORY_UPDATE
+        if history_update != self.history_update or sabnzbd.PostProcessor.history_queue:
+            history_limit = min(cfg.history_limit() or EVENT_HISTORY_LIMIT, EVENT_HISTORY_LIMIT)
+            history_slots = slots_by_id(sabnzbd.api.build_history(limit=history_limit)[0])
+
+        warnings = sabnzbd.GUIHANDLER.content()
+
+        # Clients that subscribe in the meantime get either the old state and the changes, or the new state
+        with EVENTS_LOCK:
+            if speed != self.speed:
+                self.speed = speed
+                self.publish("speed", "", "speed", self.speed_event())
+
+            self.queue_slots = self.publish_slots("queue", self.queue_slots, queue_slots)
+
+            if history_slots is not None:
+                self.history_update = history_update
+                self.history_slots = self.publish_slots("history", self.history_slots, history_slots)
+
+            if warnings != self.warnings:
+                for warning in warnings:
+                    if warning not in self.warnings:
+                        self.publish("warning", "%s%s" % (warning["origin"], warning["time"]), "warning", warning)
+                self.warnings = list(warnings)
+
+    def speed_event(self) -> dict[str, Any]:
+        return {"kbpersec": "%.2f" % (self.speed / KIBI), "speed": to_units(self.speed)}
+
+    def send_current_state(self, client: EventClient):
+        """New clients first get the current state, after that only the changes"""
+        if self.speed is not None:
+            self.publish("speed", "", "speed", self.speed_event(), [client])
+        for group, slots in (("queue", self.queue_slots), ("history", self.history_slots)):
+            for nzo_id, slot in slots.items():
+                self.publish(group, nzo_id, group + "_added", slot, [client])
+
+
+def slots_by_id(slots: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Leave out the time, as it changes every second for jobs in post-processing"""
+    return {slot["nzo_id"]: {key: value for key, value in slot.items() if key != "completed"} for slot in slots}
+
+
+PUBLISHER: Optional[EventPublisher] = None
+
+
+@synchronized(EVENTS_LOCK)
+def subscribe(interval: float = 0) -> Optional[EventClient]:
+    """Add a client, returns None if the maximum number of clients is reached"""
+    global PUBLISHER
+    if (len(PUBLISHER.clients) if PUBLISHER else 0) >= cfg.max_event_streams():
+        logging.info("Maximum number of event streams reached")
+        return None
+    if not PUBLISHER or PUBLISHER.stopped:
+        PUBLISHER = EventPublisher()
+        PUBLISHER.start()
+    client = EventClient(interval)
+    PUBLISHER.send_current_state(client)
+    PUBLISHER.clients.append(client)
+    return client
+
+
+@synchronized(EVENTS_LOCK)
+def unsubscribe(client: EventClient):
+    if PUBLISHER and client in PUBLISHER.clients:
+        PUBLISHER.clients.remove(client)
@@ -19,6 +19,8 @@
 sabnzbd.misc - filesystem operations
 """
 
+import contextlib
+import errno
 import gzip
 import os
 import pickle
@@ -35,7 +37,7 @@ import stat
 import ctypes
 import random
 from dataclasses import dataclass
-from typing import Union, Any, Optional, BinaryIO
+from typing import Union, Any, Optional, BinaryIO, Generator
 
 try:
     import win32api
@@ -147,6 +149,14 @@ def is_size(filepath: str, size: int) -> bool:
         return False
 
 
+def get_filesize(filepath: str) -> int:
+    """Return size of filepath, or -1 if it cannot be accessed"""
+    try:
+        return os.path.getsize(filepath)
+    except Exception:
+        return -1
+
+
 _DEVICES = (
     "con",
     "prn",
@@ -1178,15 +1188,21 @@ def backup_nzb(nzb_path: str):
         shutil.copy(nzb_path, nzb_backup_dir)
 
 
-def save_compressed(folder: str, filename: str, data_fp: BinaryIO) -> str:
-    """Save compressed NZB file in folder, return path to saved nzb file"""
+def compressed_nzb_path(folder: str, filename: str) -> str:
+    """Path to the compressed NZB file in folder"""
     # Make sure it's a clean filename
     filename = sanitize_filename(filename)
     if filename.endswith(".nzb"):
         filename += ".gz"
     else:
         filename += ".nzb.gz"
-    full_nzb_path = os.path.join(folder, filename)
+    return os.path.join(folder, filename)
+
+
+def save_compressed(folder: str, filename: str, data_fp: BinaryIO) -> str:
+    """Save compressed NZB file in folder, return path to saved nzb file"""
+    full_nzb_path = compressed_nzb_path(folder, filename)
+    filename = os.path.basename(full_nzb_path)
 
     # Skip existing ones, as it might be queue-repair
     if not os.path.exists(full_nzb_path):
@@ -1206,6 +1222,74 @@ def save_compressed(folder: str, filename: str, data_fp: BinaryIO) -> str:
     return full_nzb_path
 
 
+class CopyingReader:
+    """Read from a file, while writing everything that is read to another file"""
+
+    def __init__(self, source: BinaryIO, target: BinaryIO):
+        self.source = source
+        self.target = target
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        self.target.write(data)
+        return data
+
+
+@contextlib.contextmanager
+def saving_compressed(folder: str, filename: str, data_fp: BinaryIO) -> Generator[tuple[str, BinaryIO], None, None]:
+    """Save compressed NZB file in folder while the NZB is being read, so it doesn't have to be read again.
+    Yields the path to the saved nzb file and the file object to read the NZB from.
+    """
+    full_nzb_path = compressed_nzb_path(folder, filename)
+
+    # Skip existing ones, as it might be queue-repair
+    if os.path.exists(full_nzb_path):
+        logging.info("Skipping existing file %s", full_nzb_path)
+        yield full_nzb_path, data_fp
+        return
+
+    logging.info("Saving %s", full_nzb_path)
+    try:
+        tgz_file = open(full_nzb_path, "wb")
+    except OSError:
+        logging.error(T("Saving %s failed"), full_nzb_path)
+        raise
+
+    # Have to get around the path being put inside the tgz
+    with tgz_file:
+        # We only need minimal compression to prevent huge files
+        with gzip.GzipFile(os.path.basename(full_nzb_path), mode="wb", compresslevel=1, fileobj=tgz_file) as gzip_file:
+            try:
+                yield full_nzb_path, CopyingReader(data_fp, gzip_file)
+            finally:
+                # Also save the part that was not read, for example when the NZB is invalid
+                shutil.copyfileobj(data_fp, gzip_file)
+
+
+def append_file(path: str, target_fp: BinaryIO, bufsize: int = 24 * 1024 * 1024):
+    """Append the content of the file at path to the end of target_fp.
+    Where available the copy is done by the kernel, which on filesystems with
+    reflink support (Btrfs, XFS, ZFS) shares the data instead of writing it again.
+    """
+    with open(path, "rb") as source_fp:
+        target_fp.seek(0, os.SEEK_END)
+        if hasattr(os, "copy_file_range"):
+            target_fp.flush()
+            copied = 0
+            try:
+                while size := os.copy_file_range(source_fp.fileno(), target_fp.fileno(), bufsize):
+                    copied += size
+                return
+            except OSError as err:
+                # Not supported for these files, for example across filesystems on older kernels
+                if copied or err.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF):
+                    raise
+                logging.debug("Kernel copy of %s not possible: %s", path, err)
+                # The file positions were not changed
+                target_fp.seek(0, os.SEEK_END)
+        shutil.copyfileobj(source_fp, target_fp, bufsize)
+
+
 def purge_log_files():
     """Purge all existing log files"""
     # First we need to do a rollover
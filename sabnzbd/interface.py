@@ -30,7 +30,7 @@ import hashlib
 import socket
 import ssl
 import functools
-import copy
+import threading
 from random import randint
 from xml.sax.saxutils import escape
 from Cheetah.Template import Template
@@ -50,7 +50,7 @@ from sabnzbd.misc import (
     is_lan_addr,
     is_local_addr,
     is_loopback_addr,
-    recursive_html_escape,
+    html_escaped_copy,
     is_none,
     get_cpu_name,
     clean_comma_separated_list,
@@ -400,13 +400,33 @@ def check_apikey(kwargs):
         return _MSG_APIKEY_INCORRECT
 
 
+# Compiled template classes, by path of the template
+TEMPLATE_CACHE: dict[str, tuple[float, type[Template]]] = {}
+TEMPLATE_CACHE_LOCK = threading.Lock()
+
+
+def compiled_template(file: str) -> type[Template]:
+    """Compile the template only once, or again when the file was modified"""
+    mtime = os.path.getmtime(file)
+    with TEMPLATE_CACHE_LOCK:
+        if (cached := TEMPLATE_CACHE.get(file)) and cached[0] == mtime:
+            return cached[1]
+        start = time.perf_counter()
+        template_class = Template.compile(file=file, compilerSettings=CHEETAH_DIRECTIVES)
+        logging.debug("Compiled template %s in %.3f seconds", file, time.perf_counter() - start)
+        TEMPLATE_CACHE[file] = (mtime, template_class)
+        return template_class
+
+
 def template_filtered_response(file: str, search_list: dict[str, Any]):
     """Wrapper for Cheetah response"""
-    # We need a copy, because otherwise source-dicts might be modified
-    search_list_copy = copy.deepcopy(search_list)
+    start = time.perf_counter()
+    # A copy is escaped, because otherwise source-dicts would be modified
     # 'filters' is excluded because the RSS-filters are listed twice
-    recursive_html_escape(search_list_copy, exclude_items=("webdir", "filters"))
-    return Template(file=file, searchList=[search_list_copy], compilerSettings=CHEETAH_DIRECTIVES).respond()
+    search_list_escaped = html_escaped_copy(search_list, exclude_items=("webdir", "filters"))
+    response = compiled_template(file)(searchList=[search_list_escaped]).respond()
+    logging.debug("Rendered template %s in %.3f seconds", file, time.perf_counter() - start)
+    return response
 
 
 def log_warning_and_ip(txt):
@@ -898,6 +918,8 @@ SPECIAL_BOOL_LIST = (
     "enable_season_sorting",
     "verify_xff_header",
     "direct_write",
+    "direct_unpack_priority",
+    "dirscan_inotify",
 )
 SPECIAL_VALUE_LIST = (
     "downloader_sleep_time",
@@ -912,6 +934,8 @@ SPECIAL_VALUE_LIST = (
     "assembler_max_queue_size",
     "switchinterval",
     "direct_unpack_threads",
+    "pp_max_parallel_sets",
+    "max_event_streams",
     "selftest_host",
     "ssdp_broadcast_interval",
     "unrar_parameters",
@@ -1216,25 +1216,18 @@ def match_str(text: AnyStr, matches: tuple[AnyStr, ...]) -> Optional[AnyStr]:
     return None
 
 
-def recursive_html_escape(input_dict_or_list: Union[dict[str, Any], list], exclude_items: tuple[str, ...] = ()):
-    """Recursively update the input_dict in-place with html-safe values"""
-    if isinstance(input_dict_or_list, (dict, list)):
-        if isinstance(input_dict_or_list, dict):
-            iterator = input_dict_or_list.items()
-        else:
-            # For lists we use enumerate
-            iterator = enumerate(input_dict_or_list)
-
-        for key, value in iterator:
-            # Ignore any keys that are not safe to convert
-            if key not in exclude_items:
-                # We ignore any other than str
-                if isinstance(value, str):
-                    input_dict_or_list[key] = html.escape(value, quote=True)
-                if isinstance(value, (dict, list)):
-                    recursive_html_escape(value, exclude_items=exclude_items)
-    else:
-        raise ValueError("Expected dict or str, got %s" % type(input_dict_or_list))
+def html_escaped_copy(value: Any, exclude_items: tuple[str, ...] = ()) -> Any:
+    """Return a copy of the nested dicts and lists with html-safe str values,
+    the input is not modified and other values are not copied"""
+    if isinstance(value, str):
+        return html.escape(value, quote=True)
+    if isinstance(value, dict):
+        return {
+            key: item if key in exclude_items else html_escaped_copy(item, exclude_items) for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [html_escaped_copy(item, exclude_items) for item in value]
+    return value
 
 
 def list2cmdline_unrar(lst: list[str]) -> str:
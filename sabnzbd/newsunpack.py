@@ -26,10 +26,10 @@ import subprocess
 import logging
 import time
 import io
-import shutil
 import functools
+import concurrent.futures
 import rarfile
-from typing import BinaryIO, Optional, Any, Union
+from typing import BinaryIO, Optional, Any, Union, Callable
 
 import sabnzbd
 from sabnzbd.encoding import correct_unknown_encoding, ubtou
@@ -57,16 +57,17 @@ from sabnzbd.filesystem import (
     remove_file,
     listdir_full,
     setname_from_path,
+    append_file,
     get_ext,
     TS_RE,
     build_filelists,
     get_filename,
     SEVENMULTI_RE,
-    is_size,
+    get_filesize,
     get_basename,
     create_all_dirs,
 )
-from sabnzbd.nzb import NzbObject
+from sabnzbd.nzb import NzbObject, NzbFile
 import sabnzbd.cfg as cfg
 from sabnzbd.constants import Status
 
@@ -205,6 +206,23 @@ ENV_NZO_FIELDS = [
 ]
 
 
+def max_parallel_sets() -> int:
+    """Number of sets within a job that can be verified, repaired or unpacked at the same time.
+    Unless set by the user, we leave enough cores for par2 and unrar themselves."""
+    if cfg.pp_max_parallel_sets():
+        return cfg.pp_max_parallel_sets()
+    return max(1, min((os.cpu_count() or 1) // 4, 4))
+
+
+def run_for_sets(func: Callable[[str], Any], setnames: list[str]) -> list[Any]:
+    """Run func for every set, concurrently if allowed. Results are returned in the order of the sets"""
+    if (workers := min(len(setnames), max_parallel_sets())) <= 1:
+        return [func(setname) for setname in setnames]
+    logging.info("Processing %s sets using %s workers", len(setnames), workers)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, setnames))
+
+
 def external_processing(extern_proc: str, nzo: NzbObject, complete_dir: str, status: int) -> tuple[str, int]:
     """Run a user postproc script, return console output and exit value"""
     failure_url = nzo.nzo_info.get("failure", "")
@@ -241,7 +259,7 @@ def external_processing(extern_proc: str, nzo: NzbObject, complete_dir: str, sta
 
     try:
         p = build_and_run_command(command, env=create_env(nzo, extra_env_fields))
-        sabnzbd.PostProcessor.external_process = p
+        sabnzbd.PostProcessor.external_processes.append(p)
 
         # Follow the output, so we can abort it
         lines = []
@@ -452,8 +470,13 @@ def file_join(nzo: NzbObject, workdir_complete: str, joinables: list[str]) -> tu
                 filename = filename.replace(nzo.download_path, workdir_complete)
             logging.debug("file_join(): Assembling %s", filename)
 
-            # Join the segments
-            with open(filename, "ab") as joined_file:
+            # The pieces are removed after joining, so the first one can become the start of the joined file
+            first_renamed = nzo.delete and not os.path.exists(filename)
+            if first_renamed:
+                filename = renamer(current[0], filename)
+
+            # Join the segments, not in append mode as that prevents copying by the kernel
+            with open(filename, "r+b" if os.path.exists(filename) else "wb") as joined_file:
                 n = get_seq_number(current[0])
                 seq_error = n > 1
                 for joinable in current:
@@ -462,10 +485,10 @@ def file_join(nzo: NzbObject, workdir_complete: str, joinables: list[str]) -> tu
                     perc = (100.0 / size) * n
                     logging.debug("Processing %s", joinable)
                     nzo.set_action_line(T("Joining"), "%.0f%%" % perc)
-                    with open(joinable, "rb") as f:
-                        shutil.copyfileobj(f, joined_file, bufsize)
-                    if nzo.delete:
-                        remove_file(joinable)
+                    if not (first_renamed and joinable is current[0]):
+                        append_file(joinable, joined_file, bufsize)
+                        if nzo.delete:
+                            remove_file(joinable)
                     n += 1
 
             # Remove any remaining .1 files
@@ -503,9 +526,9 @@ def rar_unpack(nzo: NzbObject, workdir_complete: str, one_folder: bool, rars: li
     """Unpack multiple sets 'rars' of RAR files from 'download_path' to 'workdir_complete.
     When 'delete' is set, originals will be deleted.
     When 'one_folder' is set, all files will be in a single folder
+    Independent sets are extracted at the same time, if allowed.
     """
-    fail = 0
-    newfiles = extracted_files = []
+    extracted_files = []
     rar_sets = {}
     for rar in rars:
         rar_set = setname_from_path(rar)
@@ -518,7 +541,29 @@ def rar_unpack(nzo: NzbObject, workdir_complete: str, one_folder: bool, rars: li
 
     logging.debug("Rar_sets: %s", rar_sets)
 
-    for rar_set in rar_sets:
+    # Is the direct-unpacker still running? We wait for it
+    if rar_sets and nzo.direct_unpacker:
+        wait_count = 0
+        last_stats = nzo.direct_unpacker.get_formatted_stats()
+        while nzo.direct_unpacker.is_alive():
+            logging.debug("DirectUnpacker still alive for %s: %s", nzo.final_name, last_stats)
+
+            # Bump the file-lock in case one of the sets is stuck
+            with nzo.direct_unpacker.next_file_lock:
+                nzo.direct_unpacker.next_file_lock.notify_all()
+            time.sleep(2)
+
+            # Did something change? Might be stuck
+            if last_stats == nzo.direct_unpacker.get_formatted_stats():
+                wait_count += 1
+                if wait_count > 60:
+                    # We abort after 2 minutes of no changes
+                    nzo.direct_unpacker.abort()
+            else:
+                wait_count = 0
+            last_stats = nzo.direct_unpacker.get_formatted_stats()
+
+    def unpack_set(rar_set: str) -> tuple[int, list[str]]:
         # Run the RAR extractor
         rar_sets[rar_set].sort(key=functools.cmp_to_key(rar_sort))
 
@@ -529,28 +574,6 @@ def rar_unpack(nzo: NzbObject, workdir_complete: str, one_folder: bool, rars: li
         else:
             extraction_path = os.path.split(rarpath)[0]
 
-        # Is the direct-unpacker still running? We wait for it
-        if nzo.direct_unpacker:
-            wait_count = 0
-            last_stats = nzo.direct_unpacker.get_formatted_stats()
-            while nzo.direct_unpacker.is_alive():
-                logging.debug("DirectUnpacker still alive for %s: %s", nzo.final_name, last_stats)
-
-                # Bump the file-lock in case it's stuck
-                with nzo.direct_unpacker.next_file_lock:
-                    nzo.direct_unpacker.next_file_lock.notify()
-                time.sleep(2)
-
-                # Did something change? Might be stuck
-                if last_stats == nzo.direct_unpacker.get_formatted_stats():
-                    wait_count += 1
-                    if wait_count > 60:
-                        # We abort after 2 minutes of no changes
-                        nzo.direct_unpacker.abort()
-                else:
-                    wait_count = 0
-                last_stats = nzo.direct_unpacker.get_formatted_stats()
-
         # Did we already direct-unpack it? Not when recursive-unpacking
         if nzo.direct_unpacker and rar_set in nzo.direct_unpacker.success_sets:
             logging.info("Set %s completed by DirectUnpack", rar_set)
@@ -567,6 +590,7 @@ def rar_unpack(nzo: NzbObject, workdir_complete: str, one_folder: bool, rars: li
             except Exception:
                 success = False
                 fail = 1
+                newfiles = rars = []
                 msg = sys.exc_info()[1]
                 nzo.fail_msg = T("Unpacking failed, %s") % msg
                 setname = nzo.final_name
@@ -578,7 +602,8 @@ def rar_unpack(nzo: NzbObject, workdir_complete: str, one_folder: bool, rars: li
         if success:
             logging.debug("rar_unpack(): Rars: %s", rars)
             logging.debug("rar_unpack(): Newfiles: %s", newfiles)
-            extracted_files.extend(newfiles)
+        else:
+            newfiles = []
 
         # Do not fail if this was a recursive unpack
         if fail and rarpath.startswith(workdir_complete):
@@ -616,6 +641,12 @@ def rar_unpack(nzo: NzbObject, workdir_complete: str, one_folder: bool, rars: li
                         if os.path.exists(brokenrar):
                             logging.warning(T("Deleting %s failed!"), brokenrar)
 
+        return fail, newfiles
+
+    fail = 0
+    for fail, newfiles in run_for_sets(unpack_set, list(rar_sets)):
+        extracted_files.extend(newfiles)
+
     return fail, extracted_files
 
 
@@ -714,7 +745,7 @@ def rar_extract_core(
     # On Windows, UnRar uses a custom argument parser
     # See: https://github.com/sabnzbd/sabnzbd/issues/1043
     p = build_and_run_command(command, windows_unrar_command=True)
-    sabnzbd.PostProcessor.external_process = p
+    sabnzbd.PostProcessor.external_processes.append(p)
 
     nzo.set_action_line(T("Unpacking"), "00/%02d" % numrars)
 
@@ -976,7 +1007,7 @@ def seven_extract_core(
 
     command = [SEVENZIP_COMMAND, method, "-y", overwrite, case, password, "-o%s" % extraction_path, seven_path]
     p = build_and_run_command(command)
-    sabnzbd.PostProcessor.external_process = p
+    sabnzbd.PostProcessor.external_processes.append(p)
     output = p.stdout.read()
     logging.debug("7za output: %s", output)
 
@@ -1127,6 +1158,28 @@ def par2_repair(nzo: NzbObject, setname: str) -> tuple[bool, bool]:
     return readd, result
 
 
+def par2_wildcard(nzo: NzbObject, parfolder: str, setname: str) -> str:
+    """Pattern of the files par2 should scan when verifying the set"""
+    if len(nzo.extrapars) == 1 or len(globber(parfolder, setname + "*")) < 2:
+        # Support bizarre naming conventions
+        return "*"
+    # Normal case, everything is named after set
+    return setname + "*"
+
+
+def shared_par2_sets(nzo: NzbObject, setnames: list[str]) -> list[str]:
+    """Sets whose verification could use the files of another set, these can't be repaired at the same time"""
+    shared = []
+    for setname in setnames:
+        if par2_wildcard(nzo, nzo.download_path, setname) == "*" or any(
+            other != setname
+            and (other.lower().startswith(setname.lower()) or setname.lower().startswith(other.lower()))
+            for other in setnames
+        ):
+            shared.append(setname)
+    return shared
+
+
 def par2cmdline_verify(
     parfile: str, nzo: NzbObject, setname: str, joinables: list[str]
 ) -> tuple[bool, bool, list[str], list[str]]:
@@ -1145,13 +1198,7 @@ def par2cmdline_verify(
 
     # Append the wildcard for this set
     parfolder = os.path.split(parfile)[0]
-    if len(nzo.extrapars) == 1 or len(globber(parfolder, setname + "*")) < 2:
-        # Support bizarre naming conventions
-        wildcard = "*"
-    else:
-        # Normal case, everything is named after set
-        wildcard = setname + "*"
-    command.append(os.path.join(parfolder, wildcard))
+    command.append(os.path.join(parfolder, par2_wildcard(nzo, parfolder, setname)))
 
     # We need to check for the bad par2cmdline that skips blocks
     # Or the one that complains about basepath
@@ -1166,7 +1213,7 @@ def par2cmdline_verify(
 
     # Run the external command
     p = build_and_run_command(command)
-    sabnzbd.PostProcessor.external_process = p
+    sabnzbd.PostProcessor.external_processes.append(p)
 
     # Set up our variables
     lines = []
@@ -1525,45 +1572,51 @@ def quick_check_set(setname: str, nzo: NzbObject) -> bool:
     # We use bitwise assignment (&=) so False always wins in case of failure
     # This way the renames always get saved!
     result = True
-    nzf_list = nzo.finished_files
     renames = {}
     found_paths: set[str] = set()
 
     # Files to ignore
     ignore_ext = cfg.quick_check_ext_ignore()
 
+    # Index all files once by name and by (crc32, size), so that
+    # large obfuscated sets don't need a stat-call for every combination
+    nzf_by_name: dict[str, NzbFile] = {}
+    nzf_by_hash: dict[tuple[int, int], list[NzbFile]] = {}
+    filesizes: dict[str, int] = {}
+    for nzf in nzo.finished_files:
+        nzf_by_name.setdefault(nzf.filename, nzf)
+        if nzf.crc32 is not None:
+            filesizes[nzf.filepath] = get_filesize(nzf.filepath)
+            nzf_by_hash.setdefault((nzf.crc32, filesizes[nzf.filepath]), []).append(nzf)
+
     for file in par2pack:
         par2info = par2pack[file]
         found = False
         file_to_ignore = get_ext(file).replace(".", "") in ignore_ext
-        for nzf in nzf_list:
-            # Do a simple filename based check
-            if file == nzf.filename:
-                found = True
-                found_paths.add(nzf.filepath)
-                if (
-                    nzf.crc32 is not None
-                    and nzf.crc32 == par2info.filehash
-                    and is_size(nzf.filepath, par2info.filesize)
-                ):
-                    logging.debug("Quick-check of file %s OK", file)
-                    result &= True
-                elif file_to_ignore:
-                    # We don't care about these files
-                    logging.debug("Quick-check ignoring file %s", file)
-                    result &= True
-                else:
-                    logging.info("Quick-check of file %s failed!", file)
-                    result = False
-                break
 
-            # Now let's do obfuscation check
+        # Do a simple filename based check
+        if nzf := nzf_by_name.get(file):
+            found = True
+            found_paths.add(nzf.filepath)
             if (
-                nzf.filepath not in found_paths
-                and nzf.crc32 is not None
+                nzf.crc32 is not None
                 and nzf.crc32 == par2info.filehash
-                and is_size(nzf.filepath, par2info.filesize)
+                and filesizes[nzf.filepath] == par2info.filesize
             ):
+                logging.debug("Quick-check of file %s OK", file)
+                result &= True
+            elif file_to_ignore:
+                # We don't care about these files
+                logging.debug("Quick-check ignoring file %s", file)
+                result &= True
+            else:
+                logging.info("Quick-check of file %s failed!", file)
+                result = False
+        else:
+            # Now let's do obfuscation check
+            for nzf in nzf_by_hash.get((par2info.filehash, par2info.filesize), ()):
+                if nzf.filepath in found_paths:
+                    continue
                 try:
                     logging.debug("Quick-check will rename %s to %s", nzf.filename, file)
 
@@ -1576,14 +1629,17 @@ def quick_check_set(setname: str, nzo: NzbObject) -> bool:
                         create_local_directories=True,
                     )
                     renames[file] = nzf.filename
+                    if nzf_by_name.get(nzf.filename) is nzf:
+                        del nzf_by_name[nzf.filename]
                     nzf.filename = file
+                    nzf_by_name.setdefault(file, nzf)
                     result &= True
                     found = True
                     found_paths.add(nzf.filepath)
-                    break
                 except IOError:
                     # Renamed failed for some reason, probably already done
-                    break
+                    pass
+                break
 
         if not found:
             if file_to_ignore:
@@ -1724,38 +1780,53 @@ def sfv_check(sfvs: list[str], nzo: NzbObject) -> bool:
         # Duplicates will be replaced
         sfv_parse_results.update(parse_sfv(sfv))
 
+    # Index all files by name and by crc32, so each SFV entry is a direct lookup
+    nzf_by_name: dict[str, NzbFile] = {}
+    nzf_by_crc32: dict[bytes, list[NzbFile]] = {}
+    for nzf in nzf_list:
+        nzf_by_name.setdefault(nzf.filename, nzf)
+        if nzf.filename in calculated_crc32:
+            nzf_by_crc32.setdefault(calculated_crc32[nzf.filename], []).append(nzf)
+    found_nzfs: set[int] = set()
+
     for file in sfv_parse_results:
         found = False
         file_to_ignore = get_ext(file).replace(".", "") in ignore_ext
-        for nzf in nzf_list:
-            # Do a simple filename based check
-            if file == nzf.filename:
-                found = True
-                if calculated_crc32.get(nzf.filename, "") == sfv_parse_results[file]:
-                    logging.debug("SFV-check of file %s OK", file)
-                    result &= True
-                elif file_to_ignore:
-                    # We don't care about these files
-                    logging.debug("SFV-check ignoring file %s", file)
-                    result &= True
-                else:
-                    logging.info("SFV-check of file %s failed!", file)
-                    result = False
-                break
 
-            # Now lets do obfuscation check
+        # Do a simple filename based check
+        if nzf := nzf_by_name.get(file):
+            found = True
+            found_nzfs.add(id(nzf))
             if calculated_crc32.get(nzf.filename, "") == sfv_parse_results[file]:
+                logging.debug("SFV-check of file %s OK", file)
+                result &= True
+            elif file_to_ignore:
+                # We don't care about these files
+                logging.debug("SFV-check ignoring file %s", file)
+                result &= True
+            else:
+                logging.info("SFV-check of file %s failed!", file)
+                result = False
+        else:
+            # Now lets do obfuscation check
+            for nzf in nzf_by_crc32.get(sfv_parse_results[file], ()):
+                if id(nzf) in found_nzfs:
+                    continue
                 try:
                     logging.debug("SFV-check will rename %s to %s", nzf.filename, file)
                     renamer(os.path.join(nzo.download_path, nzf.filename), os.path.join(nzo.download_path, file))
                     renames[file] = nzf.filename
+                    if nzf_by_name.get(nzf.filename) is nzf:
+                        del nzf_by_name[nzf.filename]
                     nzf.filename = file
+                    nzf_by_name.setdefault(file, nzf)
                     result &= True
                     found = True
-                    break
+                    found_nzfs.add(id(nzf))
                 except IOError:
                     # Renamed failed for some reason, probably already done
-                    break
+                    pass
+                break
 
         if not found:
             if file_to_ignore:
@@ -39,6 +39,7 @@ from sabnzbd.filesystem import (
     RAR_RE,
 )
 from sabnzbd.misc import int_conv, subject_name_extractor
+from sabnzbd.par2file import Par2Parser
 from sabnzbd.decorators import synchronized
 
 
@@ -77,7 +78,7 @@ class NzbFile(TryList):
     """Representation of one file consisting of multiple articles"""
 
     # Pre-define attributes to save memory
-    __slots__ = NzbFileSaver + ("lock", "file_lock", "assembler_next_index")
+    __slots__ = NzbFileSaver + ("lock", "file_lock", "assembler_next_index", "par2_parser")
 
     def __init__(self, date, subject, raw_article_db, file_bytes, nzo):
         """Setup object"""
@@ -112,6 +113,7 @@ class NzbFile(TryList):
         self.assembled: bool = False
         self.md5of16k: Optional[bytes] = None
         self.assembler_next_index: int = 0
+        self.par2_parser: Optional[Par2Parser] = None
 
         # Add first article to decodetable, this way we can check
         # if this is maybe a duplicate nzf
@@ -352,6 +354,7 @@ class NzbFile(TryList):
         self.lock = threading.RLock()
         self.file_lock = threading.RLock()
         self.assembler_next_index = 0
+        self.par2_parser = None
         if isinstance(self.articles, list):
             # Converted from list to dict
             self.articles = {x: x for x in self.articles}
@@ -81,7 +81,8 @@ from sabnzbd.filesystem import (
     backup_exists,
     save_data,
     load_data,
-    save_compressed,
+    compressed_nzb_path,
+    saving_compressed,
     backup_nzb,
     remove_data,
     get_ext,
@@ -278,7 +279,8 @@ class NzbObject(TryList):
 
         # The current status of the nzo eg:
         # Queued, Downloading, Repairing, Unpacking, Failed, Complete
-        self.status: str = status
+        self.__status: Optional[str] = None
+        self.status = status
 
         self.avg_bps_freq = 0
         self.avg_bps_total = 0
@@ -374,9 +376,13 @@ class NzbObject(TryList):
             remove_all(admin_dir, "SABnzbd_article_*", keep_folder=True)
 
         if nzb_fp:
-            full_nzb_path = save_compressed(admin_dir, filename, nzb_fp)
+            start = time.time()
+            full_nzb_path = compressed_nzb_path(admin_dir, filename)
             try:
-                sabnzbd.nzbparser.nzbfile_parser(full_nzb_path, self)
+                # Parse the NZB while it is being saved, so it is only read once
+                with saving_compressed(admin_dir, filename, nzb_fp) as (full_nzb_path, nzb_data):
+                    sabnzbd.nzbparser.nzbfile_parser(nzb_data, self)
+                logging.debug("Saved and parsed %s in %.2fs", filename, time.time() - start)
             except Exception as err:
                 self.incomplete = True
                 logging.warning(T("Invalid NZB file %s, skipping (error: %s)"), filename, err)
@@ -646,12 +652,19 @@ class NzbObject(TryList):
         # Need to remove it from the other set it might be in
         self.remove_extrapar(nzf)
 
-        # Reparse
-        setname, vol, block = analyse_par2(nzf.filename, filepath)
+        # Use the packets parsed during assembly, if the parser saw the whole file
+        parser = nzf.par2_parser
+        nzf.par2_parser = None
+        if parser and not parser.parsed_file(filepath):
+            parser = None
+
+        # Reparse, the file is only scanned again if the parser did not count all recovery blocks
+        recovery_blocks = parser.counted_recovery_blocks(filepath) if parser else None
+        setname, vol, block = analyse_par2(nzf.filename, filepath, recovery_blocks=recovery_blocks)
         nzf.set_par2(setname, vol, block)
 
         # Parse the file contents for hashes
-        set_id, pack = parse_par2_file(filepath, nzf.nzo.md5of16k)
+        set_id, pack = parse_par2_file(filepath, nzf.nzo.md5of16k, parser)
 
         # If we couldn't parse it, we ignore it
         if set_id and pack:
@@ -1014,9 +1027,21 @@ class NzbObject(TryList):
     @property
     def direct_unpack_progress(self) -> Optional[str]:
         """Report status of current Direct Unpack, if one is active"""
-        if self.direct_unpacker and self.direct_unpacker.active_instance:
+        if self.direct_unpacker and self.direct_unpacker.active_sets():
             return self.direct_unpacker.get_formatted_stats()
 
+    @property
+    def status(self) -> str:
+        return self.__status
+
+    @status.setter
+    def status(self, status: str):
+        """The status is also changed outside the queue, which then has to know the output changed"""
+        if status != getattr(self, "_NzbObject__status", None):
+            self.__status = status
+            if getattr(sabnzbd, "NzbQueue", None):
+                sabnzbd.NzbQueue.changed()
+
     @property
     def pp_or_finished(self):
         """We don't want any more articles if we are post-processing or in the final state"""
@@ -1222,6 +1247,14 @@ class NzbObject(TryList):
                 if len(articles) >= fetch_limit:
                     break
 
+        # First the volumes Direct Unpack needs next, so it can keep up with the download
+        if not articles and self.direct_unpacker and cfg.direct_unpack_priority():
+            for nzf in self.direct_unpacker.next_volumes():
+                if not nzf.deleted and nzf.import_finished and not nzf.server_in_try_list(server):
+                    nzf.get_articles(server, servers, fetch_limit)
+                    if articles:
+                        break
+
         # Move on to next ones
         if not articles:
             for nzf in self.files:
@@ -20,10 +20,14 @@ sabnzbd.nzbparser - Parse and import NZB files
 """
 
 import os
+import io
+import contextlib
 import bz2
 import gzip
 import time
 import logging
+import threading
+import concurrent.futures
 import hashlib
 import xml.etree.ElementTree
 import datetime
@@ -31,7 +35,8 @@ import zipfile
 import tempfile
 
 import cherrypy._cpreqbody
-from typing import Optional, Any, Union
+from dataclasses import dataclass
+from typing import Optional, Any, Union, BinaryIO, Callable, TypeVar
 
 import sabnzbd
 from sabnzbd.nzb import (
@@ -53,8 +58,110 @@ from sabnzbd.filesystem import (
 from sabnzbd.misc import name_to_cat, cat_pp_script_sanitizer
 from sabnzbd.constants import DEFAULT_PRIORITY, VALID_ARCHIVES, AddNzbFileResult
 from sabnzbd.misc import SABRarFile
+import sabnzbd.cfg as cfg
 import rarfile
 
+# Number of jobs that are created at the same time, mostly waiting for the disk
+MAX_PARALLEL_JOBS = 4
+
+T_ITEM = TypeVar("T_ITEM")
+T_RESULT = TypeVar("T_RESULT")
+
+
+@dataclass
+class NewJob:
+    """Job created from an NZB, that still has to be added to the queue"""
+
+    result: AddNzbFileResult
+    nzo: Optional[NzbObject] = None
+    # Duplicate or unwanted extension directed to history
+    failed_nzo: Optional[NzbObject] = None
+
+    def add_to_queue(self, quiet: bool = False) -> list[str]:
+        """Add the job to the queue, or to the history when it failed, and return the nzo_ids"""
+        if self.failed_nzo:
+            sabnzbd.NzbQueue.fail_to_history(self.failed_nzo)
+            return [self.failed_nzo.nzo_id]
+        if self.nzo:
+            return [sabnzbd.NzbQueue.add(self.nzo, quiet=quiet)]
+        return []
+
+
+def create_job(filename: str, nzb_fp: BinaryIO, **kwargs) -> NewJob:
+    """Create the NzbObject, all other parameters are passed to the NZO-creation"""
+    try:
+        return NewJob(AddNzbFileResult.OK, nzo=NzbObject(filename, nzb_fp=nzb_fp, **kwargs))
+    except NzbEmpty:
+        # Malformed or might not be an NZB file
+        return NewJob(AddNzbFileResult.NO_FILES_FOUND)
+    except NzbRejected:
+        # Rejected as duplicate
+        return NewJob(AddNzbFileResult.ERROR)
+    except NzbPreQueueRejected:
+        # Rejected by pre-queue script - should be silently ignored for URL fetches
+        return NewJob(AddNzbFileResult.PREQUEUE_REJECTED)
+    except NzbRejectToHistory as err:
+        return NewJob(AddNzbFileResult.OK, failed_nzo=err.nzo)
+    except Exception:
+        # Something else is wrong, show error
+        logging.error(T("Error while adding %s, removing"), filename, exc_info=True)
+        return NewJob(AddNzbFileResult.ERROR)
+    finally:
+        nzb_fp.close()
+
+
+def max_parallel_jobs(dup_check: bool = True) -> int:
+    """Number of jobs that can be created at the same time when adding multiple NZB's.
+    The duplicate detection compares with the jobs added before, so then they are created one by one."""
+    if dup_check and (cfg.no_dupes() or cfg.no_smart_dupes()):
+        return 1
+    return MAX_PARALLEL_JOBS
+
+
+def create_and_add_jobs(
+    create: Callable[[T_ITEM], NewJob],
+    add: Callable[[T_ITEM, NewJob], T_RESULT],
+    items: list[T_ITEM],
+    dup_check: bool = True,
+) -> list[T_RESULT]:
+    """Create the jobs, concurrently if allowed, and add them to the queue in the order of the items.
+    Jobs are added while the next ones are still being created. Results are returned in the order of the items."""
+    start = time.time()
+    create_time = add_time = 0.0
+
+    def timed_create(item: T_ITEM) -> NewJob:
+        nonlocal create_time
+        create_start = time.time()
+        try:
+            return create(item)
+        finally:
+            create_time += time.time() - create_start
+
+    def timed_add(item: T_ITEM, job: NewJob) -> T_RESULT:
+        nonlocal add_time
+        add_start = time.time()
+        try:
+            return add(item, job)
+        finally:
+            add_time += time.time() - add_start
+
+    if (workers := min(len(items), max_parallel_jobs(dup_check))) <= 1:
+        results = [timed_add(item, timed_create(item)) for item in items]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="NzbParser") as executor:
+            results = [timed_add(item, job) for item, job in zip(items, executor.map(timed_create, items))]
+
+    if len(items) > 1:
+        logging.info(
+            "Added %s NZB's in %.2fs using %s threads (creating jobs took %.2fs, adding them %.2fs)",
+            len(items),
+            time.time() - start,
+            workers,
+            create_time,
+            add_time,
+        )
+    return results
+
 
 def add_nzbfile(
     nzbfile: Union[str, cherrypy._cpreqbody.Part],
@@ -201,57 +308,56 @@ def process_nzb_archive_file(
     if status == AddNzbFileResult.OK:
         if nzbcount != 1:
             nzbname = None
-        for name in names:
-            if name.lower().endswith(".nzb"):
+        nzb_names = [name for name in names if name.lower().endswith(".nzb")]
+        archive_lock = threading.Lock()
+        read_errors = []
+
+        def create(name: str, nzo_id: Optional[str] = None) -> NewJob:
+            # The archive can only be read by one thread at a time
+            with archive_lock:
+                # Stop after the first error, the archive will be kept
+                if read_errors:
+                    return NewJob(AddNzbFileResult.ERROR)
                 try:
-                    datap = zf.open(name)
+                    with zf.open(name) as datap:
+                        data = datap.read()
                 except OSError:
                     logging.error(T("Cannot read %s"), name, exc_info=True)
-                    zf.close()
-                    return AddNzbFileResult.ERROR, []
-                name = get_filename(name)
-                if datap:
-                    nzo = None
-                    try:
-                        nzo = NzbObject(
-                            name,
-                            pp=pp,
-                            script=script,
-                            nzb_fp=datap,
-                            cat=cat,
-                            url=url,
-                            priority=priority,
-                            password=password,
-                            nzbname=nzbname,
-                            nzo_info=nzo_info,
-                            reuse=reuse,
-                            nzo_id=nzo_id,
-                            dup_check=dup_check,
-                        )
-                    except (
-                        NzbEmpty,
-                        NzbRejected,
-                        NzbPreQueueRejected,
-                    ):
-                        # Empty or fully rejected (including pre-queue rejections)
-                        pass
-                    except NzbRejectToHistory as err:
-                        # Duplicate or unwanted extension directed to history
-                        sabnzbd.NzbQueue.fail_to_history(err.nzo)
-                        nzo_ids.append(err.nzo.nzo_id)
-                    except Exception:
-                        # Something else is wrong, show error
-                        logging.error(T("Error while adding %s, removing"), name, exc_info=True)
-                    finally:
-                        datap.close()
-
-                    if nzo:
-                        # We can only use existing nzo_id once
-                        nzo_id = None
-                        nzo_ids.append(sabnzbd.NzbQueue.add(nzo))
+                    read_errors.append(name)
+                    return NewJob(AddNzbFileResult.ERROR)
+            return create_job(
+                get_filename(name),
+                io.BytesIO(data),
+                pp=pp,
+                script=script,
+                cat=cat,
+                url=url,
+                priority=priority,
+                password=password,
+                nzbname=nzbname,
+                nzo_info=nzo_info,
+                reuse=reuse,
+                nzo_id=nzo_id,
+                dup_check=dup_check,
+            )
+
+        def add(name: str, job: NewJob):
+            # Empty or fully rejected jobs (including pre-queue rejections) are skipped
+            nzo_ids.extend(job.add_to_queue())
+
+        # We can only use existing nzo_id once, for the first job that can be created
+        while nzo_id and nzb_names:
+            name = nzb_names.pop(0)
+            job = create(name, nzo_id)
+            add(name, job)
+            if job.nzo:
+                nzo_id = None
+        create_and_add_jobs(create, add, nzb_names, dup_check)
 
         # Close the pointer to the compressed file
         zf.close()
+        if read_errors:
+            return AddNzbFileResult.ERROR, []
 
         try:
             if not keep:
@@ -289,6 +395,44 @@ def process_single_nzb(
     """Analyze file and create a job from it
     Supports NZB, NZB.BZ2, NZB.GZ and GZ.NZB-in-disguise
     """
+    job = create_single_nzb(
+        filename,
+        path,
+        pp=pp,
+        script=script,
+        cat=cat,
+        catdir=catdir,
+        priority=priority,
+        nzbname=nzbname,
+        reuse=reuse,
+        nzo_info=nzo_info,
+        url=url,
+        password=password,
+        nzo_id=nzo_id,
+        dup_check=dup_check,
+    )
+    return add_single_nzb(job, path, keep, quiet=bool(reuse))
+
+
+def create_single_nzb(
+    filename: str,
+    path: str,
+    pp: Optional[int] = None,
+    script: Optional[str] = None,
+    cat: Optional[str] = None,
+    catdir: Optional[str] = None,
+    priority: Optional[Union[int, str]] = None,
+    nzbname: Optional[str] = None,
+    reuse: Optional[str] = None,
+    nzo_info: Optional[dict[str, Any]] = None,
+    url: Optional[str] = None,
+    password: Optional[str] = None,
+    nzo_id: Optional[str] = None,
+    dup_check: bool = True,
+) -> NewJob:
+    """Analyze file and create a job from it, without adding it to the queue
+    Supports NZB, NZB.BZ2, NZB.GZ and GZ.NZB-in-disguise
+    """
     if catdir is None:
         catdir = cat
 
@@ -310,7 +454,7 @@ def process_single_nzb(
     except OSError:
         logging.warning(T("Cannot read %s"), clip_path(path))
         logging.info("Traceback: ", exc_info=True)
-        return AddNzbFileResult.RETRY, []
+        return NewJob(AddNzbFileResult.RETRY)
 
     if filename:
         filename, cat = name_to_cat(filename, catdir)
@@ -319,61 +463,64 @@ def process_single_nzb(
             # Prevent embedded password from being damaged by sanitize and trimming
             nzbname = get_filename(filename)
 
-    # Parse the data
-    result: AddNzbFileResult = AddNzbFileResult.OK
-    nzo = None
-    nzo_ids = []
-    try:
-        nzo = NzbObject(
-            filename,
-            pp=pp,
-            script=script,
-            nzb_fp=nzb_fp,
-            cat=cat,
-            url=url,
-            priority=priority,
-            password=password,
-            nzbname=nzbname,
-            nzo_info=nzo_info,
-            reuse=reuse,
-            nzo_id=nzo_id,
-            dup_check=dup_check,
-        )
-    except NzbEmpty:
-        # Malformed or might not be an NZB file
-        result = AddNzbFileResult.NO_FILES_FOUND
-    except NzbRejected:
-        # Rejected as duplicate
-        result = AddNzbFileResult.ERROR
-    except NzbPreQueueRejected:
-        # Rejected by pre-queue script - should be silently ignored for URL fetches
-        result = AddNzbFileResult.PREQUEUE_REJECTED
-    except NzbRejectToHistory as err:
-        # Duplicate or unwanted extension directed to history
-        sabnzbd.NzbQueue.fail_to_history(err.nzo)
-        nzo_ids.append(err.nzo.nzo_id)
-    except Exception:
-        # Something else is wrong, show error
-        logging.error(T("Error while adding %s, removing"), filename, exc_info=True)
-        result = AddNzbFileResult.ERROR
-    finally:
-        nzb_fp.close()
-
-    if nzo:
-        nzo_ids.append(sabnzbd.NzbQueue.add(nzo, quiet=bool(reuse)))
+    return create_job(
+        filename,
+        nzb_fp,
+        pp=pp,
+        script=script,
+        cat=cat,
+        url=url,
+        priority=priority,
+        password=password,
+        nzbname=nzbname,
+        nzo_info=nzo_info,
+        reuse=reuse,
+        nzo_id=nzo_id,
+        dup_check=dup_check,
+    )
+
+
+def add_single_nzb(
+    job: NewJob, path: str, keep: bool = False, quiet: bool = False
+) -> tuple[AddNzbFileResult, list[str]]:
+    """Add the job created by create_single_nzb to the queue and remove the NZB file"""
+    nzo_ids = job.add_to_queue(quiet)
 
     try:
-        if not keep and result in {AddNzbFileResult.ERROR, AddNzbFileResult.OK}:
+        if not keep and job.result in {AddNzbFileResult.ERROR, AddNzbFileResult.OK}:
             remove_file(path)
     except OSError:
         # Job was still added to the queue, so throw error but don't report failed add
         logging.error(T("Error removing %s"), clip_path(path))
         logging.info("Traceback: ", exc_info=True)
 
-    return result, nzo_ids
+    return job.result, nzo_ids
+
+
+def add_nzbfiles(nzbfiles: list[tuple[str, Optional[str]]]) -> list[tuple[AddNzbFileResult, list[str]]]:
+    """Add local NZB files and archives, each with the category folder it was found in, and remove them.
+    The jobs are created at the same time and added to the queue in the order of the files.
+    """
+
+    def create(nzbfile: tuple[str, Optional[str]]) -> Optional[NewJob]:
+        path, catdir = nzbfile
+        logging.info("Attempting to add %s [%s]", os.path.basename(path), path)
+        if get_ext(path) in VALID_ARCHIVES:
+            # Archives can contain multiple NZB's, so these are added by themselves
+            return None
+        return create_single_nzb(os.path.basename(path), path, catdir=catdir)
+
+    def add(nzbfile: tuple[str, Optional[str]], job: Optional[NewJob]) -> tuple[AddNzbFileResult, list[str]]:
+        path, catdir = nzbfile
+        if job:
+            return add_single_nzb(job, path)
+        return process_nzb_archive_file(os.path.basename(path), path, catdir=catdir)
+
+    return create_and_add_jobs(create, add, nzbfiles)
 
 
-def nzbfile_parser(full_nzb_path: str, nzo):
+def nzbfile_parser(nzb_data: Union[str, BinaryIO], nzo):
+    """Parse the nzb.gz file in the admin dir, or the NZB while it is being saved there"""
     # For type-hinting
     nzo: NzbObject
 
@@ -388,8 +535,7 @@ def nzbfile_parser(full_nzb_path: str, nzo):
     skipped_files = 0
     valid_files = 0
 
-    # Use nzb.gz file from admin dir
-    with gzip.open(full_nzb_path) as nzb_fh:
+    with gzip.open(nzb_data) if isinstance(nzb_data, str) else contextlib.nullcontext(nzb_data) as nzb_fh:
         for _, element in xml.etree.ElementTree.iterparse(nzb_fh):
             # For type-hinting
             element: xml.etree.ElementTree.Element
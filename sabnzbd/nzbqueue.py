@@ -21,6 +21,7 @@ sabnzbd.nzbqueue - nzb queue
 
 import os
 import logging
+import threading
 import time
 import cherrypy._cpreqbody
 from typing import Union, Optional
@@ -31,7 +32,7 @@ from sabnzbd.misc import exit_sab, cat_to_opts, int_conv, caller_name, safe_lowe
 from sabnzbd.filesystem import get_admin_path, remove_all, globber_full, remove_file, is_valid_script
 from sabnzbd.nzbparser import process_single_nzb
 from sabnzbd.panic import panic_queue
-from sabnzbd.decorators import NzbQueueLocker
+from sabnzbd.decorators import NzbQueueLocker, NZBQUEUE_LOCK
 from sabnzbd.constants import (
     QUEUE_FILE_NAME,
     QUEUE_VERSION,
@@ -52,6 +53,134 @@ from sabnzbd.downloader import Server
 import sabnzbd.notifier as notifier
 
 
+class DuplicateIndex:
+    """Lookup of jobs by name, md5sum and duplicate key, so the duplicate
+    check doesn't have to go over all jobs. The jobs found still have to be checked,
+    as the index is only updated when jobs are added, renamed or removed.
+    """
+
+    def __init__(self):
+        self.__jobs: dict[str, dict[str, NzbObject]] = {}
+        self.__keys: dict[str, tuple[str, ...]] = {}
+
+    def update(self, nzo: NzbObject):
+        """Add the job, or update its information"""
+        self.remove(nzo.nzo_id)
+        keys = ["name:%s" % nzo.final_name.lower()]
+        if nzo.md5sum:
+            keys.append("md5sum:%s" % nzo.md5sum)
+        if nzo.duplicate_key:
+            keys.append("duplicate_key:%s" % nzo.duplicate_key)
+        self.__keys[nzo.nzo_id] = tuple(keys)
+        for key in keys:
+            self.__jobs.setdefault(key, {})[nzo.nzo_id] = nzo
+
+    def remove(self, nzo_id: str):
+        for key in self.__keys.pop(nzo_id, ()):
+            jobs = self.__jobs[key]
+            jobs.pop(nzo_id, None)
+            if not jobs:
+                del self.__jobs[key]
+
+    def get(self, key_type: str, value: str) -> list[NzbObject]:
+        """Jobs that had this name, md5sum or duplicate key"""
+        return list(self.__jobs.get("%s:%s" % (key_type, value), {}).values())
+
+
+class QueueIndex:
+    """Positions of the jobs by category and priority and their lower-case names,
+    so filtering and paging of the queue doesn't have to check every job.
+    Only built again after jobs were added, removed, moved or changed by the queue,
+    the status is not indexed because it is also changed outside the queue.
+    """
+
+    def __init__(self, version: int, nzo_list: list[NzbObject]):
+        self.version = version
+        self.nzo_list = nzo_list
+        self.names = [nzo.final_name.lower() for nzo in nzo_list]
+        self.nzo_ids: dict[str, list[int]] = {}
+        self.categories: dict[str, list[int]] = {}
+        self.priorities: dict[int, list[int]] = {}
+        for position, nzo in enumerate(nzo_list):
+            self.nzo_ids[nzo.nzo_id] = [position]
+            self.categories.setdefault(nzo.cat, []).append(position)
+            self.priorities.setdefault(nzo.priority, []).append(position)
+
+    def candidates(
+        self, categories: Optional[list[str]], priorities: Optional[list[int]], nzo_ids: Optional[list[str]]
+    ) -> Union[range, list[int]]:
+        """Positions of the jobs that match all the indexed filters"""
+        positions = None
+        for index, keys in ((self.categories, categories), (self.priorities, priorities), (self.nzo_ids, nzo_ids)):
+            if keys:
+                matches = set()
+                for key in keys:
+                    matches.update(index.get(key, ()))
+                positions = matches if positions is None else positions & matches
+        if positions is None:
+            return range(len(self.nzo_list))
+        return sorted(positions)
+
+
+class QueueTotals:
+    """Sizes of the jobs that are downloaded, with the bytes left before each position.
+    Built again when the jobs change, downloaded articles only update the totals of their job.
+    """
+
+    def __init__(self, index: QueueIndex):
+        self.index = index
+        self.bytes_total = 0
+        self.bytes_left = 0
+        self.size = 0
+        self.remaining = 0
+        self.job_bytes: list[int] = []
+        self.job_left: list[int] = []
+        self.counted: list[bool] = []
+        self.paused: list[bool] = []
+        self.left_before_built = [0]
+        # Bytes left that changed since the totals were built, by position
+        self.left_changed: dict[int, int] = {}
+        for nzo in index.nzo_list:
+            b_left = nzo.remaining
+            counted = nzo.status not in (Status.PAUSED, Status.CHECKING) or nzo.priority == FORCE_PRIORITY
+            if counted:
+                self.bytes_total += nzo.bytes
+                self.bytes_left += b_left
+                self.size += 1
+            self.left_before_built.append(self.bytes_left)
+            self.job_bytes.append(nzo.bytes)
+            self.job_left.append(b_left)
+            self.counted.append(counted)
+            self.paused.append(nzo.status == Status.PAUSED)
+            if nzo.status != Status.PAUSED:
+                self.remaining += b_left
+
+    def update(self, nzo: NzbObject):
+        """Take the articles downloaded for this job since the last update into account"""
+        if not (positions := self.index.nzo_ids.get(nzo.nzo_id)):
+            return
+        position = positions[0]
+        b_left = nzo.remaining
+        bytes_delta = nzo.bytes - self.job_bytes[position]
+        left_delta = b_left - self.job_left[position]
+        self.job_bytes[position] = nzo.bytes
+        self.job_left[position] = b_left
+        if self.counted[position]:
+            self.bytes_total += bytes_delta
+            self.bytes_left += left_delta
+            self.left_changed[position] = self.left_changed.get(position, 0) + left_delta
+        if not self.paused[position]:
+            self.remaining += left_delta
+
+    def left_before(self, position: int) -> int:
+        """Bytes left of the counted jobs before the position"""
+        left = self.left_before_built[position]
+        for changed_position, left_delta in self.left_changed.items():
+            if changed_position < position:
+                left += left_delta
+        return left
+
+
 class NzbQueue:
     """Singleton NzbQueue"""
 
@@ -59,6 +188,48 @@ class NzbQueue:
         self.__top_only: bool = cfg.top_only()
         self.__nzo_list: list[NzbObject] = []
         self.__nzo_table: dict[str, NzbObject] = {}
+        self.__duplicate_index = DuplicateIndex()
+        self.version: int = 0
+        self.__jobs_version: int = 0
+        self.__index: Optional[QueueIndex] = None
+        self.__totals: Optional[QueueTotals] = None
+        self.__totals_lock = threading.Lock()
+        # Jobs that downloaded articles since the totals were last updated
+        self.__totals_changed: dict[str, NzbObject] = {}
+
+    def changed(self, jobs: bool = True):
+        """Increase the version, so the API knows the queue output has to be rebuilt.
+        Only downloaded articles don't change the jobs, so the index stays valid.
+        """
+        self.version += 1
+        if jobs:
+            self.__jobs_version += 1
+
+    def index(self) -> QueueIndex:
+        """Index of the jobs, only built again if the jobs changed.
+        Built under the queue lock, as the version is increased before the jobs are changed.
+        """
+        index = self.__index
+        if not index or index.version != self.__jobs_version:
+            with NZBQUEUE_LOCK:
+                index = self.__index
+                if not index or index.version != self.__jobs_version:
+                    index = self.__index = QueueIndex(self.__jobs_version, self.__nzo_list[:])
+        return index
+
+    def totals(self, index: Optional[QueueIndex] = None) -> QueueTotals:
+        """Sizes based on the index, after that only updated for the jobs that downloaded articles"""
+        index = index or self.index()
+        with self.__totals_lock:
+            totals = self.__totals
+            if not totals or totals.index is not index:
+                self.__totals_changed.clear()
+                totals = self.__totals = QueueTotals(index)
+            # Articles could be registered while updating, they will be handled next time
+            for nzo_id in list(self.__totals_changed):
+                if nzo := self.__totals_changed.pop(nzo_id, None):
+                    totals.update(nzo)
+        return totals
 
     def read_queue(self, repair: int):
         """Read queue from disk, supporting repair modes
@@ -221,12 +392,14 @@ class NzbQueue:
             new_nzo = self.get_nzo(nzo_ids[0])
             self.__nzo_list.remove(new_nzo)
             self.__nzo_list.insert(old_position, new_nzo)
+            self.changed()
             # Reset reuse flag to make pause/abort on encryption possible
             self.__nzo_table[nzo_ids[0]].reuse = None
 
     @NzbQueueLocker
     def save(self, save_nzo: Union[NzbObject, None, bool] = None):
         """Save queue, all nzo's or just the specified one"""
+        self.changed()
         logging.info("Saving queue")
 
         nzo_ids = []
@@ -249,6 +422,7 @@ class NzbQueue:
     @NzbQueueLocker
     def change_opts(self, nzo_ids: list[str], pp: int) -> int:
         """Locked so changes during URLGrabbing are correctly passed to new job"""
+        self.changed()
         result = 0
         for nzo_id in nzo_ids:
             if nzo_id in self.__nzo_table:
@@ -259,6 +433,7 @@ class NzbQueue:
     @NzbQueueLocker
     def change_script(self, nzo_ids: list[str], script: str) -> int:
         """Locked so changes during URLGrabbing are correctly passed to new job"""
+        self.changed()
         result = 0
         if (script is None) or is_valid_script(script):
             for nzo_id in nzo_ids:
@@ -271,6 +446,7 @@ class NzbQueue:
     @NzbQueueLocker
     def change_cat(self, nzo_ids: list[str], cat: str) -> int:
         """Locked so changes during URLGrabbing are correctly passed to new job"""
+        self.changed()
         result = 0
         for nzo_id in nzo_ids:
             if nzo_id in self.__nzo_table:
@@ -287,6 +463,7 @@ class NzbQueue:
     @NzbQueueLocker
     def change_name(self, nzo_id: str, name: str, password: str = None) -> bool:
         """Locked so changes during URLGrabbing are correctly passed to new job"""
+        self.changed()
         if nzo_id in self.__nzo_table:
             nzo = self.__nzo_table[nzo_id]
             logging.info("Renaming %s to %s", nzo.final_name, name)
@@ -294,6 +471,7 @@ class NzbQueue:
             nzo.abort_direct_unpacker()
             if not nzo.futuretype:
                 nzo.set_final_name_and_scan_password(name, password)
+                self.__duplicate_index.update(nzo)
             else:
                 # Reset url fetch wait time
                 nzo.url_wait = None
@@ -310,6 +488,7 @@ class NzbQueue:
 
     @NzbQueueLocker
     def add(self, nzo: NzbObject, save: bool = True, quiet: bool = False) -> str:
+        self.changed()
         # Can already be set for future jobs
         if not nzo.nzo_id:
             nzo.nzo_id = sabnzbd.filesystem.get_new_id("nzo", nzo.admin_path, self.__nzo_table)
@@ -327,6 +506,7 @@ class NzbQueue:
             nzo.status = Status.PAUSED
 
         self.__nzo_table[nzo.nzo_id] = nzo
+        self.__duplicate_index.update(nzo)
         if priority > HIGH_PRIORITY:
             # Top and repair priority items are added to the top of the queue
             self.__nzo_list.insert(0, nzo)
@@ -373,8 +553,10 @@ class NzbQueue:
         It can be added to history directly.
         Or, we do some clean-up, sometimes leaving some data.
         """
+        self.changed()
         if nzo_id in self.__nzo_table:
             nzo = self.__nzo_table.pop(nzo_id)
+            self.__duplicate_index.remove(nzo_id)
             logging.info("[%s] Removing job %s", caller_name(), nzo.final_name)
 
             # Set statuses
@@ -415,6 +597,7 @@ class NzbQueue:
         return self.remove_multiple(nzo_ids)
 
     def remove_nzfs(self, nzo_id: str, nzf_ids: list[str]) -> list[str]:
+        self.changed()
         removed = []
         if nzo_id in self.__nzo_table:
             nzo = self.__nzo_table[nzo_id]
@@ -451,6 +634,7 @@ class NzbQueue:
     @NzbQueueLocker
     def pause_nzo(self, nzo_id: str) -> list[str]:
         """Locked so changes during URLGrabbing are correctly passed to new job"""
+        self.changed()
         handled = []
         if nzo_id in self.__nzo_table:
             nzo = self.__nzo_table[nzo_id]
@@ -468,6 +652,7 @@ class NzbQueue:
 
     @NzbQueueLocker
     def resume_nzo(self, nzo_id: str) -> list[str]:
+        self.changed()
         handled = []
         if nzo_id in self.__nzo_table:
             nzo = self.__nzo_table[nzo_id]
@@ -478,6 +663,7 @@ class NzbQueue:
 
     @NzbQueueLocker
     def switch(self, item_id_1: str, item_id_2: str) -> tuple[int, int]:
+        self.changed()
         try:
             # Allow an index as second parameter, easier for some skins
             i = int(item_id_2)
@@ -558,6 +744,7 @@ class NzbQueue:
         """Sort queue by field: "name", "size" or "avg_age" or by percentage remaining
         Direction is specified as "desc" or "asc"
         """
+        self.changed()
         field = field.lower()
         reverse = False
         if safe_lower(direction) == "desc":
@@ -594,6 +781,7 @@ class NzbQueue:
     @NzbQueueLocker
     def __set_priority(self, nzo_id: str, priority: Union[int, str]) -> Optional[int]:
         """Sets the priority on the nzo and places it in the queue at the appropriate position"""
+        self.changed()
         try:
             priority = int_conv(priority)
             nzo = self.__nzo_table[nzo_id]
@@ -716,6 +904,7 @@ class NzbQueue:
         """Register the articles we tried
         Not locked for performance, since it only modifies individual NZOs
         """
+        self.changed(jobs=False)
         nzf = article.nzf
         nzo = nzf.nzo
 
@@ -729,6 +918,7 @@ class NzbQueue:
             return
 
         articles_left, file_done, post_done = nzo.remove_article(article, success)
+        self.__totals_changed[nzo.nzo_id] = nzo
 
         if not nzo.precheck:
             # Mark as on_disk so assembler knows it can skip this article
@@ -759,6 +949,7 @@ class NzbQueue:
     @NzbQueueLocker
     def end_job(self, nzo: NzbObject):
         """Send NZO to the post-processing queue"""
+        self.changed()
         # Notify assembler to call postprocessor
         if not nzo.removed_from_queue:
             logging.info("[%s] Ending job %s", caller_name(), nzo.final_name)
@@ -809,56 +1000,47 @@ class NzbQueue:
         """Return list of queued jobs, optionally filtered and limited by start and limit.
         Not locked for performance, only reads the queue
         """
-        if search:
-            search = search.lower()
-        bytes_left = 0
-        bytes_total = 0
-        bytes_left_previous_page = 0
-        q_size = 0
-        nzo_list = []
-        nzos_matched = 0
-
-        for nzo in self.__nzo_list:
-            if nzo.status not in (Status.PAUSED, Status.CHECKING) or nzo.priority == FORCE_PRIORITY:
-                b_left = nzo.remaining
-                bytes_total += nzo.bytes
-                bytes_left += b_left
-                q_size += 1
-                # We need the number of bytes before the current page
-                if nzos_matched < start:
-                    bytes_left_previous_page += b_left
-
-            # Conditions split up for readability
-            if search and search not in nzo.final_name.lower():
-                continue
-            if categories and nzo.cat not in categories:
-                continue
-            if priorities and nzo.priority not in priorities:
-                continue
-            if statuses and nzo.status not in statuses:
-                # Propagation status is set only by the API-code, so has to be filtered specially
-                if not (Status.PROPAGATING in statuses and nzo.propagation_delay_left):
+        index = self.index()
+        totals = self.totals(index)
+        positions = index.candidates(categories, priorities, nzo_ids)
+
+        if search or statuses:
+            if search:
+                search = search.lower()
+            matched = []
+            for position in positions:
+                # Conditions split up for readability
+                if search and search not in index.names[position]:
                     continue
-            if nzo_ids and nzo.nzo_id not in nzo_ids:
-                continue
+                nzo = index.nzo_list[position]
+                if statuses and nzo.status not in statuses:
+                    # Propagation status is set only by the API-code, so has to be filtered specially
+                    if not (Status.PROPAGATING in statuses and nzo.propagation_delay_left):
+                        continue
+                matched.append(position)
+            positions = matched
+
+        # We need the number of bytes of the jobs before the current page
+        bytes_left_previous_page = 0
+        if start:
+            first_position = positions[start] if start < len(positions) else len(index.nzo_list)
+            bytes_left_previous_page = totals.left_before(first_position)
 
-            if not limit or start <= nzos_matched < start + limit:
-                nzo_list.append(nzo)
-            nzos_matched += 1
+        if limit:
+            nzo_list = [index.nzo_list[position] for position in positions[start : start + limit]]
+        else:
+            nzo_list = [index.nzo_list[position] for position in positions]
 
+        nzos_matched = len(positions)
         if not search and not nzo_ids:
-            nzos_matched = len(self.__nzo_list)
-        return bytes_total, bytes_left, bytes_left_previous_page, nzo_list, q_size, nzos_matched
+            nzos_matched = len(index.nzo_list)
+        return totals.bytes_total, totals.bytes_left, bytes_left_previous_page, nzo_list, totals.size, nzos_matched
 
     def remaining(self) -> int:
         """Return bytes left in the queue by non-paused items
         Not locked for performance, only reads the queue
         """
-        bytes_left = 0
-        for nzo in self.__nzo_list:
-            if nzo.status != Status.PAUSED:
-                bytes_left += nzo.remaining
-        return bytes_left
+        return self.totals().remaining
 
     def is_empty(self) -> bool:
         for nzo in self.__nzo_list:
@@ -924,24 +1106,28 @@ class NzbQueue:
             self.end_job(nzo)
 
     def pause_on_prio(self, priority: int):
+        self.changed()
         for nzo in self.__nzo_list:
             if nzo.priority == priority:
                 nzo.pause()
 
     @NzbQueueLocker
     def resume_on_prio(self, priority: int):
+        self.changed()
         for nzo in self.__nzo_list:
             if nzo.priority == priority:
                 # Don't use nzo.resume() to avoid resetting job warning flags
                 nzo.status = Status.QUEUED
 
     def pause_on_cat(self, cat: str):
+        self.changed()
         for nzo in self.__nzo_list:
             if nzo.cat == cat:
                 nzo.pause()
 
     @NzbQueueLocker
     def resume_on_cat(self, cat: str):
+        self.changed()
         for nzo in self.__nzo_list:
             if nzo.cat == cat:
                 # Don't use nzo.resume() to avoid resetting job warning flags
@@ -963,7 +1149,10 @@ class NzbQueue:
         """Check whether this name or md5sum is already
         in the queue or the post-processing queue"""
         lname = name.lower()
-        for nzo in self.__nzo_list + sabnzbd.PostProcessor.get_queue():
+        candidates = self.__duplicate_index.get("name", lname)
+        if md5sum:
+            candidates += self.__duplicate_index.get("md5sum", md5sum)
+        for nzo in candidates + sabnzbd.PostProcessor.get_queue():
             # Skip any jobs already marked as duplicate, to prevent double-triggers
             # URL's do not have an MD5!
             if not nzo.duplicate and (
@@ -976,7 +1165,7 @@ class NzbQueue:
     def have_duplicate_key(self, duplicate_key: str) -> bool:
         """Check whether this duplicate key is already
         in the queue or the post-processing queue"""
-        for nzo in self.__nzo_list + sabnzbd.PostProcessor.get_queue():
+        for nzo in self.__duplicate_index.get("duplicate_key", duplicate_key) + sabnzbd.PostProcessor.get_queue():
             # Skip any jobs already marked as duplicate, to prevent double-triggers
             if not nzo.duplicate and nzo.duplicate_key == duplicate_key:
                 return True
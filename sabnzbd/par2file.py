@@ -26,7 +26,7 @@ import re
 import struct
 import sabctools
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 
 from sabnzbd.constants import MEBI
 from sabnzbd.encoding import correct_unknown_encoding
@@ -34,6 +34,7 @@ from sabnzbd.filesystem import get_basename
 
 PROBABLY_PAR2_RE = re.compile(r"(.*)\.vol(\d*)[+\-](\d*)\.par2", re.I)
 SCAN_LIMIT = 10 * MEBI
+PAR2_READ_SIZE = int(MEBI)
 PAR_PKT_ID = b"PAR2\x00PKT"
 PAR_MAIN_ID = b"PAR 2.0\x00Main\x00\x00\x00\x00"
 PAR_FILE_ID = b"PAR 2.0\x00FileDesc"
@@ -72,10 +73,13 @@ def is_par2_file(filepath: str) -> bool:
     return False
 
 
-def analyse_par2(name: str, filepath: Optional[str] = None) -> tuple[str, int, int]:
+def analyse_par2(
+    name: str, filepath: Optional[str] = None, recovery_blocks: Optional[int] = None
+) -> tuple[str, int, int]:
     """Check if file is a par2-file and determine vol/block
     return setname, vol, block
     setname is empty when not a par2 file
+    The number of recovery blocks can be supplied if already known from parsing the file
     """
     name = name.strip()
     vol = block = 0
@@ -88,7 +92,9 @@ def analyse_par2(name: str, filepath: Optional[str] = None) -> tuple[str, int, i
         setname = get_basename(name).strip()
         # Could not parse the filename, need deep inspection
         # We already know it's a par2 from the is_parfile
-        if filepath:
+        if recovery_blocks is not None:
+            block = recovery_blocks
+        elif filepath:
             try:
                 # Quick loop to find number blocks
                 # Assumes blocks are larger than 128 bytes
@@ -104,10 +110,10 @@ def analyse_par2(name: str, filepath: Optional[str] = None) -> tuple[str, int, i
     return setname, vol, block
 
 
-def parse_par2_file(fname: str, md5of16k: dict[bytes, str]) -> tuple[str, dict[str, FilePar2Info]]:
-    """Get the hash table and the first-16k hash table from a PAR2 file
-    Return as dictionary, indexed on names or hashes for the first-16 table
-    The input md5of16k is modified in place and thus not returned!
+class Par2Parser:
+    """Incremental parser of the packets in a PAR2 file.
+    Data can be fed in chunks, for example while the file is being assembled,
+    so that the file doesn't have to be read from disk again afterwards.
 
     Note that par2 can and will appear in random order, so the code has to collect data first
     before we process them!
@@ -115,148 +121,267 @@ def parse_par2_file(fname: str, md5of16k: dict[bytes, str]) -> tuple[str, dict[s
     For a full description of the par2 specification, visit:
     http://parchive.sourceforge.net/docs/specifications/parity-volume-spec/article-spec.html
     """
-    set_id = slice_size = coeff = nr_files = None
-    filepar2info = {}
-    filecrc32 = {}
-    table = {}
-    duplicates16k = []
 
+    def __init__(self, name: str, total_size: int = 0):
+        self.name = name
+        self.total_size = total_size
+        self.set_id: Optional[str] = None
+        self.slice_size: Optional[int] = None
+        self.coeff: Optional[int] = None
+        self.nr_files: Optional[int] = None
+        self.recovery_blocks: int = 0
+        self.filepar2info: dict[str, FilePar2Info] = {}
+        self.filecrc32: dict[str, list[int]] = {}
+
+        # Offset of the next byte that should be fed and data that came in early
+        self.offset: int = 0
+        self.buffer = bytearray()
+        self.skip: int = 0
+        self.pending: dict[int, bytes] = {}
+        self.pending_size: int = 0
+
+        # Done when we saw all the listings, failed when the data can't be used
+        self.done: bool = False
+        self.failed: bool = False
+
+    @property
+    def complete(self) -> bool:
+        """Do we have the listings and crc32 data for all files in the set"""
+        return self.nr_files is not None and len(self.filepar2info) == self.nr_files == len(self.filecrc32)
+
+    def parsed_file(self, filepath: str) -> bool:
+        """Were all packets of the file on disk seen by the parser"""
+        if self.failed:
+            return False
+        try:
+            return self.done or self.offset == os.path.getsize(filepath)
+        except OSError:
+            return False
+
+    def counted_recovery_blocks(self, filepath: str) -> Optional[int]:
+        """Number of recovery blocks, only known if the parser did not stop before the end of the file"""
+        if not self.done and self.parsed_file(filepath):
+            return self.recovery_blocks
+        return None
+
+    def feed(self, data: Union[bytes, bytearray, memoryview], offset: Optional[int] = None):
+        """Add data, which is appended after the previous data unless offset is given.
+        Data that arrives out of order is kept until the gap before it is filled.
+        """
+        if self.done or self.failed:
+            return
+        if offset is not None and offset != self.offset:
+            if offset > self.offset:
+                self.pending[offset] = bytes(data)
+                self.pending_size += len(data)
+                if self.pending_size > SCAN_LIMIT:
+                    # Too much out of order, the file will have to be read from disk
+                    self.failed = True
+                    self.pending.clear()
+            return
+
+        self._process(data)
+        while not self.done and (data := self.pending.pop(self.offset, None)) is not None:
+            self.pending_size -= len(data)
+            self._process(data)
+
+    def _process(self, data: Union[bytes, bytearray, memoryview]):
+        """Parse all complete packets that are now available"""
+        self.offset += len(data)
+        if self.skip >= len(data):
+            self.skip -= len(data)
+            return
+        self.buffer += memoryview(data)[self.skip :]
+        self.skip = 0
+
+        buffer = self.buffer
+        while len(buffer) >= 8:
+            if buffer[:8] != PAR_PKT_ID:
+                del buffer[:8]
+                continue
+
+            # All packages start with a header before the body
+            # 8	  : PAR2\x00PKT
+            # 8	  : Length of the entire packet. Must be multiple of 4. (NB: Includes length of header.)
+            # 16  : MD5 Hash of packet.
+            # 16  : Recovery Set ID.
+            # 16  : Type of packet.
+            # ?*4 : Body of Packet. Must be a multiple of 4 bytes.
+            if len(buffer) < 16:
+                break
+
+            # Length must be multiple of 4 and at least 20
+            pack_len = struct.unpack("<Q", buffer[8:16])[0]
+            if int(pack_len / 4) * 4 != pack_len or pack_len < 20:
+                del buffer[:16]
+                continue
+
+            # We need the type of the packet to decide if we want it
+            if len(buffer) < min(pack_len, 64):
+                break
+            par2_packet_type = bytes(buffer[48:64])
+            if pack_len > 64 and par2_packet_type not in (PAR_FILE_ID, PAR_CREATOR_ID, PAR_MAIN_ID, PAR_SLICE_ID):
+                # Skip packets we don't use (recovery slices), without checking the md5sum
+                if par2_packet_type.endswith(PAR_RECOVERY_ID):
+                    self.recovery_blocks += 1
+                if len(buffer) < pack_len:
+                    self.skip = pack_len - len(buffer)
+                    buffer.clear()
+                    break
+                del buffer[:pack_len]
+                continue
+
+            if len(buffer) < pack_len:
+                break
+            packet = bytes(buffer[:pack_len])
+            del buffer[:pack_len]
+            self._parse_packet(packet)
+
+            # On large files, we stop after seeing all the listings and have crc32 data for all listings
+            # Our unit-tests do not include large par2 files, so we cannot verify cases like #3164!
+            # On smaller files, we scan them fully to get the par2-creator
+            if self.total_size > SCAN_LIMIT and self.complete:
+                self.done = True
+                buffer.clear()
+                self.pending.clear()
+                break
+
+    def _parse_packet(self, packet: bytes):
+        """Process a single packet, including its header"""
+        # Next 16 bytes is md5sum of this packet
+        md5sum = packet[16:32]
+
+        # Check the data, skip the 32 bytes of the header
+        data = packet[32:]
+        if md5sum != hashlib.md5(data).digest():
+            return
+
+        # See if it's any of the packages we care about
+        par2_packet_type = data[16:32]
+
+        # Get the Recovery Set ID
+        self.set_id = data[:16].hex()
+
+        if par2_packet_type == PAR_FILE_ID:
+            # The FileDesc packet looks like:
+            # 16 : "PAR 2.0\0FileDesc"
+            # 16 : FileId
+            # 16 : Hash for full file
+            # 16 : Hash for first 16K
+            #  8 : File length
+            # xx : Name (multiple of 4, padded with \0 if needed)
+
+            fileid = data[32:48].hex()
+            if self.filepar2info.get(fileid):
+                # Already have data
+                return
+            hash16k = data[64:80]
+            filesize = struct.unpack("<Q", data[80:88])[0]
+            filename = correct_unknown_encoding(data[88:].strip(b"\0"))
+            self.filepar2info[fileid] = FilePar2Info(filename, hash16k, filesize)
+        elif par2_packet_type == PAR_CREATOR_ID:
+            # From here until the end is the creator-text
+            # Useful in case of bugs in the par2-creating software
+            # "PAR 2.0\x00Creator\x00"
+            par2creator = data[32:].strip(b"\0")  # Remove any trailing \0
+            logging.debug("Par2-creator of %s is: %s", self.name, correct_unknown_encoding(par2creator))
+        elif par2_packet_type == PAR_MAIN_ID:
+            # The Main packet looks like:
+            # 16 : "PAR 2.0\0Main"
+            # 8  : Slice size
+            # 4  : Number of files in the recovery set
+            self.slice_size = struct.unpack("<Q", data[32:40])[0]
+            self.coeff = sabctools.crc32_xpow8n(self.slice_size)
+            self.nr_files = struct.unpack("<I", data[40:44])[0]
+        elif par2_packet_type == PAR_SLICE_ID:
+            # "PAR 2.0\0IFSC\0\0\0\0"
+            fileid = data[32:48].hex()
+            if not self.filecrc32.get(fileid):
+                self.filecrc32[fileid] = []
+                for i in range(48, len(data), 20):
+                    self.filecrc32[fileid].append(struct.unpack("<I", data[i + 16 : i + 20])[0])
+
+    def get_table(self, md5of16k: dict[bytes, str]) -> tuple[Optional[str], dict[str, FilePar2Info]]:
+        """Get the hash table and the first-16k hash table from the parsed packets
+        Return as dictionary, indexed on names or hashes for the first-16 table
+        The input md5of16k is modified in place and thus not returned!
+        """
+        table = {}
+        duplicates16k = []
+
+        # Process all the data
+        for fileid in self.filepar2info.keys():
+            # Sanity check
+            par2info = self.filepar2info[fileid]
+            if not self.filecrc32.get(fileid) or not self.nr_files or not self.slice_size:
+                logging.debug("Missing essential information for %s", par2info)
+                continue
+
+            # Handle also cases where slice_size is exact match for filesize
+            # We currently don't have an unittest for that!
+            slices = par2info.filesize // self.slice_size
+            slice_nr = 0
+            crc32 = 0
+            while slice_nr < slices:
+                crc32 = sabctools.crc32_multiply(crc32, self.coeff) ^ self.filecrc32[fileid][slice_nr]
+                slice_nr += 1
+
+            if tail_size := par2info.filesize % self.slice_size:
+                crc32 = sabctools.crc32_combine(
+                    crc32,
+                    sabctools.crc32_zero_unpad(self.filecrc32[fileid][-1], self.slice_size - tail_size),
+                    tail_size,
+                )
+            par2info.filehash = crc32
+
+            # We found hash data, add it to final table
+            table[par2info.filename] = par2info
+
+            # Check for md5of16k duplicates
+            if par2info.hash16k not in md5of16k:
+                md5of16k[par2info.hash16k] = par2info.filename
+            elif md5of16k[par2info.hash16k] != par2info.filename:
+                # Not unique and not already linked to this file
+                # Mark and remove to avoid false-renames
+                duplicates16k.append(par2info.hash16k)
+                table[par2info.filename].has_duplicate = True
+
+        # Have to remove duplicates at the end to make sure
+        # no trace is left in case of multi-duplicates
+        for hash16k in duplicates16k:
+            if hash16k in md5of16k:
+                old_name = md5of16k.pop(hash16k)
+                logging.debug("Par2-16k signature of %s not unique, discarding", old_name)
+
+        # Sort table by filename
+        # This is necessary because of the rare case that a set contains duplicate files.
+        # The crc32 quick check loops over files in the set and considered if they match an NzbFile.
+        # For example in a set with the packets in the order 003, 004, 001, 002 with 002 and 003 being identical files:
+        # We would start with 003 and the first match would be 002, therefore rename 002 to 003 overwriting the also
+        # downloaded 003 file.
+        # Finally, we would process 002 and the first unverified path will be 003 so rename 003 back to 002.
+        # The end result is we would have moved a single file from 002 to 003 to 002 and end up missing 003.
+        table = {filename: table[filename] for filename in sorted(table.keys())}
+
+        return self.set_id, table
+
+
+def parse_par2_file(
+    fname: str, md5of16k: dict[bytes, str], parser: Optional[Par2Parser] = None
+) -> tuple[str, dict[str, FilePar2Info]]:
+    """Get the hash table and the first-16k hash table from a PAR2 file
+    Return as dictionary, indexed on names or hashes for the first-16 table
+    The input md5of16k is modified in place and thus not returned!
+    If a parser is supplied that already saw the whole file, the file is not read again.
+    """
     try:
-        total_size = os.path.getsize(fname)
-        with open(fname, "rb") as f:
-            while header := f.read(8):
-                if header == PAR_PKT_ID:
-                    # All packages start with a header before the body
-                    # 8	  : PAR2\x00PKT
-                    # 8	  : Length of the entire packet. Must be multiple of 4. (NB: Includes length of header.)
-                    # 16  : MD5 Hash of packet.
-                    # 16  : Recovery Set ID.
-                    # 16  : Type of packet.
-                    # ?*4 : Body of Packet. Must be a multiple of 4 bytes.
-
-                    # Length must be multiple of 4 and at least 20
-                    pack_len = struct.unpack("<Q", f.read(8))[0]
-                    if int(pack_len / 4) * 4 != pack_len or pack_len < 20:
-                        continue
-
-                    # Next 16 bytes is md5sum of this packet
-                    md5sum = f.read(16)
-
-                    # Read and check the data
-                    # Subtract 32 because we already read these bytes of the header
-                    data = f.read(pack_len - 32)
-                    if md5sum != hashlib.md5(data).digest():
-                        continue
-
-                    # See if it's any of the packages we care about
-                    par2_packet_type = data[16:32]
-
-                    # Get the Recovery Set ID
-                    set_id = data[:16].hex()
-
-                    if par2_packet_type == PAR_FILE_ID:
-                        # The FileDesc packet looks like:
-                        # 16 : "PAR 2.0\0FileDesc"
-                        # 16 : FileId
-                        # 16 : Hash for full file
-                        # 16 : Hash for first 16K
-                        #  8 : File length
-                        # xx : Name (multiple of 4, padded with \0 if needed)
-
-                        fileid = data[32:48].hex()
-                        if filepar2info.get(fileid):
-                            # Already have data
-                            continue
-                        hash16k = data[64:80]
-                        filesize = struct.unpack("<Q", data[80:88])[0]
-                        filename = correct_unknown_encoding(data[88:].strip(b"\0"))
-                        filepar2info[fileid] = FilePar2Info(filename, hash16k, filesize)
-                    elif par2_packet_type == PAR_CREATOR_ID:
-                        # From here until the end is the creator-text
-                        # Useful in case of bugs in the par2-creating software
-                        # "PAR 2.0\x00Creator\x00"
-                        par2creator = data[32:].strip(b"\0")  # Remove any trailing \0
-                        logging.debug(
-                            "Par2-creator of %s is: %s", os.path.basename(f.name), correct_unknown_encoding(par2creator)
-                        )
-                    elif par2_packet_type == PAR_MAIN_ID:
-                        # The Main packet looks like:
-                        # 16 : "PAR 2.0\0Main"
-                        # 8  : Slice size
-                        # 4  : Number of files in the recovery set
-                        slice_size = struct.unpack("<Q", data[32:40])[0]
-                        coeff = sabctools.crc32_xpow8n(slice_size)
-                        nr_files = struct.unpack("<I", data[40:44])[0]
-                    elif par2_packet_type == PAR_SLICE_ID:
-                        # "PAR 2.0\0IFSC\0\0\0\0"
-                        fileid = data[32:48].hex()
-                        if not filecrc32.get(fileid):
-                            filecrc32[fileid] = []
-                            for i in range(48, pack_len - 32, 20):
-                                filecrc32[fileid].append(struct.unpack("<I", data[i + 16 : i + 20])[0])
-
-                    # On large files, we stop after seeing all the listings and have crc32 data for all listings
-                    # Our unit-tests do not include large par2 files, so we cannot verify cases like #3164!
-                    # On smaller files, we scan them fully to get the par2-creator
-                    if total_size > SCAN_LIMIT and len(filepar2info) == nr_files == len(filecrc32):
-                        break
-
-            # Process all the data
-            for fileid in filepar2info.keys():
-                # Sanity check
-                par2info = filepar2info[fileid]
-                if not filecrc32.get(fileid) or not nr_files or not slice_size:
-                    logging.debug("Missing essential information for %s", par2info)
-                    continue
-
-                # Handle also cases where slice_size is exact match for filesize
-                # We currently don't have an unittest for that!
-                slices = par2info.filesize // slice_size
-                slice_nr = 0
-                crc32 = 0
-                while slice_nr < slices:
-                    crc32 = sabctools.crc32_multiply(crc32, coeff) ^ filecrc32[fileid][slice_nr]
-                    slice_nr += 1
-
-                if tail_size := par2info.filesize % slice_size:
-                    crc32 = sabctools.crc32_combine(
-                        crc32, sabctools.crc32_zero_unpad(filecrc32[fileid][-1], slice_size - tail_size), tail_size
-                    )
-                par2info.filehash = crc32
-
-                # We found hash data, add it to final table
-                table[par2info.filename] = par2info
-
-                # Check for md5of16k duplicates
-                if par2info.hash16k not in md5of16k:
-                    md5of16k[par2info.hash16k] = par2info.filename
-                elif md5of16k[par2info.hash16k] != par2info.filename:
-                    # Not unique and not already linked to this file
-                    # Mark and remove to avoid false-renames
-                    duplicates16k.append(par2info.hash16k)
-                    table[par2info.filename].has_duplicate = True
-
+        if not parser or not parser.parsed_file(fname):
+            parser = Par2Parser(os.path.basename(fname), os.path.getsize(fname))
+            with open(fname, "rb") as f:
+                while not parser.done and (data := f.read(PAR2_READ_SIZE)):
+                    parser.feed(data)
+        return parser.get_table(md5of16k)
     except Exception:
         logging.info("Par2 parser crashed in file %s", fname)
         logging.debug("Traceback: ", exc_info=True)
-        table = {}
-        set_id = None
-
-    # Have to remove duplicates at the end to make sure
-    # no trace is left in case of multi-duplicates
-    for hash16k in duplicates16k:
-        if hash16k in md5of16k:
-            old_name = md5of16k.pop(hash16k)
-            logging.debug("Par2-16k signature of %s not unique, discarding", old_name)
-
-    # Sort table by filename
-    # This is necessary because of the rare case that a set contains duplicate files.
-    # The crc32 quick check loops over files in the set and considered if they match an NzbFile.
-    # For example in a set with the packets in the order 003, 004, 001, 002 with 002 and 003 being identical files:
-    # We would start with 003 and the first match would be 002, therefore rename 002 to 003 overwriting the also
-    # downloaded 003 file.
-    # Finally, we would process 002 and the first unverified path will be 003 so rename 003 back to 002.
-    # The end result is we would have moved a single file from 002 to 003 to 002 and end up missing 003.
-    table = {filename: table[filename] for filename in sorted(table.keys())}
-
-    return set_id, table
+        return None, {}
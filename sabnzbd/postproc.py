@@ -39,6 +39,8 @@ from sabnzbd.newsunpack import (
     build_filelists,
     rar_sort,
     is_sfv_file,
+    run_for_sets,
+    shared_par2_sets,
 )
 from threading import Thread, Event
 from sabnzbd.misc import (
@@ -123,8 +125,8 @@ class PostProcessor(Thread):
         for nzo in self.history_queue:
             self.process(nzo)
 
-        # So we can always cancel external processes
-        self.external_process: Optional[subprocess.Popen] = None
+        # So we can always cancel external processes, multiple sets can run at the same time
+        self.external_processes: list[subprocess.Popen] = []
 
         # Counter to not only process fast-jobs
         self.__fast_job_count = 0
@@ -221,12 +223,15 @@ class PostProcessor(Thread):
                 nzo.abort_direct_unpacker()
                 if nzo.pp_active:
                     nzo.pp_active = False
-                    try:
-                        # Try to kill any external running process
-                        self.external_process.kill()
-                        logging.info("Killed external process %s", self.external_process.args[0])
-                    except Exception:
-                        pass
+                    # Try to kill any external running process
+                    for external_process in self.external_processes[:]:
+                        if external_process.poll() is not None:
+                            continue
+                        try:
+                            external_process.kill()
+                            logging.info("Killed external process %s", external_process.args[0])
+                        except Exception:
+                            pass
                 result = True
             return result
         return result
@@ -347,7 +352,7 @@ class PostProcessor(Thread):
             nzo.pp_active = False
 
             self.remove(nzo)
-            self.external_process = None
+            self.external_processes = []
             check_eoq = True
 
             # Allow download to proceed if it was paused for post-processing
@@ -802,6 +807,7 @@ def parring(nzo: NzbObject) -> tuple[bool, bool]:
 
     if nzo.extrapars:
         # Need to make a copy because it can change during iteration
+        repair_sets = []
         for setname in list(nzo.extrapars):
             # We do not care about repairing samples
             if cfg.ignore_samples() and is_sample(setname.lower()):
@@ -810,16 +816,29 @@ def parring(nzo: NzbObject) -> tuple[bool, bool]:
 
             # Skip sets that were already tried
             if not verified.get(setname, False):
-                logging.info("Running verification and repair on set %s", setname)
-                need_re_add, res = par2_repair(nzo, setname)
-                re_add = re_add or need_re_add
-                verified[setname] = res
-
-                # Update the general repair-state
-                par_error = par_error or not res
+                repair_sets.append(setname)
             else:
                 logging.info("Skipping verification and repair of %s as it was previously verified", setname)
 
+        def repair_set(setname: str) -> tuple[bool, bool]:
+            logging.info("Running verification and repair on set %s", setname)
+            return par2_repair(nzo, setname)
+
+        # Independent sets can be verified and repaired at the same time, but
+        # sets that par2 scans using a shared wildcard have to be done one by one
+        shared_sets = shared_par2_sets(nzo, repair_sets)
+        independent_sets = [setname for setname in repair_sets if setname not in shared_sets]
+        results = dict(zip(independent_sets, run_for_sets(repair_set, independent_sets)))
+        results.update((setname, repair_set(setname)) for setname in shared_sets)
+
+        for setname in repair_sets:
+            need_re_add, res = results[setname]
+            re_add = re_add or need_re_add
+            verified[setname] = res
+
+            # Update the general repair-state
+            par_error = par_error or not res
+
     # Skip other checks and RAR-rename if there was a par2 problem
     if not par_error:
         # If there's no RAR's, they might be super-obfuscated
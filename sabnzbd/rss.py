@@ -23,10 +23,12 @@ import re
 import logging
 import time
 import datetime
+import hashlib
 import threading
 import urllib.parse
+import concurrent.futures
 from dataclasses import dataclass, field
-from typing import Union, Optional
+from typing import Union, Optional, Generator
 
 import sabnzbd
 from sabnzbd.constants import RSS_FILE_NAME, DEFAULT_PRIORITY
@@ -48,9 +50,13 @@ import sabnzbd.emailer as emailer
 import feedparser
 
 RSS_LOCK = threading.RLock()
+# Feeds of different hosts are read at the same time, with a delay between the feeds of the same host
+RSS_MAX_HOSTS = 8
+RSS_HOST_DELAY = 15
 _RE_SP = re.compile(r"s*(\d+)[ex](\d+)", re.I)
 _RE_SIZE1 = re.compile(r"Size:\s*(\d+\.\d+\s*[KMG]?)B\W*", re.I)
 _RE_SIZE2 = re.compile(r"\W*(\d+\.\d+\s*[KMG]?)B\W*", re.I)
+_RE_BACKREFERENCE = re.compile(r"\\\d|\(\?P=")
 
 
 @dataclass(frozen=True)
@@ -326,6 +332,9 @@ class FeedConfig:
     default_pp: Optional[int] = None
     default_script: Optional[str] = None
     rules: list[FeedRule] = field(default_factory=list)
+    rule_blocks: list[tuple[Optional[re.Pattern], list[tuple[int, FeedRule]]]] = field(
+        default_factory=list, init=False, repr=False
+    )
 
     def __post_init__(self):
         self.default_category = _normalise_str_or_none(self.default_category)
@@ -334,6 +343,47 @@ class FeedConfig:
         self.default_priority = _normalise_priority(self.default_priority)
         self.default_pp = _normalise_pp(self.default_pp)
         self.default_script = _normalise_str_or_none(self.default_script)
+        self.rule_blocks = self.compile_rules()
+
+    def compile_rules(self) -> list[tuple[Optional[re.Pattern], list[tuple[int, FeedRule]]]]:
+        """Combine consecutive accept and reject rules in blocks with a single regex.
+        These rules can only match if their regex is found in the title, so if the combined
+        regex isn't found, the whole block can be skipped. Otherwise the rules of the block
+        are still checked one by one, so the first matching rule is used.
+        """
+        rule_blocks = []
+        title_rules = []
+
+        def add_title_rules():
+            if title_rules:
+                try:
+                    prefilter = re.compile("|".join("(?:%s)" % rule.regex.pattern for _, rule in title_rules), re.I)
+                except re.error:
+                    prefilter = None
+                rule_blocks.append((prefilter, title_rules[:]))
+                title_rules.clear()
+
+        for idx, rule in enumerate(self.rules):
+            if not rule.enabled:
+                continue
+            if (
+                rule.type in ("A", "R")
+                and isinstance(rule.regex, re.Pattern)
+                and not _RE_BACKREFERENCE.search(rule.regex.pattern)
+            ):
+                title_rules.append((idx, rule))
+            else:
+                add_title_rules()
+                rule_blocks.append((None, [(idx, rule)]))
+        add_title_rules()
+        return rule_blocks
+
+    def candidate_rules(self, title: str) -> Generator[tuple[int, FeedRule], None, None]:
+        """Enabled rules in order, except for blocks of which none of the rules can match the title"""
+        for prefilter, block in self.rule_blocks:
+            if prefilter and not prefilter.search(title):
+                continue
+            yield from block
 
     def has_type(self, *types: str) -> bool:
         """Check if any rule matches the given types"""
@@ -406,10 +456,7 @@ class FeedConfig:
             cur_episode = show_analysis.info.get("episode_num")
 
         # Match against all filters until a positive or negative match
-        for idx, rule in enumerate(self.rules):
-            if not rule.enabled:
-                continue
-
+        for idx, rule in self.candidate_rules(title):
             outcome = rule.matches(
                 title=title,
                 category=category,
@@ -484,9 +531,35 @@ class FeedConfig:
         return cat, pp, script, priority
 
 
+@dataclass
+class FeedState:
+    """What an incremental run needs to skip the unchanged parts of a feed"""
+
+    config: str = ""
+    # Per URI the ETag and Last-Modified of the response and its entries, for when it wasn't modified
+    validators: dict[str, tuple[Optional[str], Optional[str], list]] = field(default_factory=dict)
+    # Fingerprints of the entries that were already evaluated, with their link
+    entries: dict[str, str] = field(default_factory=dict)
+    unchanged: bool = False
+
+    @staticmethod
+    def fingerprint(entry: feedparser.FeedParserDict) -> str:
+        return hashlib.sha1(repr(entry).encode("utf-8", errors="replace")).hexdigest()
+
+    @staticmethod
+    def skip_entry(job: Optional[dict], download: bool) -> bool:
+        """Unchanged entries only have to be evaluated again if that could change the outcome"""
+        if not job:
+            return False
+        job_status = job.get("status", " ")
+        # Good matches of a run without downloading could be downloaded now
+        return job_status in ("B", "G*", "D", "D-") or (job_status == "G" and not download)
+
+
 class RSSReader:
     def __init__(self):
         self.jobs = {}
+        self.feed_states: dict[str, FeedState] = {}
         self.next_run = time.time()
         self.shutdown = False
 
@@ -528,7 +601,6 @@ class RSSReader:
     def stop(self):
         self.shutdown = True
 
-    @synchronized(RSS_LOCK)
     def run_feed(
         self,
         feed: str,
@@ -536,8 +608,11 @@ class RSSReader:
         ignore_first: bool = False,
         force: bool = False,
         readout: bool = True,
+        incremental: bool = False,
     ) -> str:
-        """Run the query for one URI and apply filters"""
+        """Run the query for one URI and apply filters
+        Incremental runs skip unmodified feeds and entries that were already evaluated with the same filters
+        """
         self.shutdown = False
 
         if not feed:
@@ -547,77 +622,109 @@ class RSSReader:
         new_downloads: list[str] = []
 
         # Configuration
-        uris, filters, first, jobs, config_error = self.configure_rss(feed, ignore_first)
-        if config_error:
-            return config_error
+        with RSS_LOCK:
+            uris, filters, first, jobs, config_error = self.configure_rss(feed, ignore_first)
+            if config_error:
+                return config_error
+
+            state = None
+            if readout and incremental and not force:
+                state = self.feed_states.get(feed)
+                if not state or state.config != repr(filters):
+                    state = self.feed_states[feed] = FeedState(config=repr(filters))
+            else:
+                self.feed_states.pop(feed, None)
 
-        # Fetch & parse RSS
+        # Fetch & parse RSS, without holding the lock so other feeds can be read at the same time
         if readout:
-            entries, msg = self.fetch_rss(feed, uris)
+            entries, msg = self.fetch_rss(feed, uris, state)
         else:
             entries, msg = (jobs, "")
 
-        # Error in readout or no new readout
-        if readout and not entries:
-            return msg
-
-        # Normalise entries, evaluate rules and apply side effects
-        for entry in entries:
-            if self.shutdown:
+        with RSS_LOCK:
+            # Nothing changed since the previous run
+            if state and state.unchanged:
+                logging.debug("Feed %s was not modified", feed)
                 return ""
 
-            try:
-                if readout:
-                    normalised = NormalisedEntry.from_feed_entry(entry)
-                    if not normalised:
-                        continue
-                    # Skip duplicates across multiple feeds
-                    if len(uris) > 1 and self.is_duplicate(normalised, jobs):
+            # Error in readout or no new readout
+            if readout and not entries:
+                return msg
+
+            evaluated_entries = {}
+
+            # Normalise entries, evaluate rules and apply side effects
+            for entry in entries:
+                if self.shutdown:
+                    # The next run has to do the full feed again
+                    self.feed_states.pop(feed, None)
+                    return ""
+
+                if state:
+                    fingerprint = state.fingerprint(entry)
+                    if (link := state.entries.get(fingerprint)) and state.skip_entry(jobs.get(link), download):
+                        evaluated_entries[fingerprint] = link
+                        new_links.append(link)
+                        jobs[link]["time"] = time.time()
                         continue
-                else:
-                    normalised = NormalisedEntry.from_job_entry(entry, jobs)
-            except (AttributeError, IndexError):
-                last_uri = uris[-1] if uris else ""
-                logging.info(T("Incompatible feed") + " " + last_uri)
-                logging.info("Traceback: ", exc_info=True)
-                return T("Incompatible feed")
-
-            if not normalised.link:
-                continue
-
-            # Track all valid links so obsolete ones can be cleaned up later
-            new_links.append(normalised.link)
-
-            evaluation, should_download, is_starred = self._evaluate_entry(
-                entry=normalised,
-                jobs=jobs,
-                filters=filters,
-                first=first,
-                download=download,
-                force=force,
-                readout=readout,
-            )
-            if evaluation is None:
-                continue
 
-            downloaded = self._process_entry(
-                feed=feed,
-                entry=normalised,
-                jobs=jobs,
-                evaluation=evaluation,
-                should_download=should_download,
-                is_starred=is_starred,
-            )
-            if downloaded:
-                new_downloads.append(normalised.title)
+                try:
+                    if readout:
+                        normalised = NormalisedEntry.from_feed_entry(entry)
+                        if not normalised:
+                            continue
+                        # Skip duplicates across multiple feeds
+                        if len(uris) > 1 and self.is_duplicate(normalised, jobs):
+                            continue
+                    else:
+                        normalised = NormalisedEntry.from_job_entry(entry, jobs)
+                except (AttributeError, IndexError):
+                    last_uri = uris[-1] if uris else ""
+                    logging.info(T("Incompatible feed") + " " + last_uri)
+                    logging.info("Traceback: ", exc_info=True)
+                    self.feed_states.pop(feed, None)
+                    return T("Incompatible feed")
+
+                if not normalised.link:
+                    continue
+
+                # Track all valid links so obsolete ones can be cleaned up later
+                new_links.append(normalised.link)
+                if state:
+                    evaluated_entries[fingerprint] = normalised.link
+
+                evaluation, should_download, is_starred = self._evaluate_entry(
+                    entry=normalised,
+                    jobs=jobs,
+                    filters=filters,
+                    first=first,
+                    download=download,
+                    force=force,
+                    readout=readout,
+                )
+                if evaluation is None:
+                    continue
+
+                downloaded = self._process_entry(
+                    feed=feed,
+                    entry=normalised,
+                    jobs=jobs,
+                    evaluation=evaluation,
+                    should_download=should_download,
+                    is_starred=is_starred,
+                )
+                if downloaded:
+                    new_downloads.append(normalised.title)
 
-        # Send email if wanted and not "forced"
-        if new_downloads and cfg.email_rss() and not force:
-            emailer.rss_mail(feed, new_downloads)
+            # Send email if wanted and not "forced"
+            if new_downloads and cfg.email_rss() and not force:
+                emailer.rss_mail(feed, new_downloads)
 
-        self.remove_obsolete(jobs, new_links)
+            self.remove_obsolete(jobs, new_links)
+            if state:
+                state.entries = evaluated_entries
 
-        return msg
+            return msg
 
     def configure_rss(
         self, feed: str, ignore_first: bool
@@ -713,28 +820,50 @@ class RSSReader:
                 del jobs[old]
 
     @staticmethod
-    def fetch_rss(feed: str, uris: list[str]) -> tuple[list[feedparser.FeedParserDict], str]:
+    def fetch_rss(
+        feed: str, uris: list[str], state: Optional[FeedState] = None
+    ) -> tuple[list[feedparser.FeedParserDict], str]:
         """Fetch and parse RSS feeds for the given URIs.
+        With a state, a conditional request is made and the previous entries are used if not modified.
 
         Returns (entries, message).
         """
         all_entries = []
         msg = ""
+        if state:
+            state.unchanged = True
 
         for uri in uris:
             # Reset parsing message for each feed
             msg = ""
             feed_parsed = {}
             uri = uri.replace(" ", "%20").replace("feed://", "http://")
+            etag, modified, previous_entries = (
+                state.validators.pop(uri, (None, None, [])) if state else (None, None, [])
+            )
             logging.debug("Running feedparser on %s", uri)
             try:
-                feed_parsed = feedparser.parse(uri)
+                feed_parsed = feedparser.parse(uri, etag=etag, modified=modified)
             except Exception as feedparser_exc:
                 # Feedparser 5 would catch all errors, while 6 just throws them back at us
                 feed_parsed["bozo_exception"] = feedparser_exc
             logging.debug("Finished parsing %s", uri)
 
             status = feed_parsed.get("status", 999)
+            if state:
+                if status == 304 and (etag or modified):
+                    logging.debug("Feed %s was not modified", uri)
+                    state.validators[uri] = (etag, modified, previous_entries)
+                    all_entries.extend(previous_entries)
+                    continue
+                state.unchanged = False
+                if (feed_parsed.get("etag") or feed_parsed.get("modified")) and feed_parsed.get("entries"):
+                    state.validators[uri] = (
+                        feed_parsed.get("etag"),
+                        feed_parsed.get("modified"),
+                        feed_parsed["entries"],
+                    )
+
             if status in (401, 402, 403):
                 msg = T("Do not have valid authentication for feed %s") % uri
             elif 500 <= status <= 599:
@@ -907,33 +1036,48 @@ class RSSReader:
         return bool(evaluation.matched and should_download)
 
     def run(self):
-        """Run all the URI's and filters"""
+        """Run all the URI's and filters, the feeds of different hosts at the same time"""
         if not sabnzbd.PAUSED_ALL:
-            active = False
             if self.next_run < time.time():
                 self.next_run = time.time() + cfg.rss_rate() * 60
-            feeds = config.get_rss()
+            feeds_by_host: dict[str, list[str]] = {}
             try:
+                feeds = config.get_rss()
                 for feed in feeds:
                     if feeds[feed].enable():
-                        logging.info('Starting scheduled RSS read-out for "%s"', feed)
-                        active = True
-                        self.run_feed(feed, download=True, ignore_first=True)
-                        # Wait 15 seconds, else sites may get irritated
-                        for _ in range(15):
-                            if self.shutdown:
-                                return
-                            else:
-                                time.sleep(1.0)
+                        uris = feeds[feed].uri()
+                        host = urllib.parse.urlparse(uris[0]).hostname if uris else ""
+                        feeds_by_host.setdefault(host or "", []).append(feed)
             except (KeyError, RuntimeError):
                 # Feed must have been deleted
                 logging.info("RSS read-out crashed, feed must have been deleted or edited")
                 logging.debug("Traceback: ", exc_info=True)
-                pass
-            if active:
+
+            if feeds_by_host:
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=RSS_MAX_HOSTS, thread_name_prefix="RSSReader"
+                ) as executor:
+                    list(executor.map(self.run_host_feeds, feeds_by_host.values()))
                 self.save()
                 logging.info("Finished scheduled RSS read-outs")
 
+    def run_host_feeds(self, feeds: list[str]):
+        """Read the feeds of a single host one by one"""
+        for feed_number, feed in enumerate(feeds):
+            # Wait between the feeds, else sites may get irritated
+            if feed_number:
+                for _ in range(RSS_HOST_DELAY):
+                    if self.shutdown:
+                        return
+                    time.sleep(1.0)
+            try:
+                logging.info('Starting scheduled RSS read-out for "%s"', feed)
+                self.run_feed(feed, download=True, ignore_first=True, incremental=True)
+            except (KeyError, RuntimeError):
+                # Feed must have been deleted
+                logging.info("RSS read-out crashed, feed must have been deleted or edited")
+                logging.debug("Traceback: ", exc_info=True)
+
     @synchronized(RSS_LOCK)
     def show_result(self, feed):
         if feed in self.jobs:
@@ -950,11 +1094,13 @@ class RSSReader:
 
     @synchronized(RSS_LOCK)
     def delete(self, feed):
+        self.feed_states.pop(feed, None)
         if feed in self.jobs:
             del self.jobs[feed]
 
     @synchronized(RSS_LOCK)
     def rename(self, old_feed, new_feed):
+        self.feed_states.pop(old_feed, None)
         if old_feed in self.jobs:
             old_data = self.jobs.pop(old_feed)
             self.jobs[new_feed] = old_data
@@ -980,6 +1126,7 @@ class RSSReader:
     @synchronized(RSS_LOCK)
     def clear_feed(self, feed):
         # Remove any previous references to this feed name, and start fresh
+        self.feed_states.pop(feed, None)
         if feed in self.jobs:
             del self.jobs[feed]
 
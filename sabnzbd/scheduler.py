@@ -221,6 +221,15 @@ class Scheduler:
             (0, 0),
         )
 
+        logging.info("Setting schedule for nightly history-maintenance")
+        self.scheduler.add_daytime_task(
+            sabnzbd.database.scheduled_history_maintenance,
+            "history_maintenance",
+            DAILY_RANGE,
+            None,
+            (3, 0),
+        )
+
         logging.info("Setting schedule for midnight BPS reset")
         self.scheduler.add_daytime_task(
             sabnzbd.BPSMeter.update,
@@ -22,10 +22,12 @@ sabnzbd.sorting - Sorting Functions
 import os
 import logging
 import re
+import threading
 import guessit
+from collections import OrderedDict
 from rebulk.match import MatchesDict
 from string import whitespace, punctuation
-from typing import Optional, Union
+from typing import Optional, Union, Any
 
 import sabnzbd
 from sabnzbd.filesystem import (
@@ -66,6 +68,9 @@ RE_ENDFN = re.compile(r"%fn}?$", re.I)
 # Prevent guessit/rebulk from spamming the log when debug logging is active in SABnzbd
 logging.getLogger("rebulk").setLevel(logging.WARNING)
 
+# Number of names of which the guess is kept, RSS feeds alone can have thousands of entries
+GUESS_CACHE_SIZE = 5000
+
 
 class Sorter:
     """Generic Sorter class"""
@@ -633,6 +638,56 @@ def move_to_parent_directory(workdir: str) -> tuple[str, bool]:
     return dest, True
 
 
+class GuessCache:
+    """Least recently used guesses, the same names are analysed for RSS, the pre-queue script,
+    the duplicate check and sorting. Only the properties are kept, without the matches of guessit.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.guesses: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> Optional[MatchesDict]:
+        """Return a copy, so the cached guess can't be modified"""
+        with self.lock:
+            if (properties := self.guesses.get(name)) is None:
+                self.misses += 1
+                return None
+            self.guesses.move_to_end(name)
+            self.hits += 1
+        guess = MatchesDict()
+        guess.update(properties)
+        return guess
+
+    def add(self, name: str, guess: MatchesDict):
+        with self.lock:
+            self.guesses[name] = dict(guess)
+            self.guesses.move_to_end(name)
+            while len(self.guesses) > self.size:
+                self.guesses.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.guesses),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(100 * self.hits / lookups, 1) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.guesses.clear()
+            self.hits = self.misses = 0
+
+
+GUESS_CACHE = GuessCache(GUESS_CACHE_SIZE)
+
+
 def guess_what(name: str) -> MatchesDict:
     """Guess metadata for movies or episodes from their name."""
 
@@ -642,6 +697,9 @@ def guess_what(name: str) -> MatchesDict:
     # Remove any passwords from the name
     name = scan_password(name)[0]
 
+    if (guess := GUESS_CACHE.get(name)) is not None:
+        return guess
+
     # Avoid trouble with names starting with a digit (esp. with no year in the name)
     digit_fix = "FIX" if name[0].isdigit() else ""
 
@@ -694,6 +752,7 @@ def guess_what(name: str) -> MatchesDict:
         ):
             guess["type"] = "unknown"
 
+    GUESS_CACHE.add(name, guess)
     return guess
 
 
@@ -23,14 +23,17 @@ import os
 import sys
 import time
 import logging
-import queue
+import heapq
+import itertools
+import collections
+import concurrent.futures
 import urllib.request
 import urllib.parse
 import urllib.error
 import gzip
 from http.client import IncompleteRead, HTTPResponse
 from mailbox import Message
-from threading import Thread
+from threading import Thread, Condition
 import base64
 from typing import Optional, Union, Any
 
@@ -53,11 +56,23 @@ from sabnzbd.encoding import ubtou, utob
 from sabnzbd.nzbparser import AddNzbFileResult
 from sabnzbd.nzb import NzbObject, NzbRejected, NzbRejectToHistory
 
+# Number of URLs fetched at the same time, in total and from the same host
+URLGRABBER_THREADS = 8
+URLGRABBER_HOST_LIMIT = 2
+# Seconds before checking again if a paused URL was resumed
+URLGRABBER_PAUSED_WAIT = 2.0
+
 
 class URLGrabber(Thread):
     def __init__(self):
         super().__init__()
-        self.queue: queue.Queue[tuple[Optional[str], Optional[NzbObject]]] = queue.Queue()
+        # Heap of (due time, order of adding, url, future_nzo), so waiting URLs are not touched until they are due
+        self.delayed: list[tuple[float, int, str, NzbObject]] = []
+        self.order = itertools.count()
+        self.condition = Condition()
+        # Fetches running per host and the due URLs waiting for one of them to finish
+        self.host_active: dict[str, int] = {}
+        self.host_waiting: dict[str, collections.deque[tuple[str, NzbObject]]] = {}
         self.shutdown = False
 
     def add(self, url: str, future_nzo: NzbObject, when: Optional[int] = None):
@@ -73,239 +88,286 @@ class URLGrabber(Thread):
 
             future_nzo.url_wait = time.time() + when
 
-        self.queue.put((url, future_nzo))
+        self.schedule(url, future_nzo, future_nzo.url_wait if future_nzo else None)
+
+    def schedule(self, url: str, future_nzo: NzbObject, due: Optional[float] = None):
+        with self.condition:
+            heapq.heappush(self.delayed, (due or time.time(), next(self.order), url, future_nzo))
+            self.condition.notify()
 
     def stop(self):
-        self.shutdown = True
-        self.queue.put((None, None))
+        with self.condition:
+            self.shutdown = True
+            self.condition.notify()
+
+    def next_due(self) -> Optional[tuple[str, NzbObject]]:
+        """Wait until the first URL is due, returns None when stopping"""
+        with self.condition:
+            while not self.shutdown:
+                wait = None
+                if self.delayed:
+                    if (wait := self.delayed[0][0] - time.time()) <= 0:
+                        _, _, url, future_nzo = heapq.heappop(self.delayed)
+                        return url, future_nzo
+                self.condition.wait(wait)
+        return None
 
     def run(self):
         # Read all URL's to grab from the queue
-        for url_nzo_tup in sabnzbd.NzbQueue.get_urls():
-            self.queue.put(url_nzo_tup)
+        for url, future_nzo in sabnzbd.NzbQueue.get_urls():
+            self.add(url, future_nzo)
 
         # Start fetching
-        while not self.shutdown:
-            # Set NzbObject object to None so reference from this thread
-            # does not keep the object alive in the future (see #1628)
-            future_nzo = None
-            url, future_nzo = self.queue.get()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=URLGRABBER_THREADS, thread_name_prefix="URLGrabber"
+        )
+        try:
+            while url_nzo := self.next_due():
+                url, future_nzo = url_nzo
+                if future_nzo:
+                    # Wait longer when the retry time was changed in the meantime
+                    if future_nzo.url_wait and future_nzo.url_wait > time.time():
+                        self.schedule(url, future_nzo, future_nzo.url_wait)
+                        continue
+                    # Paused
+                    if future_nzo.status == Status.PAUSED:
+                        self.schedule(url, future_nzo, time.time() + URLGRABBER_PAUSED_WAIT)
+                        continue
 
-            if not url:
-                # stop signal, go test self.shutdown
-                continue
+                # Limit the number of requests to the same host
+                host = urllib.parse.urlparse(url).hostname or ""
+                with self.condition:
+                    if self.host_active.get(host, 0) >= URLGRABBER_HOST_LIMIT:
+                        self.host_waiting.setdefault(host, collections.deque()).append((url, future_nzo))
+                        continue
+                    self.host_active[host] = self.host_active.get(host, 0) + 1
+                executor.submit(self.grab_host, host, url, future_nzo)
 
-            if future_nzo:
-                # Re-queue when too early and still active
-                if future_nzo.url_wait and future_nzo.url_wait > time.time():
-                    self.add(url, future_nzo)
-                    time.sleep(1.0)
-                    continue
-                # Paused
-                if future_nzo.status == Status.PAUSED:
-                    self.add(url, future_nzo)
-                    time.sleep(1.0)
+                # Set NzbObject object to None so reference from this thread
+                # does not keep the object alive in the future (see #1628)
+                url_nzo = future_nzo = None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def grab_host(self, host: str, url: str, future_nzo: NzbObject):
+        """Grab the URL and then the URLs of the same host that are waiting"""
+        while not self.shutdown:
+            self.grab(url, future_nzo)
+            with self.condition:
+                if waiting := self.host_waiting.get(host):
+                    url, future_nzo = waiting.popleft()
                     continue
+                self.host_waiting.pop(host, None)
+                self.host_active[host] -= 1
+                if not self.host_active[host]:
+                    del self.host_active[host]
+                return
 
-            url = url.replace(" ", "")
+    def grab(self, url: str, future_nzo: NzbObject):
+        url = url.replace(" ", "")
 
+        try:
+            if future_nzo:
+                # If nzo entry deleted, give up
+                try:
+                    deleted = future_nzo.removed_from_queue
+                except AttributeError:
+                    deleted = True
+                if deleted:
+                    logging.debug("Dropping URL %s, job entry missing", url)
+                    return
+
+            filename = None
+            gzipped = False
+            nzo_info = future_nzo.nzo_info
+            wait = 0
+            retry = True
+            fetch_request = None
+
+            logging.info("Grabbing URL %s", url)
             try:
-                if future_nzo:
-                    # If nzo entry deleted, give up
+                fetch_request = _build_request(url)
+            except (urllib.error.HTTPError, Exception) as e:
+                # Cannot list exceptions here, because of unpredictability over platforms
+                error0 = str(sys.exc_info()[0]).lower()
+                error1 = str(sys.exc_info()[1]).lower()
+                logging.debug('Error "%s" trying to get the url %s', error1, url)
+                if "certificate_verify_failed" in error1 or "certificateerror" in error0:
+                    msg = T("Server %s uses an untrusted HTTPS certificate") % ""
+                    msg += " - https://sabnzbd.org/certificate-errors"
+                    retry = False
+                elif "nodename nor servname provided" in error1:
+                    msg = T("Server name does not resolve")
+                    retry = False
+                elif "401" in error1 or "unauthorized" in error1:
+                    msg = T("Unauthorized access")
+                    retry = False
+                elif "404" in error1:
+                    msg = T("File not on server")
+                    retry = False
+                elif hasattr(e, "headers") and "retry-after" in e.headers:
+                    # Catch if the server send retry (e.headers is case-INsensitive)
+                    wait = misc.int_conv(e.headers["retry-after"])
+
+            if fetch_request:
+                for hdr in fetch_request.headers:
                     try:
-                        deleted = future_nzo.removed_from_queue
-                    except AttributeError:
-                        deleted = True
-                    if deleted:
-                        logging.debug("Dropping URL %s, job entry missing", url)
+                        item = hdr.lower()
+                        value = fetch_request.headers[hdr]
+                    except Exception:
                         continue
 
-                filename = None
-                gzipped = False
-                nzo_info = future_nzo.nzo_info
-                wait = 0
-                retry = True
-                fetch_request = None
-
-                logging.info("Grabbing URL %s", url)
-                try:
-                    fetch_request = _build_request(url)
-                except (urllib.error.HTTPError, Exception) as e:
-                    # Cannot list exceptions here, because of unpredictability over platforms
-                    error0 = str(sys.exc_info()[0]).lower()
-                    error1 = str(sys.exc_info()[1]).lower()
-                    logging.debug('Error "%s" trying to get the url %s', error1, url)
-                    if "certificate_verify_failed" in error1 or "certificateerror" in error0:
-                        msg = T("Server %s uses an untrusted HTTPS certificate") % ""
-                        msg += " - https://sabnzbd.org/certificate-errors"
-                        retry = False
-                    elif "nodename nor servname provided" in error1:
-                        msg = T("Server name does not resolve")
-                        retry = False
-                    elif "401" in error1 or "unauthorized" in error1:
-                        msg = T("Unauthorized access")
-                        retry = False
-                    elif "404" in error1:
-                        msg = T("File not on server")
-                        retry = False
-                    elif hasattr(e, "headers") and "retry-after" in e.headers:
-                        # Catch if the server send retry (e.headers is case-INsensitive)
-                        wait = misc.int_conv(e.headers["retry-after"])
-
-                if fetch_request:
-                    for hdr in fetch_request.headers:
-                        try:
-                            item = hdr.lower()
-                            value = fetch_request.headers[hdr]
-                        except Exception:
-                            continue
-
-                        # Skip empty values
-                        if not value:
-                            continue
-
-                        if item == "content-encoding" and "gzip" in value:
-                            gzipped = True
-                        elif item in ("category_id", "x-dnzb-category"):
-                            # Use indexer category in case no specific one was set
-                            if value and future_nzo.cat in (None, "*"):
-                                if indexer_cat := misc.cat_convert(value):
-                                    future_nzo.cat = indexer_cat
-                        elif item == "x-dnzb-moreinfo":
-                            nzo_info["more_info"] = value
-                        elif item == "x-dnzb-name":
-                            filename = value
-                            if not filename.endswith(".nzb"):
-                                filename += ".nzb"
-                        elif item == "x-dnzb-propername":
-                            nzo_info["propername"] = value
-                        elif item == "x-dnzb-episodename":
-                            nzo_info["episodename"] = value
-                        elif item == "x-dnzb-year":
-                            nzo_info["year"] = value
-                        elif item == "x-dnzb-failure":
-                            nzo_info["failure"] = value
-                        elif item == "x-dnzb-details":
-                            nzo_info["details"] = value
-                        elif item == "x-dnzb-password":
-                            nzo_info["password"] = value
-                        elif item == "retry-after":
-                            wait = misc.int_conv(value)
-                        elif item == "content-disposition":
-                            # Get filename from Content-Disposition header
-                            if not filename and "filename" in value:
-                                filename = filename_from_content_disposition(value)
-
-                if wait:
-                    # For sites that have a rate-limiting attribute
-                    msg = ""
-                    retry = True
-                    fetch_request = None
-                elif retry:
-                    fetch_request, msg, retry, wait, data = _analyse(fetch_request, future_nzo)
-
-                if not fetch_request:
-                    if retry:
-                        logging.info("Retry URL %s", url)
-                        self.add(url, future_nzo, wait)
-                    else:
-                        self.fail_to_history(future_nzo, url, msg)
-                    continue
-
-                if not filename:
-                    filename = os.path.basename(urllib.parse.unquote(url))
-
-                    # URL was redirected, maybe the redirect has better filename?
-                    # Check if the original URL has extension
-                    if (
-                        url != fetch_request.geturl()
-                        and sabnzbd.filesystem.get_ext(filename) not in VALID_NZB_FILES + VALID_ARCHIVES
-                    ):
-                        filename = os.path.basename(urllib.parse.unquote(fetch_request.geturl()))
-                elif "&nzbname=" in filename:
-                    # Sometimes the filename contains the full URL, duh!
-                    filename = filename[filename.find("&nzbname=") + 9 :]
-
-                # process data
-                if not data:
-                    try:
-                        data = fetch_request.read()
-                    except (IncompleteRead, IOError):
-                        self.fail_to_history(future_nzo, url, T("Server could not complete request"))
-                        fetch_request.close()
+                    # Skip empty values
+                    if not value:
                         continue
-                fetch_request.close()
-
-                if gzipped:
-                    try:
-                        data = gzip.decompress(data)
-                    except Exception as e:
-                        logging.info("Unable to decompress response: %s", e)
 
-                if b"<nzb" in data and sabnzbd.filesystem.get_ext(filename) != ".nzb":
-                    filename += ".nzb"
+                    if item == "content-encoding" and "gzip" in value:
+                        gzipped = True
+                    elif item in ("category_id", "x-dnzb-category"):
+                        # Use indexer category in case no specific one was set
+                        if value and future_nzo.cat in (None, "*"):
+                            if indexer_cat := misc.cat_convert(value):
+                                future_nzo.cat = indexer_cat
+                    elif item == "x-dnzb-moreinfo":
+                        nzo_info["more_info"] = value
+                    elif item == "x-dnzb-name":
+                        filename = value
+                        if not filename.endswith(".nzb"):
+                            filename += ".nzb"
+                    elif item == "x-dnzb-propername":
+                        nzo_info["propername"] = value
+                    elif item == "x-dnzb-episodename":
+                        nzo_info["episodename"] = value
+                    elif item == "x-dnzb-year":
+                        nzo_info["year"] = value
+                    elif item == "x-dnzb-failure":
+                        nzo_info["failure"] = value
+                    elif item == "x-dnzb-details":
+                        nzo_info["details"] = value
+                    elif item == "x-dnzb-password":
+                        nzo_info["password"] = value
+                    elif item == "retry-after":
+                        wait = misc.int_conv(value)
+                    elif item == "content-disposition":
+                        # Get filename from Content-Disposition header
+                        if not filename and "filename" in value:
+                            filename = filename_from_content_disposition(value)
+
+            if wait:
+                # For sites that have a rate-limiting attribute
+                msg = ""
+                retry = True
+                fetch_request = None
+            elif retry:
+                fetch_request, msg, retry, wait, data = _analyse(fetch_request, future_nzo)
 
-                # Sanitize filename first (also removing forbidden Windows-names)
-                filename = sabnzbd.filesystem.sanitize_filename(filename)
+            if not fetch_request:
+                if retry:
+                    logging.info("Retry URL %s", url)
+                    self.add(url, future_nzo, wait)
+                else:
+                    self.fail_to_history(future_nzo, url, msg)
+                return
 
-                # If no filename, make one
-                if not filename:
-                    filename = sabnzbd.filesystem.get_new_id(
-                        "url", os.path.join(cfg.admin_dir.get_path(), FUTURE_Q_FOLDER)
+            if not filename:
+                filename = os.path.basename(urllib.parse.unquote(url))
+
+                # URL was redirected, maybe the redirect has better filename?
+                # Check if the original URL has extension
+                if (
+                    url != fetch_request.geturl()
+                    and sabnzbd.filesystem.get_ext(filename) not in VALID_NZB_FILES + VALID_ARCHIVES
+                ):
+                    filename = os.path.basename(urllib.parse.unquote(fetch_request.geturl()))
+            elif "&nzbname=" in filename:
+                # Sometimes the filename contains the full URL, duh!
+                filename = filename[filename.find("&nzbname=") + 9 :]
+
+            # process data
+            if not data:
+                try:
+                    data = fetch_request.read()
+                except (IncompleteRead, IOError):
+                    self.fail_to_history(future_nzo, url, T("Server could not complete request"))
+                    fetch_request.close()
+                    return
+            fetch_request.close()
+
+            if gzipped:
+                try:
+                    data = gzip.decompress(data)
+                except Exception as e:
+                    logging.info("Unable to decompress response: %s", e)
+
+            if b"<nzb" in data and sabnzbd.filesystem.get_ext(filename) != ".nzb":
+                filename += ".nzb"
+
+            # Sanitize filename first (also removing forbidden Windows-names)
+            filename = sabnzbd.filesystem.sanitize_filename(filename)
+
+            # If no filename, make one
+            if not filename:
+                filename = sabnzbd.filesystem.get_new_id("url", os.path.join(cfg.admin_dir.get_path(), FUTURE_Q_FOLDER))
+
+            # Check if nzb file
+            if sabnzbd.filesystem.get_ext(filename) in VALID_ARCHIVES + VALID_NZB_FILES:
+                # If the user resumed a duplicate detected URL, skip the check
+                dup_check = future_nzo.duplicate != DuplicateStatus.DUPLICATE_IGNORED
+
+                # Locked, so that changes to the future_nzo are picked up by the new nzo
+                # and URLs grabbed at the same time with the same filename don't use the same file
+                with NZBQUEUE_LOCK:
+                    # Write data to temp file
+                    path = os.path.join(cfg.admin_dir.get_path(), FUTURE_Q_FOLDER, filename)
+                    with open(path, "wb") as temp_nzb:
+                        temp_nzb.write(data)
+
+                    # Add the new job to the queue
+                    res, _ = sabnzbd.nzbparser.add_nzbfile(
+                        path,
+                        pp=future_nzo.pp,
+                        script=future_nzo.script,
+                        cat=future_nzo.cat,
+                        priority=future_nzo.priority,
+                        nzbname=future_nzo.custom_name,
+                        nzo_info=nzo_info,
+                        url=future_nzo.url,
+                        keep=False,
+                        password=future_nzo.password,
+                        nzo_id=future_nzo.nzo_id,
+                        dup_check=dup_check,
                     )
 
-                # Write data to temp file
-                path = os.path.join(cfg.admin_dir.get_path(), FUTURE_Q_FOLDER, filename)
-                with open(path, "wb") as temp_nzb:
-                    temp_nzb.write(data)
-
-                # Check if nzb file
-                if sabnzbd.filesystem.get_ext(filename) in VALID_ARCHIVES + VALID_NZB_FILES:
-                    # If the user resumed a duplicate detected URL, skip the check
-                    dup_check = future_nzo.duplicate != DuplicateStatus.DUPLICATE_IGNORED
-
-                    # Locked, so that changes to the future_nzo are picked up by the new nzo
-                    with NZBQUEUE_LOCK:
-                        # Add the new job to the queue
-                        res, _ = sabnzbd.nzbparser.add_nzbfile(
-                            path,
-                            pp=future_nzo.pp,
-                            script=future_nzo.script,
-                            cat=future_nzo.cat,
-                            priority=future_nzo.priority,
-                            nzbname=future_nzo.custom_name,
-                            nzo_info=nzo_info,
-                            url=future_nzo.url,
-                            keep=False,
-                            password=future_nzo.password,
-                            nzo_id=future_nzo.nzo_id,
-                            dup_check=dup_check,
-                        )
-
-                    if res is AddNzbFileResult.RETRY:
-                        logging.info("Incomplete NZB, retry after 5 min %s", url)
-                        self.add(url, future_nzo, when=300)
-                    elif res is AddNzbFileResult.ERROR:
-                        # Error already thrown
-                        self.fail_to_history(future_nzo, url)
-                    elif res is AddNzbFileResult.PREQUEUE_REJECTED:
-                        # Pre-queue script rejected the NZB - silently discard (normal behavior)
-                        logging.info("Pre-queue script rejected NZB from %s", url)
-                    elif res is AddNzbFileResult.NO_FILES_FOUND:
-                        # No NZB-files inside archive
-                        self.fail_to_history(future_nzo, url, T("Empty NZB file %s") % filename)
-                else:
-                    logging.info("Unknown filetype when fetching NZB, retry after 30s %s", url)
-                    self.add(url, future_nzo, 30)
-
-                # Always clean up what we wrote to disk
+                    # Always clean up what we wrote to disk
+                    try:
+                        sabnzbd.filesystem.remove_file(path)
+                    except Exception:
+                        pass
+
+                if res is AddNzbFileResult.RETRY:
+                    logging.info("Incomplete NZB, retry after 5 min %s", url)
+                    self.add(url, future_nzo, when=300)
+                elif res is AddNzbFileResult.ERROR:
+                    # Error already thrown
+                    self.fail_to_history(future_nzo, url)
+                elif res is AddNzbFileResult.PREQUEUE_REJECTED:
+                    # Pre-queue script rejected the NZB - silently discard (normal behavior)
+                    logging.info("Pre-queue script rejected NZB from %s", url)
+                elif res is AddNzbFileResult.NO_FILES_FOUND:
+                    # No NZB-files inside archive
+                    self.fail_to_history(future_nzo, url, T("Empty NZB file %s") % filename)
+            else:
+                logging.info("Unknown filetype when fetching NZB, retry after 30s %s", url)
+                self.add(url, future_nzo, 30)
+
+                # Clean up the file created when making a filename
                 try:
-                    sabnzbd.filesystem.remove_file(path)
+                    sabnzbd.filesystem.remove_file(os.path.join(cfg.admin_dir.get_path(), FUTURE_Q_FOLDER, filename))
                 except Exception:
                     pass
-            except Exception:
-                logging.error(T("URLGRABBER CRASHED"), exc_info=True)
-                logging.debug("URLGRABBER Traceback: ", exc_info=True)
+        except Exception:
+            logging.error(T("URLGRABBER CRASHED"), exc_info=True)
+            logging.debug("URLGRABBER Traceback: ", exc_info=True)
 
     @staticmethod
     def fail_to_history(nzo: NzbObject, url: str, msg="", content=False):
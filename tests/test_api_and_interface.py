@@ -19,6 +19,8 @@
 tests.test_api - Tests for API functions
 """
 
+import json
+
 import cherrypy
 import pytest
 
@@ -47,6 +49,169 @@ class TestApiInternals:
         assert "apikey" in str(api.api_handler({"mode": "auth"}))
 
 
+class TestSentSlots:
+    @staticmethod
+    def slot(nzo_id: str, **kwargs) -> dict:
+        return {"nzo_id": nzo_id, "status": Status.QUEUED, **kwargs}
+
+    def test_only_built_when_state_changed(self):
+        sent_slots = api.SentSlots()
+        build_slots = mock.Mock(return_value=[self.slot("a"), self.slot("b")])
+
+        version, slots = sent_slots.get("params", 1, build_slots)
+        assert slots == [self.slot("a"), self.slot("b")]
+        assert sent_slots.get("params", 1, build_slots) == (version, slots)
+        assert build_slots.call_count == 1
+
+        # Rebuilt, but the same slots keep the same version
+        assert sent_slots.get("params", 2, build_slots) == (version, slots)
+        assert build_slots.call_count == 2
+
+        # Different parameters are separate
+        sent_slots.get("other", 1, build_slots)
+        assert build_slots.call_count == 3
+
+    def test_changes(self):
+        sent_slots = api.SentSlots()
+        first = sent_slots.add("params", [self.slot("a"), self.slot("b"), self.slot("c")])
+        second = sent_slots.add("params", [self.slot("a"), self.slot("c", status=Status.PAUSED), self.slot("d")])
+        assert second > first
+
+        second_slots = [self.slot("a"), self.slot("c", status=Status.PAUSED), self.slot("d")]
+        assert sent_slots.changes("params", first, second, second_slots) == (
+            [self.slot("c", status=Status.PAUSED), self.slot("d")],
+            ["b"],
+        )
+        assert sent_slots.changes("params", second, second, second_slots) == ([], [])
+
+        # Unknown version or different parameters
+        assert sent_slots.changes("params", second + 1, second, second_slots) is None
+        assert sent_slots.changes("other", first, second, second_slots) is None
+
+    def test_forget_old_versions(self):
+        sent_slots = api.SentSlots()
+        first = sent_slots.add("params", [self.slot("a")])
+        for number in range(api.API_SENT_SLOTS):
+            last = sent_slots.add("params", [self.slot("a", index=number)])
+        assert sent_slots.changes("params", first, last, [self.slot("a")]) is None
+        assert len(sent_slots.sent) == api.API_SENT_SLOTS
+
+    def test_add_slot_changes(self):
+        sent_slots = api.SentSlots()
+        first = sent_slots.add("params", [self.slot("a"), self.slot("b")])
+        info = {"slots": [self.slot("b")], "slots_version": sent_slots.add("params", [self.slot("b")])}
+
+        api.add_slot_changes(info, sent_slots, "params", first)
+        assert info["slots"] == []
+        assert info["removed"] == ["a"]
+        assert info["delta"]
+
+        # Everything is sent if the client has an unknown version
+        info = {"slots": [self.slot("b")], "slots_version": first}
+        api.add_slot_changes(info, sent_slots, "params", 12345)
+        assert info["slots"] == [self.slot("b")]
+        assert not info["delta"]
+
+    def test_add_streamed_slots(self):
+        sent_slots = api.SentSlots()
+        first = sent_slots.add("params", [self.slot("a"), self.slot("b"), self.slot("c")])
+
+        info = {}
+        slots = iter([self.slot("a"), self.slot("c", status=Status.PAUSED), self.slot("d")])
+        api.add_streamed_slots(info, sent_slots, "params", slots, first)
+        assert info["delta"]
+        # Nothing is remembered until the slots are sent
+        assert sent_slots.version == first
+
+        info = api.build_values(info)
+        assert info["slots"] == [self.slot("c", status=Status.PAUSED), self.slot("d")]
+        assert info["slots_version"] > first
+        assert info["removed"] == ["b"]
+
+        # The streamed slots are remembered just like the added ones
+        assert sent_slots.add("params", [self.slot("a"), self.slot("c", status=Status.PAUSED), self.slot("d")]) == (
+            info["slots_version"]
+        )
+
+        # Everything is sent if the client has an unknown version
+        info = {}
+        api.add_streamed_slots(info, sent_slots, "params", iter([self.slot("a")]), 12345)
+        info = api.build_values(info)
+        assert info["slots"] == [self.slot("a")]
+        assert info["removed"] == []
+        assert not info["delta"]
+
+    def test_not_modified(self):
+        cherrypy.request.params = {"mode": "queue"}
+        cherrypy.request.headers.pop("If-None-Match", None)
+        cherrypy.response.status = 200
+        assert not api.not_modified(1, "state")
+        etag = cherrypy.response.headers["ETag"]
+
+        cherrypy.request.headers["If-None-Match"] = '"other", %s' % etag
+        assert api.not_modified(1, "state")
+        assert cherrypy.response.status == 304
+
+        # Different state or request
+        cherrypy.response.status = 200
+        assert not api.not_modified(2, "state")
+        cherrypy.request.params = {"mode": "queue", "output": "xml"}
+        assert not api.not_modified(1, "state")
+        cherrypy.request.headers.pop("If-None-Match")
+
+
+class TestReport:
+    data = {
+        "noofslots": 3,
+        "paused": False,
+        "slots": [{"nzo_id": "a", "name": '<a> & "b"'}, {"nzo_id": "b", "files": ["1", "2"]}, {"nzo_id": "c"}],
+        "categories": ["*", "tv"],
+        "empty": [],
+    }
+
+    @pytest.mark.parametrize("output", ["json", "xml"])
+    @pytest.mark.parametrize("keyword", ["queue", ""])
+    def test_stream_same_output(self, output, keyword):
+        cherrypy.request.params = {"mode": "queue", "output": output}
+        cherrypy.response.stream = False
+        expected = api.report(keyword=keyword, data=self.data)
+        assert not cherrypy.response.stream
+
+        with mock.patch.object(api, "API_STREAM_CHUNK_SIZE", 10):
+            chunks = list(api.report(keyword=keyword, data=self.data, stream=True))
+        assert cherrypy.response.stream
+        assert len(chunks) > 1
+        if output == "json":
+            assert json.loads(b"".join(chunks)) == json.loads(expected)
+        else:
+            assert b"".join(chunks).decode() == expected
+
+    @pytest.mark.parametrize("output", ["json", "xml"])
+    def test_stream_lazy_values(self, output):
+        cherrypy.request.params = {"mode": "history", "output": output}
+        expected = api.report(keyword="history", data=self.data)
+
+        def lazy_data() -> dict:
+            sent = []
+            data = dict(self.data)
+            data["slots"] = (sent.append(slot) or slot for slot in self.data["slots"])
+            # Only known after all slots were made
+            data["categories"] = lambda: self.data["categories"] if len(sent) == 3 else None
+            return data
+
+        assert api.report(keyword="history", data=lazy_data()) == expected
+        chunks = b"".join(api.report(keyword="history", data=lazy_data(), stream=True))
+        if output == "json":
+            assert json.loads(chunks) == json.loads(expected)
+        else:
+            assert chunks.decode() == expected
+
+    def test_stream_errors(self):
+        cherrypy.request.params = {"mode": "queue"}
+        assert api.report(api._MSG_NO_VALUE, stream=True) == api.report(api._MSG_NO_VALUE)
+        assert api.report(stream=True) == api.report()
+
+
 def set_remote_host_or_ip(hostname: str = "localhost", remote_ip: str = "127.0.0.1"):
     """Change CherryPy's "Host" and "remote.ip"-values"""
     cherrypy.request.headers["Host"] = hostname
@@ -261,6 +426,31 @@ class TestHistory:
             history_keys.sort()
             assert pp_keys == history_keys
 
+    def test_build_history_reads_jobs_while_iterating(self, tmp_path):
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(str(tmp_path / "history.db")) as fake_history:
+            fake_history.add_fake_history_jobs(5)
+            history_jobs = fake_history.fetch_history()[0]
+
+            # One job in post-processing that was already added to the history
+            finished_nzo = mock.Mock(nzo_id=history_jobs[0]["nzo_id"])
+            active_nzo = mock.Mock(nzo_id="SABnzbd_nzo_active", download_path=str(tmp_path), unpack_info={})
+            active_nzo.repair, active_nzo.unpack, active_nzo.delete = pp_to_opts(choice(list(PP_LOOKUP.keys())))
+            post_processor = mock.Mock()
+            post_processor.get_queue.return_value = [active_nzo, finished_nzo]
+
+            with mock.patch.object(sabnzbd, "PostProcessor", post_processor, create=True), mock.patch.object(
+                sabnzbd, "get_db_connection", return_value=fake_history
+            ):
+                items, postproc_queue_size, total_items, next_page = api.build_history(limit=4)
+                assert (postproc_queue_size, total_items) == (2, 7)
+                assert next(items)["nzo_id"] == active_nzo.nzo_id
+                assert [item["nzo_id"] for item in items] == [job["nzo_id"] for job in history_jobs[:2]]
+                assert next_page() == fake_history.next_page is not None
+        db.HistoryDB.startup_done = False
+        db.HistoryDB.db_path = None
+        db.close_pooled_connections()
+
     @pytest.mark.usefixtures("run_sabnzbd")
     def test_add_active_history_duplicate(self):
         """Verify that add_active_history does not add duplicate entries"""
@@ -26,6 +26,7 @@ from sabnzbd.assembler import Assembler
 from sabnzbd.constants import GIGI
 from sabnzbd.filesystem import Diskspace
 from sabnzbd.nzb import Article, NzbFile, NzbObject
+from sabnzbd.par2file import parse_par2_file
 from tests.testhelper import *
 
 
@@ -316,6 +317,37 @@ class TestAssembler:
         assert assembler.call_count == 3
         self._assert_expected_content(self.nzf, expected)
 
+    def test_assemble_par2_parsed_while_writing(self, assembler):
+        """Par2 packets are parsed from the written data, out of order writes included"""
+        par2_file = os.path.join(SAB_DATA_DIR, "unicode_rar", "我喜欢编程.vol000+02.par2")
+        with open(par2_file, "rb") as f:
+            par2_data = f.read()
+        data, expected = self._make_request(
+            self.nzf,
+            [
+                self._make_article(self.nzf, offset=0, data=bytearray(par2_data[:30000])),
+                self._make_article(self.nzf, offset=30000, data=bytearray(par2_data[30000:60000]), decoded=False),
+                self._make_article(self.nzf, offset=60000, data=bytearray(par2_data[60000:])),
+            ],
+        )
+        Assembler.assemble(self.nzo, self.nzf, file_done=False, allow_non_contiguous=True, direct_write=True)
+        assert self.nzf.par2_parser.offset == 30000
+        self.nzf.decodetable[1].decoded = True
+        Assembler.assemble(self.nzo, self.nzf, file_done=True, allow_non_contiguous=False, direct_write=True)
+        self._assert_expected_content(self.nzf, expected)
+        assert self.nzf.par2_parser.parsed_file(self.nzf.filepath)
+        assert self.nzf.par2_parser.get_table({}) == parse_par2_file(par2_file, {})
+
+    def test_assemble_no_par2_parser(self, assembler):
+        """Other files don't get a par2 parser"""
+        data, expected = self._make_request(
+            self.nzf,
+            [self._make_article(self.nzf, offset=0, data=bytearray(b"hello"))],
+        )
+        Assembler.assemble(self.nzo, self.nzf, file_done=True, allow_non_contiguous=False, direct_write=True)
+        self._assert_expected_content(self.nzf, expected)
+        assert self.nzf.par2_parser is None
+
 
 class TestDiskspaceCheck:
     """Tests for Assembler.diskspace_check"""
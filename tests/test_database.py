@@ -0,0 +1,473 @@
+#!/usr/bin/python3 -OO
+# Copyright 2007-2026 by The SABnzbd-Team (sabnzbd.org)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+tests.test_database - Testing functions in database.py
+"""
+
+import shutil
+import threading
+
+from tests.testhelper import *
+
+
+@pytest.fixture
+def history_db(tmp_path):
+    """Fresh history database, so the startup and migrations are performed"""
+    db.HistoryDB.startup_done = False
+    with FakeHistoryDB(str(tmp_path / "history.db")) as history_db:
+        yield history_db
+    db.HistoryDB.startup_done = False
+    db.HistoryDB.db_path = None
+    db.close_pooled_connections()
+
+
+def job_names(history_db: db.HistoryDB, search: str) -> list[str]:
+    return sorted(job["name"] for job in history_db.fetch_history(search=search)[0])
+
+
+def make_job(history_db: db.HistoryDB, name: str, status: str = Status.COMPLETED):
+    history_db.add_fake_history_jobs(1)
+    history_db.execute(
+        """UPDATE history SET name = ?, status = ?, archive = NULL WHERE id = (SELECT max(id) FROM history)""",
+        (name, status),
+    )
+
+
+@pytest.mark.skipif(not db.search_index_supported(), reason="SQLite without FTS5 trigram support")
+class TestHistorySearchIndex:
+    def test_search(self, history_db):
+        assert db.HistoryDB.search_index
+        make_job(history_db, "Ubuntu.24.04.Desktop")
+        make_job(history_db, "Debian.12.Netinst")
+        make_job(history_db, "ubuntu server")
+
+        assert job_names(history_db, "ubuntu") == ["Ubuntu.24.04.Desktop", "ubuntu server"]
+        assert job_names(history_db, "UBUNTU*Desk") == ["Ubuntu.24.04.Desktop"]
+        assert job_names(history_db, "^deb") == ["Debian.12.Netinst"]
+        assert job_names(history_db, "server$") == ["ubuntu server"]
+        assert job_names(history_db, "12") == ["Debian.12.Netinst"]
+        assert job_names(history_db, "fedora") == []
+        assert len(job_names(history_db, "")) == 3
+
+        # Count is also based on the search
+        assert history_db.fetch_history(search="ubuntu", limit=1)[1] == 2
+
+    def test_index_kept_in_sync(self, history_db):
+        make_job(history_db, "Ubuntu.24.04.Desktop")
+        make_job(history_db, "Ubuntu.22.04.Failed", status=Status.FAILED)
+        make_job(history_db, "Debian.12.Netinst")
+
+        # Renamed job
+        history_db.execute("""UPDATE history SET name = ? WHERE name = ?""", ("Fedora.40", "Debian.12.Netinst"))
+        assert job_names(history_db, "debian") == []
+        assert job_names(history_db, "fedora") == ["Fedora.40"]
+
+        # Removed job
+        history_db.remove_with_status(Status.FAILED, "ubuntu")
+        assert job_names(history_db, "ubuntu") == ["Ubuntu.24.04.Desktop"]
+
+        # Archived job
+        nzo_id = history_db.fetch_history(search="ubuntu")[0][0]["nzo_id"]
+        history_db.archive(nzo_id)
+        assert job_names(history_db, "ubuntu") == []
+        assert [job["name"] for job in history_db.fetch_history(search="ubuntu", archive=True)[0]] == [
+            "Ubuntu.24.04.Desktop"
+        ]
+
+        # The index matches the table
+        history_db.execute("""INSERT INTO history_fts(history_fts, rank) VALUES ('integrity-check', 1)""")
+
+    def test_migration(self, tmp_path):
+        # Create a database in the previous format, without the index
+        db_path = str(tmp_path / "history.db")
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(db_path) as history_db:
+            history_db.add_fake_history_jobs(5)
+            history_db.execute("DROP TABLE history_fts")
+            for trigger in ("insert", "delete", "update"):
+                history_db.execute("DROP TRIGGER history_fts_%s" % trigger)
+            history_db.execute("PRAGMA user_version = 6;")
+            make_job(history_db, "Before.Migration")
+
+        # On the next start the index is created and filled
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(db_path) as history_db:
+            assert db.HistoryDB.search_index
+            history_db.execute("PRAGMA user_version;")
+            assert history_db.cursor.fetchone()["user_version"] == 10
+            assert job_names(history_db, "before") == ["Before.Migration"]
+            assert history_db.fetch_history()[1] == 6
+        db.HistoryDB.startup_done = False
+        db.HistoryDB.db_path = None
+
+    def test_created_after_sqlite_upgrade(self, tmp_path):
+        # Database that was migrated while the SQLite version didn't support the index
+        db_path = str(tmp_path / "history.db")
+        db.HistoryDB.startup_done = False
+        with mock.patch("sabnzbd.database.search_index_supported", return_value=False):
+            with FakeHistoryDB(db_path) as history_db:
+                assert not db.HistoryDB.search_index
+                history_db.add_fake_history_jobs(5)
+                make_job(history_db, "Before.Upgrade")
+
+        # With a SQLite version that supports it, the index is created on the next start
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(db_path) as history_db:
+            assert db.HistoryDB.search_index
+            assert job_names(history_db, "before") == ["Before.Upgrade"]
+            assert history_db.fetch_history(search="before")[1] == 1
+            history_db.execute("""INSERT INTO history_fts(history_fts, rank) VALUES ('integrity-check', 1)""")
+        db.HistoryDB.startup_done = False
+        db.HistoryDB.db_path = None
+
+    def test_without_index(self, history_db):
+        make_job(history_db, "Ubuntu.24.04.Desktop")
+        make_job(history_db, "Debian.12.Netinst")
+        with mock.patch.object(db.HistoryDB, "search_index", False):
+            assert job_names(history_db, "ubuntu") == ["Ubuntu.24.04.Desktop"]
+            assert history_db.search_condition("ubuntu") == ("name LIKE ?", ["%ubuntu%"])
+
+
+class TestHistoryPages:
+    def test_pages_with_cursor(self, history_db):
+        history_db.add_fake_history_jobs(25)
+        # Make sure there are jobs completed at the same time
+        history_db.execute("""UPDATE history SET completed = 1000, archive = NULL WHERE id % 3 = 0""")
+        all_jobs, total_items = history_db.fetch_history()
+        assert total_items == 25
+
+        # Pages using the cursor are the same as using the offset
+        jobs = []
+        after = None
+        for page in range(5):
+            page_jobs, total_items = history_db.fetch_history(start=0, limit=6, after=after)
+            assert total_items == 25
+            assert page_jobs == history_db.fetch_history(start=page * 6, limit=6)[0]
+            jobs.extend(page_jobs)
+            after = history_db.next_page
+            if not after:
+                break
+        assert page == 4
+        assert jobs == all_jobs
+
+    def test_cursor_with_filters(self, history_db):
+        history_db.add_fake_history_jobs(20)
+        history_db.execute("""UPDATE history SET status = ? WHERE id % 2 = 0""", (Status.FAILED,))
+        failed_jobs = history_db.fetch_history(statuses=[Status.FAILED])[0]
+        first_page = history_db.fetch_history(limit=4, statuses=[Status.FAILED])[0]
+        second_page = history_db.fetch_history(limit=4, statuses=[Status.FAILED], after=history_db.next_page)[0]
+        assert first_page + second_page == failed_jobs[:8]
+
+    @pytest.mark.parametrize("after", ["", "invalid", "1_", "_1", None])
+    def test_invalid_cursor(self, history_db, after):
+        history_db.add_fake_history_jobs(3)
+        assert history_db.fetch_history(after=after) == history_db.fetch_history()
+
+    def test_iter_history(self, history_db):
+        history_db.add_fake_history_jobs(10)
+        all_jobs = history_db.fetch_history(limit=6)[0]
+        next_page = history_db.next_page
+
+        jobs, total_items = history_db.iter_history(limit=6)
+        assert total_items == 10
+        assert history_db.next_page is None
+        assert next(jobs) == all_jobs[0]
+
+        # Other commands can be used while reading the jobs
+        assert history_db.in_history([all_jobs[0]["nzo_id"], "SABnzbd_nzo_unknown"]) == {all_jobs[0]["nzo_id"]}
+        assert [all_jobs[0]] + list(jobs) == all_jobs
+        assert history_db.next_page == next_page
+
+    def test_lean(self, history_db):
+        history_db.add_fake_history_jobs(3)
+        jobs = history_db.fetch_history()[0]
+        lean_jobs = history_db.fetch_history(lean=True)[0]
+        assert [job["nzo_id"] for job in jobs] == [job["nzo_id"] for job in lean_jobs]
+        assert all(job["stage_log"] for job in jobs)
+        for job, lean_job in zip(jobs, lean_jobs):
+            assert lean_job["stage_log"] == []
+            assert lean_job.keys() == job.keys()
+            assert "script_log" not in job
+
+
+class TestHistoryConnections:
+    def test_wal_mode(self, history_db):
+        history_db.execute("PRAGMA journal_mode;")
+        assert history_db.cursor.fetchone()[0] == "wal"
+
+    def test_connection_reused(self, history_db):
+        with db.HistoryDB() as first_db:
+            connection = first_db.connection
+        assert (history_db.generation, connection) in db.CONNECTION_POOL
+        with db.HistoryDB() as second_db:
+            assert second_db.connection is connection
+            assert (history_db.generation, connection) not in db.CONNECTION_POOL
+
+    def test_pool_limit(self, history_db):
+        history_dbs = [db.HistoryDB() for _ in range(db.MAX_POOLED_CONNECTIONS + 2)]
+        for other_db in history_dbs:
+            other_db.close()
+        assert len(db.CONNECTION_POOL) == db.MAX_POOLED_CONNECTIONS
+
+    def test_concurrent_writes(self, history_db):
+        def add_jobs():
+            with db.HistoryDB() as thread_db:
+                for _ in range(10):
+                    assert thread_db.write(
+                        """INSERT INTO history (completed, name, nzb_name, nzo_id) VALUES (?, ?, ?, ?)""",
+                        (int(time.time()), random_name(), random_name(), random_name()),
+                    )
+
+        threads = [threading.Thread(target=add_jobs) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert history_db.fetch_history()[1] == 80
+
+    def test_write_updates_version(self, history_db):
+        history_update = sabnzbd.LAST_HISTORY_UPDATE
+        history_db.add_fake_history_jobs(1)
+        assert sabnzbd.LAST_HISTORY_UPDATE > history_update
+
+    def test_execute_batch(self, history_db, caplog):
+        history_db.add_fake_history_jobs(2)
+        nzo_ids = [job["nzo_id"] for job in history_db.fetch_history()[0]]
+
+        # All changes in a single transaction
+        assert history_db.execute_batch(
+            [("""UPDATE history SET name = ? WHERE nzo_id = ?""", ("Batch", nzo_id)) for nzo_id in nzo_ids]
+        ) == [True, True]
+        assert job_names(history_db, "batch") == ["Batch", "Batch"]
+
+        # A failing change doesn't prevent the others
+        assert history_db.execute_batch(
+            [
+                ("""UPDATE history SET name = ? WHERE nzo_id = ?""", ("First", nzo_ids[0])),
+                ("""INSERT INTO history (nzo_id, name) VALUES (?, ?)""", (nzo_ids[0], None)),
+                ("""UPDATE history SET name = ? WHERE nzo_id = ?""", ("Second", nzo_ids[1])),
+            ]
+        ) == [True, False, True]
+        assert job_names(history_db, "") == ["First", "Second"]
+        # The failure is only reported once
+        assert caplog.text.count("SQL Command Failed") == 1
+
+    def test_replace_database(self, tmp_path):
+        def add_job(history_db: db.HistoryDB, name: str):
+            history_db.write(
+                """INSERT INTO history (completed, name, nzb_name, nzo_id) VALUES (?, ?, ?, ?)""",
+                (int(time.time()), name, name, name),
+            )
+
+        db_path = str(tmp_path / "history.db")
+        backup_path = str(tmp_path / "backup.db")
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(db_path) as history_db:
+            add_job(history_db, "First")
+        db.checkpoint_history_db(db_path)
+        shutil.copy(db_path, backup_path)
+        with db.HistoryDB() as history_db:
+            add_job(history_db, "Second")
+        assert db.CONNECTION_POOL and db.HISTORY_WRITER.history_db
+
+        # All connections are closed while the file is replaced
+        with db.history_db_closed():
+            assert not db.CONNECTION_POOL
+            assert not db.HISTORY_WRITER.history_db
+            assert not os.path.exists(db_path + "-wal")
+            shutil.copy(backup_path, db_path)
+
+        with db.HistoryDB() as history_db:
+            add_job(history_db, "Third")
+            assert job_names(history_db, "") == ["First", "Third"]
+        db.HistoryDB.startup_done = False
+        db.HistoryDB.db_path = None
+        db.close_pooled_connections()
+
+    def test_maintenance(self, history_db):
+        history_db.add_fake_history_jobs(200)
+        history_db.execute("PRAGMA page_count;")
+        page_count = history_db.cursor.fetchone()[0]
+
+        # Nothing to reclaim
+        with mock.patch.object(history_db, "execute", wraps=history_db.execute) as execute:
+            history_db.maintenance()
+            assert mock.call("VACUUM;") not in execute.mock_calls
+
+        # Most of the database is empty after removing the jobs
+        history_db.remove_with_status(Status.COMPLETED)
+        history_db.remove_with_status(Status.FAILED)
+        history_db.execute("""DELETE FROM history""")
+        history_db.maintenance()
+        history_db.execute("PRAGMA page_count;")
+        assert history_db.cursor.fetchone()[0] < page_count
+
+
+class TestHistoryDuplicates:
+    def test_have_name_or_md5sum(self, history_db):
+        make_job(history_db, "Ubuntu.24.04.Desktop")
+        make_job(history_db, "Ubuntu.22.04.Desktop", status=Status.FAILED)
+        history_db.execute("""UPDATE history SET md5sum = ? WHERE name = ?""", ("abcdef", "Ubuntu.24.04.Desktop"))
+
+        assert history_db.have_name_or_md5sum("ubuntu.24.04.desktop", "")
+        assert history_db.have_name_or_md5sum("Other.Name", "abcdef")
+        assert not history_db.have_name_or_md5sum("Other.Name", "123456")
+        # Failed jobs are not duplicates
+        assert not history_db.have_name_or_md5sum("Ubuntu.22.04.Desktop", "")
+
+    def test_have_duplicate_key(self, history_db):
+        make_job(history_db, "Show.S01E01")
+        history_db.execute("""UPDATE history SET duplicate_key = ?""", ("show/1/1",))
+        assert history_db.have_duplicate_key("show/1/1")
+        assert not history_db.have_duplicate_key("show/1/2")
+
+    @pytest.mark.parametrize(
+        "query, index",
+        [
+            ("""SELECT 1 FROM history WHERE duplicate_key = ? AND status != ?""", "idx_history_duplicate_key"),
+            (
+                """SELECT 1 FROM history WHERE (name = ? COLLATE NOCASE OR md5sum = ?) AND status != ?""",
+                "idx_history_name",
+            ),
+            (
+                """SELECT 1 FROM history WHERE (name = ? COLLATE NOCASE OR md5sum = ?) AND status != ?""",
+                "idx_history_md5sum",
+            ),
+        ],
+    )
+    def test_indexes_used(self, history_db, query, index):
+        history_db.execute("EXPLAIN QUERY PLAN " + query, ("a",) * query.count("?"))
+        assert index in " ".join(row["detail"] for row in history_db.cursor.fetchall())
+
+
+class TestHistoryStats:
+    @staticmethod
+    def stats(history_db: db.HistoryDB) -> list[tuple]:
+        history_db.execute(
+            """SELECT hour, category, status, archive, jobs, bytes FROM history_stats ORDER BY 1, 2, 3, 4"""
+        )
+        return [tuple(row) for row in history_db.cursor.fetchall()]
+
+    @staticmethod
+    def stats_from_history(history_db: db.HistoryDB) -> list[tuple]:
+        history_db.execute("""
+            SELECT completed / 3600, IFNULL(category, ''), IFNULL(status, ''),
+                IFNULL(archive, 0), COUNT(*), IFNULL(SUM(bytes), 0)
+            FROM history GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+            """)
+        return [tuple(row) for row in history_db.cursor.fetchall()]
+
+    def test_kept_in_sync(self, history_db):
+        history_db.add_fake_history_jobs(40)
+        assert self.stats(history_db) == self.stats_from_history(history_db)
+
+        # Archived, changed and removed jobs
+        history_db.archive_with_status(Status.FAILED)
+        history_db.execute("""UPDATE history SET status = ?, bytes = bytes / 2 WHERE id % 3 = 0""", (Status.QUEUED,))
+        history_db.execute("""UPDATE history SET completed = completed + 86400 WHERE id % 5 = 0""")
+        history_db.remove_with_status(Status.COMPLETED)
+        history_db.remove(["SABnzbd_nzo_unknown"])
+        assert self.stats(history_db) == self.stats_from_history(history_db)
+
+        history_db.execute("""DELETE FROM history""")
+        assert self.stats(history_db) == []
+
+    def test_history_size(self, history_db):
+        history_db.add_fake_history_jobs(20)
+        history_db.execute("""UPDATE history SET completed = ? WHERE id <= 5""", (int(time.time()),))
+
+        month_timest = int(db.this_month(time.time()))
+        week_timest = int(db.this_week(time.time()))
+        history_db.execute(
+            """SELECT SUM(bytes) AS total,
+                SUM(CASE WHEN completed >= ? THEN bytes ELSE 0 END) AS month,
+                SUM(CASE WHEN completed >= ? THEN bytes ELSE 0 END) AS week
+            FROM history""",
+            (month_timest, week_timest),
+        )
+        expected = history_db.cursor.fetchone()
+        assert history_db.get_history_size() == (expected["total"], expected["month"], expected["week"])
+
+    @pytest.mark.parametrize(
+        "archive, categories, statuses",
+        [
+            (False, None, None),
+            (True, None, None),
+            (False, ["Default", "catA"], None),
+            (False, None, [Status.FAILED]),
+            (True, ["catB"], [Status.FAILED, Status.COMPLETED]),
+        ],
+    )
+    def test_count(self, history_db, archive, categories, statuses):
+        history_db.add_fake_history_jobs(40)
+        history_db.execute("""UPDATE history SET archive = 1 WHERE id % 2 = 0""")
+
+        cmd = "SELECT COUNT(*) FROM history WHERE " + ("archive = 1" if archive else "archive IS NULL")
+        args = []
+        if categories:
+            args.extend("*" if category == "Default" else category for category in categories)
+            cmd += " AND category IN (%s)" % ", ".join("?" * len(categories))
+        if statuses:
+            args.extend(statuses)
+            cmd += " AND status IN (%s)" % ", ".join("?" * len(statuses))
+        history_db.execute(cmd, args)
+        expected = history_db.cursor.fetchone()[0]
+
+        assert history_db.fetch_history(archive=archive, categories=categories, statuses=statuses)[1] == expected
+
+    @pytest.mark.skipif(sabnzbd.WINDOWS, reason="Timezone can't be changed on Windows")
+    def test_timezone_change(self, history_db, monkeypatch):
+        monkeypatch.setenv("TZ", "UTC")
+        time.tzset()
+        try:
+            history_db.add_fake_history_jobs(20)
+            monkeypatch.setenv("TZ", "Pacific/Kiritimati")
+            time.tzset()
+            history_db.execute("""UPDATE history SET status = ? WHERE id % 2 = 0""", (Status.QUEUED,))
+            history_db.remove_with_status(Status.FAILED)
+            assert self.stats(history_db) == self.stats_from_history(history_db)
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+
+    @pytest.mark.parametrize("version", [8, 9])
+    def test_migration(self, tmp_path, version):
+        db_path = str(tmp_path / "history.db")
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(db_path) as history_db:
+            history_db.execute("DROP TABLE history_stats")
+            for trigger in ("insert", "delete", "update"):
+                history_db.execute("DROP TRIGGER history_stats_%s" % trigger)
+            if version == 9:
+                # The totals used to be kept per day
+                history_db.execute("""
+                    CREATE TABLE history_stats (
+                        day TEXT NOT NULL, category TEXT NOT NULL, status TEXT NOT NULL, archive INTEGER NOT NULL,
+                        jobs INTEGER NOT NULL, bytes INTEGER NOT NULL, PRIMARY KEY (day, category, status, archive)
+                    )
+                    """)
+            history_db.execute("PRAGMA user_version = %d;" % version)
+            history_db.add_fake_history_jobs(10)
+
+        # On the next start the totals are calculated
+        db.HistoryDB.startup_done = False
+        with FakeHistoryDB(db_path) as history_db:
+            assert self.stats(history_db) == self.stats_from_history(history_db)
+            assert history_db.fetch_history()[1] == 10
+        db.HistoryDB.startup_done = False
+        db.HistoryDB.db_path = None
@@ -406,6 +406,71 @@ class TestDeobfuscateFinalResult:
 
         shutil.rmtree(work_dir)
 
+    def test_deobfuscate_par2_single_pass(self):
+        # Only one par2 file per set is parsed and every file is read once
+        work_dir = os.path.join(SAB_CACHE_DIR, "testdir" + str(random.randint(10000, 99999)))
+        os.mkdir(work_dir)
+
+        source_zip_file = os.path.join(SAB_DATA_DIR, "deobfuscate_par2_based", "20mb_with_par2_package.zip")
+        with zipfile.ZipFile(source_zip_file, "r") as zip_ref:
+            zip_ref.extractall(work_dir)
+        shutil.copy(os.path.join(work_dir, "rename.par2"), os.path.join(work_dir, "rename.vol00+01.par2"))
+        with open(os.path.join(work_dir, "bbbbbbbbbbb"), "wb") as other_file:
+            other_file.write(b"not listed in the par2")
+
+        list_of_files = [os.path.join(work_dir, file) for file in os.listdir(work_dir)]
+        with mock.patch(
+            "sabnzbd.deobfuscate_filenames.parse_par2_file", wraps=sabnzbd.deobfuscate_filenames.parse_par2_file
+        ) as parse_par2_file, mock.patch("sabnzbd.deobfuscate_filenames.open", wraps=open, create=True) as opened:
+            list_of_files = recover_par2_names(list_of_files)
+        assert parse_par2_file.call_count == 1
+        assert sorted(call.args[0] for call in opened.call_args_list) == sorted(
+            os.path.join(work_dir, file)
+            for file in ("aaaaaaaaaaa", "bbbbbbbbbbb", "rename.par2", "rename.vol00+01.par2")
+        )
+        assert os.path.join(work_dir, "twentymb.bin") in list_of_files
+        assert os.path.isfile(os.path.join(work_dir, "bbbbbbbbbbb"))
+
+        shutil.rmtree(work_dir)
+
+    def test_deobfuscate_par2_damaged_file(self):
+        # A damaged file is still renamed if the first 16k match, so par2 can repair it
+        work_dir = os.path.join(SAB_CACHE_DIR, "testdir" + str(random.randint(10000, 99999)))
+        os.mkdir(work_dir)
+
+        source_zip_file = os.path.join(SAB_DATA_DIR, "deobfuscate_par2_based", "20mb_with_par2_package.zip")
+        with zipfile.ZipFile(source_zip_file, "r") as zip_ref:
+            zip_ref.extractall(work_dir)
+        with open(os.path.join(work_dir, "aaaaaaaaaaa"), "r+b") as damaged_file:
+            damaged_file.truncate(1024 * 1024)
+
+        list_of_files = recover_par2_names([os.path.join(work_dir, file) for file in os.listdir(work_dir)])
+        assert os.path.join(work_dir, "twentymb.bin") in list_of_files
+        assert os.path.getsize(os.path.join(work_dir, "twentymb.bin")) == 1024 * 1024
+
+        shutil.rmtree(work_dir)
+
+    def test_deobfuscate_par2_sets_applied_in_order(self, tmp_path):
+        # Sets that use a different name for the same data are applied one after the other
+        for filename in ("obfuscated1", "obfuscated2"):
+            (tmp_path / filename).write_bytes(b"same data")
+        (tmp_path / "first.par2").touch()
+        (tmp_path / "second.par2").touch()
+        data_md5 = hashlib.md5(b"same data").digest()
+
+        def parse_par2_file(parfile, md5of16k):
+            md5of16k[data_md5] = os.path.basename(parfile).replace(".par2", ".bin")
+            return "", {}
+
+        with mock.patch("sabnzbd.deobfuscate_filenames.is_par2_file", return_value=True), mock.patch(
+            "sabnzbd.deobfuscate_filenames.parse_par2_file", side_effect=parse_par2_file
+        ):
+            new_files = decode_par2_files([str(tmp_path / "first.par2"), str(tmp_path / "second.par2")])
+
+        # Same result as when the par2 files are used one by one
+        assert sorted(os.listdir(tmp_path)) == ["first.par2", "second.1.bin", "second.bin", "second.par2"]
+        assert sorted(new_files) == [str(tmp_path / "second.1.bin"), str(tmp_path / "second.bin")]
+
     def test_get_biggest_file(self):
         # Create directory (with a random directory name)
         dirname = os.path.join(SAB_CACHE_DIR, "testdir" + str(random.randint(10000, 99999)))
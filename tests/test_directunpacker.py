@@ -0,0 +1,160 @@
+#!/usr/bin/python3 -OO
+# Copyright 2007-2026 by The SABnzbd-Team (sabnzbd.org)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+tests.test_directunpacker - Testing functions in directunpacker.py
+"""
+
+from sabnzbd import directunpacker
+from sabnzbd.directunpacker import DirectUnpacker, DirectUnpackSet, analyze_rar_filename
+
+from tests.testhelper import *
+
+
+@pytest.mark.parametrize(
+    "filename, result",
+    [
+        ("hello.world.part01.rar", ("hello.world", 1)),
+        ("hello.world.part12.rar", ("hello.world", 12)),
+        ("hello.world.rar", ("hello.world", 1)),
+        ("hello.world.r00", ("hello.world", 2)),
+        ("hello.world.r11", ("hello.world", 13)),
+        ("hello.world.mkv", (None, None)),
+    ],
+)
+def test_analyze_rar_filename(filename, result):
+    assert analyze_rar_filename(filename) == result
+
+
+def fake_create_unrar_instance(set_unpacker: DirectUnpackSet):
+    """Pretend to start unrar for the set"""
+    set_unpacker.rarfile_nzf = set_unpacker.have_next_volume()
+    set_unpacker.cur_volume = 1
+    set_unpacker.active_instance = mock.Mock()
+    directunpacker.ACTIVE_UNPACKERS.append(set_unpacker)
+
+
+def finish_set(set_unpacker: DirectUnpackSet):
+    """Same clean-up as at the end of the unrar loop"""
+    set_unpacker.active_instance = None
+    directunpacker.ACTIVE_UNPACKERS.remove(set_unpacker)
+    directunpacker.start_waiting_unpackers()
+
+
+@pytest.fixture
+def unpack_scheduler():
+    """Prevent starting real unrar processes and clean the global state"""
+    with mock.patch.object(DirectUnpackSet, "create_unrar_instance", fake_create_unrar_instance), mock.patch.object(
+        DirectUnpackSet, "start"
+    ), mock.patch("sabnzbd.newsunpack.RAR_PROBLEM", False):
+        yield
+    directunpacker.ACTIVE_UNPACKERS.clear()
+    directunpacker.WAITING_UNPACKERS.clear()
+
+
+@pytest.mark.usefixtures("unpack_scheduler")
+class TestDirectUnpackScheduling:
+    @staticmethod
+    def create_job(name: str, setnames: list[str], remaining: int) -> DirectUnpacker:
+        nzo = mock.Mock(
+            final_name=name,
+            first_articles=[],
+            bad_articles=0,
+            unpack=True,
+            pp_active=False,
+            files=[],
+            finished_files=[],
+        )
+        nzo.remaining = remaining
+        direct_unpacker = DirectUnpacker(nzo)
+        for setname in setnames:
+            nzf = mock.Mock(filename="%s.part01.rar" % setname, assembled=True)
+            nzo.finished_files.append(nzf)
+            direct_unpacker.add(nzf)
+        return direct_unpacker
+
+    @staticmethod
+    def active_setnames() -> list[str]:
+        return [set_unpacker.setname for set_unpacker in directunpacker.ACTIVE_UNPACKERS]
+
+    @set_config({"direct_unpack": True, "direct_unpack_tested": True, "enable_unrar": True, "direct_unpack_threads": 4})
+    def test_sets_of_job_run_concurrently(self):
+        job = self.create_job("job", ["a", "b", "c"], 100)
+        assert self.active_setnames() == ["a", "b", "c"]
+        assert len(job.active_sets()) == 3
+        assert not directunpacker.WAITING_UNPACKERS
+
+    @set_config({"direct_unpack": True, "direct_unpack_tested": True, "enable_unrar": True, "direct_unpack_threads": 2})
+    def test_global_budget(self):
+        job = self.create_job("job", ["a", "b", "c"], 100)
+        assert self.active_setnames() == ["a", "b"]
+        assert [set_unpacker.setname for set_unpacker in directunpacker.WAITING_UNPACKERS] == ["c"]
+
+        # The waiting set gets the free spot
+        finish_set(job.set_unpackers["a"])
+        assert self.active_setnames() == ["b", "c"]
+        assert not directunpacker.WAITING_UNPACKERS
+
+    @set_config({"direct_unpack": True, "direct_unpack_tested": True, "enable_unrar": True, "direct_unpack_threads": 2})
+    def test_fair_share_and_closest_to_completion(self):
+        busy_job = self.create_job("busy", ["busy1", "busy2"], 100)
+        small_job = self.create_job("small", ["small1", "small2"], 10)
+        self.create_job("big", ["big1"], 1000)
+        assert self.active_setnames() == ["busy1", "busy2"]
+
+        # The job closest to completion goes first
+        finish_set(busy_job.set_unpackers["busy1"])
+        assert self.active_setnames() == ["busy2", "small1"]
+
+        # But not before the other jobs got their turn
+        finish_set(busy_job.set_unpackers["busy2"])
+        assert self.active_setnames() == ["small1", "big1"]
+
+        finish_set(small_job.set_unpackers["small1"])
+        assert self.active_setnames() == ["big1", "small2"]
+
+    @set_config({"direct_unpack": True, "direct_unpack_tested": True, "enable_unrar": True, "direct_unpack_threads": 2})
+    def test_wait_for_first_volume(self):
+        job = self.create_job("job", ["a"], 100)
+        nzf = mock.Mock(filename="b.part02.rar", assembled=True)
+        job.nzo.finished_files.append(nzf)
+        job.add(nzf)
+        assert self.active_setnames() == ["a"]
+        assert job.set_unpackers["b"] in directunpacker.WAITING_UNPACKERS
+
+        # Sets that did not start before post-processing are left to post-processing
+        job.nzo.pp_active = True
+        directunpacker.start_waiting_unpackers()
+        assert not directunpacker.WAITING_UNPACKERS
+
+    @set_config({"direct_unpack": True, "direct_unpack_tested": True, "enable_unrar": True, "direct_unpack_threads": 1})
+    def test_next_volumes(self):
+        job = self.create_job("job", ["a", "b"], 100)
+        job.nzo.files = [mock.Mock(filename=filename) for filename in ("a.part03.rar", "a.part02.rar", "b.part02.rar")]
+        job.set_volumes_for_nzo()
+
+        # Running set wants the volumes after the current one, the waiting set from the start
+        assert [nzf.filename for nzf in job.next_volumes()] == [
+            "a.part02.rar",
+            "a.part03.rar",
+            "b.part01.rar",
+            "b.part02.rar",
+        ]
+
+        # Done with the first set
+        finish_set(job.set_unpackers["a"])
+        assert [nzf.filename for nzf in job.next_volumes()] == ["b.part02.rar"]
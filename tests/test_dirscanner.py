@@ -72,7 +72,10 @@ class TestDirScanner:
         ],
     )
     async def test_adds_valid_nzbs(self, mock_sleep, fs, mocker, path, catdir):
-        mocker.patch("sabnzbd.nzbparser.add_nzbfile", return_value=(AddNzbFileResult.ERROR, []))
+        mocker.patch(
+            "sabnzbd.nzbparser.add_nzbfiles",
+            side_effect=lambda nzbfiles: [(AddNzbFileResult.ERROR, [])] * len(nzbfiles),
+        )
         mocker.patch("sabnzbd.config.save_config", return_value=True)
 
         fs.create_file(os.path.join(catdir or "", path), contents="FAKEFILE")
@@ -81,8 +84,8 @@ class TestDirScanner:
 
         await scanner.scan_async("")
 
-        sabnzbd.nzbparser.add_nzbfile.assert_any_call(
-            os.path.join(sabnzbd.cfg.dirscan_dir.get_path(), catdir or "", path), catdir=catdir, keep=False
+        sabnzbd.nzbparser.add_nzbfiles.assert_called_once_with(
+            [(os.path.join(sabnzbd.cfg.dirscan_dir.get_path(), catdir or "", path), catdir)]
         )
 
     @pytest.mark.asyncio
@@ -98,7 +101,10 @@ class TestDirScanner:
         ],
     )
     async def test_ignores_empty_files(self, mock_sleep, fs, mocker, path):
-        mocker.patch("sabnzbd.nzbparser.add_nzbfile", return_value=(AddNzbFileResult.ERROR, []))
+        mocker.patch(
+            "sabnzbd.nzbparser.add_nzbfiles",
+            side_effect=lambda nzbfiles: [(AddNzbFileResult.ERROR, [])] * len(nzbfiles),
+        )
         mocker.patch("sabnzbd.config.save_config", return_value=True)
 
         fs.create_file(path)
@@ -107,7 +113,7 @@ class TestDirScanner:
 
         await scanner.scan_async("")
 
-        sabnzbd.nzbparser.add_nzbfile.assert_not_called()
+        sabnzbd.nzbparser.add_nzbfiles.assert_not_called()
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -118,7 +124,10 @@ class TestDirScanner:
         ],
     )
     async def test_ignores_non_nzbs(self, mock_sleep, fs, mocker, path):
-        mocker.patch("sabnzbd.nzbparser.add_nzbfile", return_value=(AddNzbFileResult.ERROR, []))
+        mocker.patch(
+            "sabnzbd.nzbparser.add_nzbfiles",
+            side_effect=lambda nzbfiles: [(AddNzbFileResult.ERROR, [])] * len(nzbfiles),
+        )
         mocker.patch("sabnzbd.config.save_config", return_value=True)
 
         fs.create_file(path, contents="FAKEFILE")
@@ -127,4 +136,74 @@ class TestDirScanner:
 
         await scanner.scan_async("")
 
-        sabnzbd.nzbparser.add_nzbfile.assert_not_called()
+        sabnzbd.nzbparser.add_nzbfiles.assert_not_called()
+
+
+@pytest.mark.skipif(not sabnzbd.dirscanner.HAVE_INOTIFY, reason="Requires inotify")
+class TestDirScannerInotify:
+    @pytest.fixture(autouse=True)
+    def use_inotify(self):
+        cfg.dirscan_inotify.set(True)
+        yield
+        cfg.dirscan_inotify.set(cfg.dirscan_inotify.default)
+
+    @staticmethod
+    async def wait_for_call(mocked):
+        for _ in range(50):
+            if mocked.called:
+                break
+            await asyncio.sleep(0.05)
+
+    @pytest.mark.asyncio
+    async def test_adds_written_nzbs(self, tmp_path, mocker):
+        mocker.patch("sabnzbd.nzbparser.add_nzbfile", return_value=(AddNzbFileResult.OK, []))
+        mocker.patch("sabnzbd.config.get_categories", return_value={"movies": None})
+        (tmp_path / "movies").mkdir()
+
+        scanner = sabnzbd.dirscanner.DirScanner()
+        scanner.update_watch(str(tmp_path))
+        assert scanner.inotify
+        try:
+            # Files are added as soon as they are closed, others are not looked at
+            (tmp_path / "file.txt").write_text("FAKEFILE")
+            (tmp_path / "movies" / "file.nzb").write_text("FAKEFILE")
+            await self.wait_for_call(sabnzbd.nzbparser.add_nzbfile)
+            sabnzbd.nzbparser.add_nzbfile.assert_called_once_with(
+                str(tmp_path / "movies" / "file.nzb"), catdir="movies", keep=False
+            )
+            assert not scanner.ignored
+        finally:
+            scanner.stop_watch()
+
+    @pytest.mark.asyncio
+    async def test_adds_moved_nzbs(self, tmp_path, mocker):
+        mocker.patch("sabnzbd.nzbparser.add_nzbfile", return_value=(AddNzbFileResult.OK, []))
+        (tmp_path / "watched").mkdir()
+        (tmp_path / "file.nzb").write_text("FAKEFILE")
+
+        scanner = sabnzbd.dirscanner.DirScanner()
+        scanner.update_watch(str(tmp_path / "watched"))
+        try:
+            os.rename(tmp_path / "file.nzb", tmp_path / "watched" / "file.nzb")
+            await self.wait_for_call(sabnzbd.nzbparser.add_nzbfile)
+            sabnzbd.nzbparser.add_nzbfile.assert_called_once_with(
+                str(tmp_path / "watched" / "file.nzb"), catdir=None, keep=False
+            )
+        finally:
+            scanner.stop_watch()
+
+    @pytest.mark.asyncio
+    async def test_removed_folder(self, tmp_path, mocker):
+        (tmp_path / "watched").mkdir()
+        scanner = sabnzbd.dirscanner.DirScanner()
+        scanner.update_watch(str(tmp_path / "watched"))
+        scanner.rescan = False
+
+        # Back to scanning the folder
+        os.rmdir(tmp_path / "watched")
+        for _ in range(50):
+            if not scanner.inotify:
+                break
+            await asyncio.sleep(0.05)
+        assert not scanner.inotify
+        assert scanner.rescan
@@ -0,0 +1,167 @@
+#!/usr/bin/python3 -OO
+# Copyright 2007-2026 by The SABnzbd-Team (sabnzbd.org)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+tests.test_events - Testing functions in events.py
+"""
+
+import json
+import threading
+
+import sabnzbd.api
+from sabnzbd import events
+from sabnzbd.misc import to_units
+
+from tests.testhelper import *
+
+
+def slot(nzo_id: str, status: str = Status.QUEUED) -> dict:
+    return {"nzo_id": nzo_id, "status": status}
+
+
+class TestEventClient:
+    def test_combine_events(self):
+        client = events.EventClient(0)
+        client.put("queue", "a", "queue_added", slot("a"))
+        client.put("queue", "a", "queue_updated", slot("a", Status.PAUSED))
+        client.put("queue", "b", "queue_updated", slot("b"))
+        client.put("queue", "b", "queue_removed", {"nzo_id": "b"})
+        client.put("queue", "c", "queue_added", slot("c"))
+        client.put("queue", "c", "queue_removed", {"nzo_id": "c"})
+        client.put("speed", "", "speed", {"speed": "1 M"})
+        client.put("speed", "", "speed", {"speed": "2 M"})
+
+        assert client.get(0) == [
+            ("queue_added", slot("a", Status.PAUSED)),
+            ("queue_removed", {"nzo_id": "b"}),
+            ("speed", {"speed": "2 M"}),
+        ]
+        assert client.get(0) == []
+
+    def test_stream(self):
+        client = events.EventClient(0)
+        client.put("queue", "a", "queue_added", slot("a"))
+        stream = client.stream()
+        assert next(stream) == b"retry: 5000\n\n"
+        assert next(stream) == b"id: 1\nevent: queue_added\ndata: %s\n\n" % json.dumps(slot("a")).encode()
+
+        # Without events only a keep-alive is sent
+        with mock.patch.object(events, "EVENT_KEEPALIVE", 0):
+            assert next(stream) == b": keepalive\n\n"
+        stream.close()
+
+
+@pytest.fixture
+def publisher():
+    """Publisher that is not running, with the sources of the events mocked"""
+    publisher = events.EventPublisher()
+    publisher.clients.append(events.EventClient(0))
+    with mock.patch.multiple(
+        sabnzbd,
+        BPSMeter=mock.Mock(bps=0.0),
+        PostProcessor=mock.Mock(history_queue=[]),
+        GUIHANDLER=mock.Mock(),
+        create=True,
+    ), mock.patch.multiple(sabnzbd.api, build_queue=mock.DEFAULT, build_history=mock.DEFAULT):
+        sabnzbd.GUIHANDLER.content.return_value = []
+        sabnzbd.api.build_queue.return_value = {"slots": [slot("a"), slot("b")]}
+        sabnzbd.api.build_history.return_value = ([], 0, 0, None)
+        yield publisher
+
+
+class TestEventPublisher:
+    def test_publish_changes(self, publisher):
+        client = publisher.clients[0]
+        publisher.publish_changes()
+        assert client.get(0) == [
+            ("speed", {"kbpersec": "0.00", "speed": to_units(0.0)}),
+            ("queue_added", slot("a")),
+            ("queue_added", slot("b")),
+        ]
+
+        # Nothing changed
+        publisher.publish_changes()
+        assert client.get(0) == []
+
+        sabnzbd.BPSMeter.bps = 2048.0
+        sabnzbd.api.build_queue.return_value = {"slots": [slot("a", Status.PAUSED)]}
+        sabnzbd.GUIHANDLER.content.return_value = [{"origin": "test.py1", "time": 1, "text": "Warning"}]
+        sabnzbd.api.build_history.return_value = ([{"nzo_id": "b", "completed": 1}], 1, 1, None)
+        with mock.patch.object(sabnzbd, "LAST_HISTORY_UPDATE", sabnzbd.LAST_HISTORY_UPDATE + 1):
+            publisher.publish_changes()
+        assert client.get(0) == [
+            ("speed", {"kbpersec": "2.00", "speed": to_units(2048.0)}),
+            ("queue_updated", slot("a", Status.PAUSED)),
+            ("queue_removed", {"nzo_id": "b"}),
+            ("history_added", {"nzo_id": "b"}),
+            ("warning", {"origin": "test.py1", "time": 1, "text": "Warning"}),
+        ]
+
+    def test_current_state_for_new_client(self, publisher):
+        publisher.publish_changes()
+        client = events.EventClient(0)
+        publisher.send_current_state(client)
+        assert [event for event, _ in client.get(0)] == ["speed", "queue_added", "queue_added"]
+
+    def test_lock_not_held_while_building(self, publisher):
+        acquired = []
+
+        def take_lock():
+            if events.EVENTS_LOCK.acquire(timeout=1):
+                acquired.append(True)
+                events.EVENTS_LOCK.release()
+
+        def build_queue():
+            # A new client can subscribe while the queue is built
+            thread = threading.Thread(target=take_lock)
+            thread.start()
+            thread.join()
+            return {"slots": [slot("a")]}
+
+        sabnzbd.api.build_queue.side_effect = build_queue
+        with mock.patch.object(events.time, "sleep", side_effect=lambda _: publisher.clients.clear()):
+            publisher.run()
+        assert acquired == [True]
+        assert publisher.stopped
+
+    @pytest.mark.parametrize("history_limit, limit", [(0, events.EVENT_HISTORY_LIMIT), (10, 10), (10000, 100)])
+    def test_history_limit(self, publisher, history_limit, limit):
+        with mock.patch.object(events.cfg, "history_limit", return_value=history_limit):
+            publisher.publish_changes()
+        sabnzbd.api.build_history.assert_called_once_with(limit=limit)
+
+
+class TestSubscribe:
+    @pytest.fixture(autouse=True)
+    def no_publisher(self):
+        with mock.patch.object(events.EventPublisher, "start"):
+            yield
+        events.PUBLISHER = None
+
+    @set_config({"max_event_streams": 2})
+    def test_maximum_streams(self):
+        first = events.subscribe()
+        second = events.subscribe()
+        assert first and second
+        assert not events.subscribe()
+
+        events.unsubscribe(first)
+        assert events.subscribe()
+
+    @set_config({"max_event_streams": 0})
+    def test_disabled(self):
+        assert not events.subscribe()
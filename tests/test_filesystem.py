@@ -19,6 +19,7 @@
 tests.test_filesystem - Testing functions in filesystem.py
 """
 
+import errno
 import stat
 import sys
 import os
@@ -1312,3 +1313,19 @@ class TestOtherFileSystemFunctions:
         # Only test stuff specific for create_work_name
         # The sanitizing is already tested in tests for sanitize_foldername
         assert filesystem.create_work_name(file_name) == clean_file_name
+
+    @pytest.mark.parametrize("kernel_copy", [True, False])
+    def test_append_file(self, tmp_path, kernel_copy):
+        source = tmp_path / "source.bin"
+        source.write_bytes(b"second")
+        target = tmp_path / "target.bin"
+        target.write_bytes(b"first")
+
+        with open(target, "r+b") as target_fp:
+            if kernel_copy:
+                filesystem.append_file(str(source), target_fp, bufsize=4)
+            else:
+                # Falls back to a normal copy, for example when the files are on different filesystems
+                with mock.patch("os.copy_file_range", side_effect=OSError(errno.EXDEV, "Error"), create=True):
+                    filesystem.append_file(str(source), target_fp, bufsize=4)
+        assert target.read_bytes() == b"firstsecond"
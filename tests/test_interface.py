@@ -225,3 +225,24 @@ class TestInterfaceFunctions:
             assert interface.remote_ip_from_xff(xff_ips) is expected_result
 
         _func()
+
+
+class TestTemplateResponse:
+    def test_compiled_once(self, tmp_path):
+        template = tmp_path / "test.tmpl"
+        template.write_text("<!--#for $item in $names#-->$item<!--#end for#-->|$webdir")
+        search_list = {"names": ["<a>", "b&"], "webdir": "/<web>"}
+
+        with mock.patch.object(interface.Template, "compile", wraps=interface.Template.compile) as compile_template:
+            assert interface.template_filtered_response(str(template), search_list) == "&lt;a&gt;b&amp;|/<web>"
+            assert interface.template_filtered_response(str(template), search_list) == "&lt;a&gt;b&amp;|/<web>"
+            assert compile_template.call_count == 1
+
+            # Compiled again after a change of the template
+            template.write_text("$names")
+            os.utime(template, (0, 0))
+            assert interface.template_filtered_response(str(template), search_list) == str(["&lt;a&gt;", "b&amp;"])
+            assert compile_template.call_count == 2
+
+        # The search list itself is not escaped
+        assert search_list["names"] == ["<a>", "b&"]
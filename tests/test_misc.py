@@ -389,21 +389,25 @@ class TestMisc:
         # Make sure the output is cmd.exe-compatible
         assert res == expected_output
 
-    def test_recursive_html_escape(self):
+    def test_html_escaped_copy(self):
         """Very basic test if the recursive clean-up works"""
         input_test = {
             "foo": "<b>?ar'\"",
             "test_list": ["test&1", 'test"2'],
             "test_nested_list": [["test&1", 'test"2', 4]],
             "test_dict": {"test": ["test<>1", "#"]},
+            "excluded": "<b>",
         }
-        # Dict is updated in-place
-        misc.recursive_html_escape(input_test)
+        output = misc.html_escaped_copy(input_test, exclude_items=("excluded",))
         # Have to check them by hand
-        assert input_test["foo"] == "&lt;b&gt;?ar&#x27;&quot;"
-        assert input_test["test_list"] == ["test&amp;1", "test&quot;2"]
-        assert input_test["test_nested_list"] == [["test&amp;1", "test&quot;2", 4]]
-        assert input_test["test_dict"]["test"] == ["test&lt;&gt;1", "#"]
+        assert output["foo"] == "&lt;b&gt;?ar&#x27;&quot;"
+        assert output["test_list"] == ["test&amp;1", "test&quot;2"]
+        assert output["test_nested_list"] == [["test&amp;1", "test&quot;2", 4]]
+        assert output["test_dict"]["test"] == ["test&lt;&gt;1", "#"]
+        assert output["excluded"] == "<b>"
+        # The input is not modified
+        assert input_test["foo"] == "<b>?ar'\""
+        assert input_test["test_dict"]["test"] == ["test<>1", "#"]
 
     @pytest.mark.parametrize(
         "value, result",
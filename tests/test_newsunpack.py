@@ -23,6 +23,8 @@ import glob
 import logging
 import os.path
 import shutil
+import threading
+import zlib
 from unittest.mock import call
 
 
@@ -32,6 +34,7 @@ import sabnzbd
 import sabnzbd.newsunpack as newsunpack
 from sabnzbd.constants import JOB_ADMIN
 from sabnzbd.misc import format_time_string
+from sabnzbd.par2file import FilePar2Info
 from sabnzbd.filesystem import long_path, create_all_dirs, listdir_full
 
 
@@ -66,6 +69,171 @@ class TestNewsUnpackFunctions:
             newsunpack.SevenZip("tests/data/basic_rar5/testfile.rar")
 
 
+class TestRunForSets:
+    @set_config({"pp_max_parallel_sets": 4})
+    def test_run_for_sets_parallel(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def process_set(setname):
+            # Would time out if the sets were not processed at the same time
+            barrier.wait()
+            return setname.upper()
+
+        setnames = ["set%d" % i for i in range(4)]
+        assert newsunpack.run_for_sets(process_set, setnames) == ["SET%d" % i for i in range(4)]
+
+    @set_config({"pp_max_parallel_sets": 1})
+    def test_run_for_sets_serial(self):
+        threads = set()
+
+        def process_set(setname):
+            threads.add(threading.get_ident())
+            return setname
+
+        assert newsunpack.run_for_sets(process_set, ["b", "a", "c"]) == ["b", "a", "c"]
+        assert threads == {threading.get_ident()}
+
+    @pytest.mark.parametrize("cpu_count, workers", [(None, 1), (1, 1), (4, 1), (8, 2), (16, 4), (64, 4)])
+    def test_max_parallel_sets_auto(self, cpu_count, workers):
+        with mock.patch("os.cpu_count", return_value=cpu_count):
+            assert newsunpack.max_parallel_sets() == workers
+
+    @set_config({"pp_max_parallel_sets": 6})
+    def test_max_parallel_sets_config(self):
+        assert newsunpack.max_parallel_sets() == 6
+
+    def test_shared_par2_sets(self, tmp_path):
+        for filename in (
+            "show.s01e01.mkv",
+            "show.s01e01.par2",
+            "show.s01e01.vol0+1.par2",
+            "movie.rar",
+            "movie.r00",
+            "movie.cd2.rar",
+            "movie.cd2.r00",
+            "docu.mkv",
+            "docu.par2",
+            "abc123def.par2",
+            "4f6e0c2a9b.bin",
+        ):
+            (tmp_path / filename).touch()
+        nzo = mock.Mock(download_path=str(tmp_path))
+        setnames = ["show.s01e01", "movie", "movie.cd2", "docu", "abc123def"]
+        nzo.extrapars = dict.fromkeys(setnames)
+
+        # Sets with overlapping names and obfuscated sets, that are scanned using "*", share files
+        assert newsunpack.shared_par2_sets(nzo, setnames) == ["movie", "movie.cd2", "abc123def"]
+
+        # A single set is always scanned using "*"
+        nzo.extrapars = {"docu": None}
+        assert newsunpack.shared_par2_sets(nzo, ["docu"]) == ["docu"]
+
+
+class TestFileJoin:
+    @pytest.mark.parametrize("delete", [True, False])
+    def test_file_join(self, tmp_path, delete):
+        nzo = mock.Mock(download_path=str(tmp_path), delete=delete)
+        pieces = []
+        for n in range(1, 4):
+            piece = tmp_path / ("file.bin.%03d" % n)
+            piece.write_bytes(b"piece%d" % n)
+            pieces.append(str(piece))
+
+        with mock.patch("sabnzbd.newsunpack.append_file", wraps=newsunpack.append_file) as append_file:
+            assert newsunpack.file_join(nzo, "", pieces) == (False, [str(tmp_path / "file.bin")])
+        assert (tmp_path / "file.bin").read_bytes() == b"piece1piece2piece3"
+
+        assert os.listdir(tmp_path) == ["file.bin"]
+        # When the pieces are deleted, the first one is renamed instead of copied
+        assert append_file.call_count == (2 if delete else 3)
+
+    def test_file_join_sequence_error(self, tmp_path):
+        nzo = mock.Mock(download_path=str(tmp_path), delete=True)
+        pieces = []
+        for n in (1, 3):
+            piece = tmp_path / ("file.bin.%03d" % n)
+            piece.write_bytes(b"piece%d" % n)
+            pieces.append(str(piece))
+
+        assert newsunpack.file_join(nzo, "", pieces) == (True, [])
+        assert nzo.fail_msg
+
+
+class TestQuickCheck:
+    @staticmethod
+    def _create_test_nzo(download_path, files):
+        """Write the files to disk and create a mock NZO with matching NZF's"""
+        nzo = mock.Mock()
+        nzo.download_path = str(download_path)
+        nzo.finished_files = []
+        for filename, data in files.items():
+            filepath = os.path.join(nzo.download_path, filename)
+            with open(filepath, "wb") as f:
+                f.write(data)
+            nzf = mock.Mock()
+            nzf.filename = filename
+            nzf.filepath = filepath
+            nzf.crc32 = zlib.crc32(data)
+            nzo.finished_files.append(nzf)
+        return nzo
+
+    @staticmethod
+    def _par2pack(files):
+        return {filename: FilePar2Info(filename, b"", len(data), zlib.crc32(data)) for filename, data in files.items()}
+
+    def test_quick_check_set(self, tmp_path):
+        files = {"file%d.bin" % i: b"data%d" % i for i in range(10)}
+        nzo = self._create_test_nzo(tmp_path, files)
+        nzo.par2packs = {"test": self._par2pack(files)}
+        assert newsunpack.quick_check_set("test", nzo)
+        nzo.renamed_file.assert_not_called()
+
+    def test_quick_check_set_obfuscated(self, tmp_path):
+        files = {"file%d.bin" % i: b"data%d" % i for i in range(10)}
+        nzo = self._create_test_nzo(tmp_path, {"obfuscated%d" % i: data for i, data in enumerate(files.values())})
+        nzo.par2packs = {"test": self._par2pack(files)}
+        assert newsunpack.quick_check_set("test", nzo)
+        assert sorted(os.listdir(tmp_path)) == sorted(files)
+        nzo.renamed_file.assert_called_once_with({"file%d.bin" % i: "obfuscated%d" % i for i in range(10)})
+
+    def test_quick_check_set_failed(self, tmp_path):
+        files = {"file1.bin": b"data1", "file2.bin": b"data2", "file3.nfo": b"nfo"}
+        nzo = self._create_test_nzo(tmp_path, files)
+        # Wrong size, so even a matching crc32 is not enough
+        nzo.par2packs = {"test": self._par2pack(files)}
+        nzo.par2packs["test"]["file1.bin"].filesize = 100
+        assert not newsunpack.quick_check_set("test", nzo)
+
+        # Missing file
+        nzo.par2packs = {"test": self._par2pack(files | {"file4.bin": b"data4"})}
+        assert not newsunpack.quick_check_set("test", nzo)
+
+        # Missing or broken files that should be ignored
+        nzo.par2packs = {"test": self._par2pack(files | {"file4.nfo": b"nfo4"})}
+        nzo.par2packs["test"]["file3.nfo"].filehash = 0
+        assert newsunpack.quick_check_set("test", nzo)
+
+    def test_quick_check_set_large(self, tmp_path):
+        files = {"file%d.bin" % i: b"data%d" % i for i in range(5000)}
+        nzo = self._create_test_nzo(tmp_path, {"obfuscated%d" % i: data for i, data in enumerate(files.values())})
+        nzo.par2packs = {"test": self._par2pack(files)}
+        with mock.patch("os.path.getsize", wraps=os.path.getsize) as getsize:
+            assert newsunpack.quick_check_set("test", nzo)
+            # Every file is only checked once
+            assert getsize.call_count == 5000
+
+    def test_sfv_check_obfuscated(self, tmp_path):
+        files = {"file%d.bin" % i: b"data%d" % i for i in range(10)}
+        nzo = self._create_test_nzo(tmp_path, {"obfuscated%d" % i: data for i, data in enumerate(files.values())})
+        sfv_path = os.path.join(tmp_path, "test.sfv")
+        with open(sfv_path, "wb") as sfv:
+            for filename, data in files.items():
+                sfv.write(b"%s %08X\n" % (filename.encode(), zlib.crc32(data)))
+        assert newsunpack.sfv_check([sfv_path], nzo)
+        assert sorted(os.listdir(tmp_path)) == sorted(list(files) + ["test.sfv"])
+        nzo.renamed_file.assert_called_once_with({"file%d.bin" % i: "obfuscated%d" % i for i in range(10)})
+
+
 @pytest.mark.usefixtures("clean_cache_dir")
 class TestPar2Repair:
     @staticmethod
@@ -19,10 +19,15 @@
 tests.test_nzbparser - Tests of basic NZB parsing
 """
 
+import gzip
+import zipfile
+
 from tests.testhelper import *
 import sabnzbd.nzbparser as nzbparser
+from sabnzbd.config import ConfigCat
+from sabnzbd.constants import AddNzbFileResult
 from sabnzbd.nzb import NzbObject
-from sabnzbd.filesystem import save_compressed
+from sabnzbd.filesystem import save_compressed, saving_compressed
 
 
 @pytest.mark.usefixtures("clean_cache_dir")
@@ -64,6 +69,28 @@ class TestNzbParser:
         for field in metadata:
             assert [metadata[field]] == nzo.meta[field]
 
+    @set_config({"download_dir": SAB_CACHE_DIR})
+    def test_nzbparser_while_saving(self):
+        nzo = NzbObject("test_saving")
+        nzb_data = create_and_read_nzb_fp("..").read()
+
+        # Parsed while it is saved, the saved file is the same
+        with saving_compressed(SAB_CACHE_DIR, "saving", io.BytesIO(nzb_data)) as (nzb_file, nzb_fp):
+            nzbparser.nzbfile_parser(nzb_fp, nzo)
+        assert nzb_file == os.path.join(SAB_CACHE_DIR, "saving.nzb.gz")
+        assert nzo.files
+        with gzip.open(nzb_file) as saved:
+            assert saved.read() == nzb_data
+
+    def test_saving_compressed_after_error(self):
+        # Everything is saved, even when reading stopped halfway
+        with pytest.raises(ValueError):
+            with saving_compressed(SAB_CACHE_DIR, "broken.nzb", io.BytesIO(b"0123456789")) as (nzb_file, nzb_fp):
+                assert nzb_fp.read(4) == b"0123"
+                raise ValueError
+        with gzip.open(nzb_file) as saved:
+            assert saved.read() == b"0123456789"
+
     @pytest.mark.xfail(reason="These tests should be added")
     def test_nzbparser_bad_stuff(self):
         # TODO: Add tests for:
@@ -71,3 +98,81 @@ class TestNzbParser:
         #  Strange articles sizes
         #  Correct parsing of dates
         assert False
+
+
+class TestCreateAndAddJobs:
+    @staticmethod
+    def run_jobs(items: list[str], dup_check: bool = True) -> list[str]:
+        events = []
+
+        def create(item: str) -> nzbparser.NewJob:
+            # The first ones take the longest
+            time.sleep(0.01 * (len(items) - items.index(item)))
+            events.append("create " + item)
+            return nzbparser.NewJob(AddNzbFileResult.OK)
+
+        def add(item: str, job: nzbparser.NewJob) -> str:
+            events.append("add " + item)
+            return item
+
+        assert nzbparser.create_and_add_jobs(create, add, items, dup_check) == items
+        return events
+
+    def test_added_in_order(self):
+        items = ["a", "b", "c", "d", "e"]
+        events = self.run_jobs(items)
+        assert [event for event in events if event.startswith("add")] == ["add " + item for item in items]
+        # Created at the same time, so the last ones are done first
+        assert events[0] != "create a"
+
+    @set_config({"no_dupes": 1})
+    def test_duplicate_check_one_by_one(self):
+        assert self.run_jobs(["a", "b", "c"]) == ["create a", "add a", "create b", "add b", "create c", "add c"]
+
+    @set_config({"no_dupes": 1})
+    def test_no_duplicate_check(self):
+        assert self.run_jobs(["a", "b", "c"], dup_check=False)[0] != "create a"
+
+
+@pytest.mark.usefixtures("clean_cache_dir")
+class TestNzbArchive:
+    @set_config({"download_dir": SAB_CACHE_DIR})
+    def test_archive_jobs_added_in_order(self, tmp_path):
+        ConfigCat("*", {"pp": 3, "script": "None", "priority": NORMAL_PRIORITY})
+        archive = str(tmp_path / "jobs.zip")
+        names = ["job%d.nzb" % n for n in range(5)]
+        with zipfile.ZipFile(archive, "w") as zf:
+            for name in names:
+                zf.writestr(name, create_and_read_nzb_fp("basic_rar5").read())
+
+        added = []
+        with mock.patch.object(sabnzbd, "NzbQueue", create=True) as nzbqueue:
+            nzbqueue.add.side_effect = lambda nzo, quiet=False: added.append(nzo.final_name) or nzo.final_name
+            result, nzo_ids = nzbparser.process_nzb_archive_file("jobs.zip", archive)
+
+        assert result is AddNzbFileResult.OK
+        assert added == nzo_ids == [os.path.splitext(name)[0] for name in names]
+        assert not os.path.exists(archive)
+
+    @set_config({"download_dir": SAB_CACHE_DIR})
+    def test_archive_kept_after_read_error(self, tmp_path):
+        ConfigCat("*", {"pp": 3, "script": "None", "priority": NORMAL_PRIORITY})
+        archive = str(tmp_path / "jobs.zip")
+        with zipfile.ZipFile(archive, "w") as zf:
+            for n in range(3):
+                zf.writestr("job%d.nzb" % n, create_and_read_nzb_fp("basic_rar5").read())
+
+        zip_open = zipfile.ZipFile.open
+
+        def failing_open(zf, name, *args, **kwargs):
+            if name == "job1.nzb":
+                raise OSError("Damaged")
+            return zip_open(zf, name, *args, **kwargs)
+
+        with mock.patch.object(sabnzbd, "NzbQueue", create=True), mock.patch.object(
+            zipfile.ZipFile, "open", failing_open
+        ):
+            assert nzbparser.process_nzb_archive_file("jobs.zip", archive) == (AddNzbFileResult.ERROR, [])
+
+        # Kept, so it can be tried again
+        assert os.path.exists(archive)
@@ -23,6 +23,7 @@ import shutil
 from pathlib import Path
 from types import SimpleNamespace
 
+from sabnzbd.constants import DuplicateStatus
 from sabnzbd.downloader import Server
 from sabnzbd.nzb import NzbObject, NzbFile
 from sabnzbd.nzbqueue import NzbQueue
@@ -112,6 +113,117 @@ class TestNzbQueue:
         # Try list restored
         assert sabnzbd.Downloader.servers[0] in list(joba.files[0].articles)[0].try_list
 
+    def test_duplicate_lookup(self, mocker):
+        sabnzbd.PostProcessor = mocker.Mock()
+        sabnzbd.PostProcessor.get_queue = mocker.Mock(return_value=[])
+        q = NzbQueue()
+        joba = make_dummy_nzo("a", files=1, articles=1)
+        joba.md5sum = "abcdef"
+        joba.duplicate_key = "show/1/1"
+        q.add(joba, save=False)
+        for name in range(50):
+            q.add(make_dummy_nzo(str(name), files=1, articles=1), save=False)
+
+        assert q.have_name_or_md5sum("JOB-A", "")
+        assert q.have_name_or_md5sum("job-other", "abcdef")
+        assert not q.have_name_or_md5sum("job-other", "123456")
+        assert q.have_duplicate_key("show/1/1")
+        assert not q.have_duplicate_key("show/1/2")
+
+        # Renamed job is found by the new name
+        q.change_name(joba.nzo_id, "job-renamed")
+        assert not q.have_name_or_md5sum("job-a", "")
+        assert q.have_name_or_md5sum("job-renamed", "")
+
+        # Jobs that are duplicates themselves are skipped
+        joba.duplicate = DuplicateStatus.DUPLICATE
+        assert not q.have_name_or_md5sum("job-renamed", "")
+        joba.duplicate = None
+
+        # And no longer found when removed
+        q.remove(joba.nzo_id, cleanup=False)
+        assert not q.have_name_or_md5sum("job-renamed", "abcdef")
+        assert not q.have_duplicate_key("show/1/1")
+
+        # Jobs in post-processing are also checked
+        sabnzbd.PostProcessor.get_queue.return_value = [joba]
+        assert q.have_name_or_md5sum("job-renamed", "")
+        del sabnzbd.PostProcessor
+
+    def test_queue_info(self):
+        q = NzbQueue()
+        jobs = []
+        for name, cat, priority in (
+            ("Show.S01E01", "tv", NORMAL_PRIORITY),
+            ("Movie", "movies", HIGH_PRIORITY),
+            ("Show.S01E02", "tv", LOW_PRIORITY),
+            ("Other", "*", NORMAL_PRIORITY),
+        ):
+            nzo = make_dummy_nzo(name, priority=priority, files=1, articles=2)
+            nzo.cat = cat
+            q.add(nzo, save=False)
+            jobs.append(nzo)
+        job_size = jobs[0].bytes
+
+        def names(nzo_list: list[NzbObject]) -> list[str]:
+            return [nzo.final_name for nzo in nzo_list]
+
+        bytes_total, bytes_left, left_previous_page, nzo_list, size, matched = q.queue_info()
+        assert names(nzo_list) == ["job-Movie", "job-Show.S01E01", "job-Other", "job-Show.S01E02"]
+        assert (bytes_total, bytes_left, left_previous_page, size, matched) == (4 * job_size, 4 * job_size, 0, 4, 4)
+
+        # Paging includes the bytes of the jobs before the page
+        _, _, left_previous_page, nzo_list, _, _ = q.queue_info(start=1, limit=2)
+        assert names(nzo_list) == ["job-Show.S01E01", "job-Other"]
+        assert left_previous_page == job_size
+
+        assert names(q.queue_info(search="show.s01")[3]) == ["job-Show.S01E01", "job-Show.S01E02"]
+        assert names(q.queue_info(categories=["tv"], priorities=[LOW_PRIORITY])[3]) == ["job-Show.S01E02"]
+        assert names(q.queue_info(nzo_ids=[jobs[3].nzo_id, "unknown"])[3]) == ["job-Other"]
+        _, _, left_previous_page, nzo_list, _, matched = q.queue_info(search="show", start=1, limit=1)
+        assert names(nzo_list) == ["job-Show.S01E02"]
+        assert left_previous_page == 3 * job_size
+        assert matched == 2
+
+        # Paused jobs are not counted, the status is not taken from the index
+        q.pause_nzo(jobs[1].nzo_id)
+        bytes_total, bytes_left, _, nzo_list, size, _ = q.queue_info(statuses=[Status.PAUSED])
+        assert names(nzo_list) == ["job-Movie"]
+        assert (bytes_total, bytes_left, size) == (3 * job_size, 3 * job_size, 3)
+        assert q.remaining() == 3 * job_size
+
+        # Downloaded articles only update the totals of their job
+        index = q.index()
+        article = list(jobs[0].files[0].articles)[0]
+        q.register_article(article)
+        bytes_total, bytes_left, left_previous_page, _, _, _ = q.queue_info(start=2)
+        assert q.index() is index
+        assert (bytes_total, bytes_left) == (3 * job_size, 3 * job_size - article.bytes)
+        assert left_previous_page == 2 * job_size - article.bytes
+        assert q.remaining() == 3 * job_size - article.bytes
+
+        # Changes made through the queue update the index
+        q.change_name(jobs[3].nzo_id, "Show.S01E03")
+        assert names(q.queue_info(search="show")[3]) == ["job-Show.S01E01", "Show.S01E03", "job-Show.S01E02"]
+        q.remove(jobs[0].nzo_id, cleanup=False)
+        assert names(q.queue_info(search="show")[3]) == ["Show.S01E03", "job-Show.S01E02"]
+
+    def test_job_status_changes_version(self):
+        q = NzbQueue()
+        nzo = make_dummy_nzo("a", files=1, articles=1)
+        q.add(nzo, save=False)
+        with mock.patch.object(sabnzbd, "NzbQueue", q, create=True):
+            # Changes made directly on the job, for example by the Assembler
+            version = q.version
+            nzo.pause()
+            assert q.version > version
+            assert q.queue_info()[4] == 0
+
+            # Setting the same status is not a change
+            version = q.version
+            nzo.status = Status.PAUSED
+            assert q.version == version
+
     @pytest.mark.skipif(not sabnzbd.WINDOWS, reason="Legacy 3.0.0 queue fixture contains Windows-specific paths")
     def test_restore_legacy_queue_format_3_0_0(self, tmp_path, monkeypatch):
         fixture_path = Path(SAB_DATA_DIR) / "test_3_0_0_queue_format"
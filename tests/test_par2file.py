@@ -123,3 +123,64 @@ class TestPar2Parsing:
             assert md5of16k == {b"'ky\xd7\xd1\xd3wF\xed\x9c\xf7\x9b\x90\x93\x106": "rss_feed_test.xml"}
             assert "Par2-creator of basic_16k.par2 is: QuickPar 0.9" in caplog.text
             caplog.clear()
+
+    @pytest.mark.parametrize(
+        "par2_file",
+        [
+            os.path.join(SAB_DATA_DIR, "par2file", "basic_16k.par2"),
+            os.path.join(SAB_DATA_DIR, "test_win_unicode", "frènch_german_demö.rar.vol0+1.par2"),
+            os.path.join(SAB_DATA_DIR, "unicode_rar", "我喜欢编程.par2"),
+        ],
+    )
+    @pytest.mark.parametrize("chunk_size", [1, 7, 100, 4096])
+    def test_par2_parser_chunks(self, par2_file, chunk_size):
+        with open(par2_file, "rb") as f:
+            data = f.read()
+
+        # Feed the data out of order, the parser has to wait for the gaps to be filled
+        parser = Par2Parser(os.path.basename(par2_file), len(data))
+        chunks = [(offset, data[offset : offset + chunk_size]) for offset in range(0, len(data), chunk_size)]
+        for offset, chunk in chunks[1::2] + chunks[::2]:
+            parser.feed(chunk, offset)
+        assert parser.offset == len(data)
+        assert parser.parsed_file(par2_file)
+        assert parser.get_table({}) == parse_par2_file(par2_file, {})
+
+        # The file should not be opened again when the parser saw all data
+        with mock.patch("builtins.open") as mock_open:
+            assert parse_par2_file(par2_file, {}, parser)[0] == parser.set_id
+            mock_open.assert_not_called()
+
+    def test_par2_parser_recovery_blocks(self):
+        par2_file = os.path.join(SAB_DATA_DIR, "test_win_unicode", "frènch_german_demö.rar.vol0+1.par2")
+        parser = Par2Parser(os.path.basename(par2_file))
+        with open(par2_file, "rb") as f:
+            parser.feed(f.read())
+        assert parser.recovery_blocks == 1
+        assert analyse_par2("obfuscated", recovery_blocks=parser.recovery_blocks) == ("obfuscated", 0, 1)
+        assert parser.counted_recovery_blocks(par2_file) == 1
+
+        # Large files are not parsed after the listings, so the recovery blocks are not all counted
+        parser = Par2Parser(os.path.basename(par2_file), int(SCAN_LIMIT) + 1)
+        with open(par2_file, "rb") as f:
+            parser.feed(f.read())
+        assert parser.done
+        assert parser.counted_recovery_blocks(par2_file) is None
+        assert analyse_par2("obfuscated", par2_file, recovery_blocks=None) == ("obfuscated", 0, 1)
+
+    def test_par2_parser_incomplete(self):
+        par2_file = os.path.join(SAB_DATA_DIR, "par2file", "basic_16k.par2")
+        with open(par2_file, "rb") as f:
+            data = f.read()
+
+        # Missing the start of the file
+        parser = Par2Parser(os.path.basename(par2_file))
+        parser.feed(data[100:], 100)
+        assert parser.offset == 0
+        assert not parser.parsed_file(par2_file)
+
+        # Too much data out of order
+        parser.feed(bytes(int(SCAN_LIMIT)), len(data))
+        assert parser.failed
+        parser.feed(data[:100], 0)
+        assert not parser.parsed_file(par2_file)
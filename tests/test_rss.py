@@ -20,8 +20,10 @@ tests.test_misc - Testing functions in misc.py
 """
 
 import datetime
+import threading
 import time
 from typing import Optional
+from unittest import mock
 
 import configobj
 import pytest
@@ -192,6 +194,67 @@ class TestRSS:
         adjusted_date = datetime.datetime(2025, 5, 20, 18, 21, 1) - datetime.timedelta(seconds=time.timezone)
         assert job_data["age"] == adjusted_date
 
+    def test_rss_incremental(self, httpserver: HTTPServer):
+        httpserver.expect_request("/rss_link.xml").respond_with_handler(httpserver_handler_data_dir)
+
+        feed_name = "TestFeedIncremental"
+        self.setup_rss(feed_name, httpserver.url_for("/rss_link.xml"))
+
+        rss_obj = rss.RSSReader()
+        rss_obj.run_feed(feed_name, incremental=True)
+        assert rss_obj.jobs[feed_name]["http://LINK"]["status"] == "G"
+
+        # Conditional request for the feed that was not modified
+        with mock.patch.object(rss.NormalisedEntry, "from_feed_entry") as from_feed_entry:
+            assert rss_obj.run_feed(feed_name, incremental=True) == ""
+            assert httpserver.log[-1][1].status_code == 304
+            assert not from_feed_entry.called
+
+            # Modified feed, but the entry was already evaluated
+            rss_obj.feed_states[feed_name].validators.clear()
+            rss_obj.run_feed(feed_name, incremental=True)
+            assert httpserver.log[-1][1].status_code == 200
+            assert not from_feed_entry.called
+        assert rss_obj.jobs[feed_name]["http://LINK"]["status"] == "G"
+
+        # Other filters have to be evaluated again
+        sabnzbd.config.get_rss()[feed_name].filters.set([["", "", "", "R", "TITLE", DEFAULT_PRIORITY, "1"]])
+        rss_obj.run_feed(feed_name, incremental=True)
+        assert rss_obj.jobs[feed_name]["http://LINK"]["status"] == "B"
+
+        # Other runs don't use or keep the state
+        rss_obj.run_feed(feed_name)
+        assert feed_name not in rss_obj.feed_states
+
+    def test_rss_run_per_host(self):
+        sabnzbd.config.CFG_OBJ = configobj.ConfigObj()
+        for feed_name, feed_url in (
+            ("FeedA1", "https://a.example.org/rss?t=1"),
+            ("FeedB", "https://b.example.org/rss"),
+            ("FeedA2", "https://a.example.org/rss?t=2"),
+            ("Disabled", "https://c.example.org/rss"),
+        ):
+            sabnzbd.config.ConfigRSS(feed_name, {"uri": feed_url, "enable": feed_name != "Disabled"})
+
+        threads_used = {}
+
+        def fake_run_feed(feed: str, **kwargs):
+            assert kwargs["incremental"]
+            threads_used[feed] = threading.current_thread().name
+            return ""
+
+        rss_obj = rss.RSSReader()
+        with mock.patch.object(rss_obj, "run_feed", side_effect=fake_run_feed) as run_feed, mock.patch.object(
+            rss_obj, "save"
+        ) as save, mock.patch.object(rss, "RSS_HOST_DELAY", 0), mock.patch.object(sabnzbd, "PAUSED_ALL", False):
+            rss_obj.run()
+
+        # Feeds of the same host are read after each other by the same thread
+        assert [call.args[0] for call in run_feed.call_args_list if call.args[0] != "FeedB"] == ["FeedA1", "FeedA2"]
+        assert threads_used["FeedA1"] == threads_used["FeedA2"]
+        assert "Disabled" not in threads_used
+        save.assert_called_once()
+
     @pytest.mark.parametrize(
         "defaults, filters, title, category, size, season, episode, expected_match",
         [
@@ -352,3 +415,48 @@ class TestRSS:
         result_match = feed_cfg.evaluate(title=title, category=category, size=size, season=season, episode=episode)
 
         assert result_match == expected_match
+
+    @pytest.mark.parametrize(
+        "title, category, size",
+        [
+            ("Show.One.S01E01.720p", "TV > HD", 1000),
+            ("Show.Two.S02E03.1080p", "TV > HD", 1000),
+            ("Show.Two.S02E03.480p", "TV > SD", 1000),
+            ("Show.Three.S01E01.SAMPLE", None, 1000),
+            ("Show.Three.S01E01.2160p", None, 10**9),
+            ("Other.Show.S05E06.720p", "TV > HD", 1000),
+            ("Movie.2020.1080p", "Movies", 1000),
+        ],
+    )
+    def test_feedconfig_rule_blocks(self, title, category, size):
+        filters = [
+            ("", "", "", "R", "*sample*", "", "1"),
+            ("", "", "", "A", "show.one*", "", "1"),
+            ("", "", "", "A", "re:^show\\.two.*1080p", "", "1"),
+            ("", "", "", "A", "re:(show)\\.three.*\\1", "", "1"),  # Backreference
+            ("", "", "", "C", "tv*", "", "1"),
+            ("", "", "", "<", "500M", "", "1"),
+            ("", "", "", "R", "*480p*", "", "1"),
+            ("", "", "", "A", "*show*", "", "0"),  # Disabled
+            ("", "", "", "A", "re:(?x) show . three", "", "1"),  # Can't be combined
+            ("", "", "", "M", "*720p*", "", "1"),
+            ("", "", "", "A", "*.s05e*", "", "1"),
+        ]
+        feed_name = "TestFeedRuleBlocks"
+        self.setup_rss(feed_name, "https://sabnzbd.org/tests/rss.xml", filters=filters)
+        feed_cfg = FeedConfig.from_config(sabnzbd.config.get_rss()[feed_name])
+        assert [len(block) for _, block in feed_cfg.rule_blocks] == [3, 1, 1, 1, 2, 1, 1]
+        assert [bool(prefilter) for prefilter, _ in feed_cfg.rule_blocks] == [
+            True,
+            False,
+            False,
+            False,
+            False,
+            False,
+            True,
+        ]
+
+        # Same result as checking all rules one by one
+        result_match = feed_cfg.evaluate(title=title, category=category, size=size, season=0, episode=0)
+        feed_cfg.rule_blocks = [(None, [(idx, rule)]) for idx, rule in enumerate(feed_cfg.rules) if rule.enabled]
+        assert result_match == feed_cfg.evaluate(title=title, category=category, size=size, season=0, episode=0)
@@ -98,6 +98,28 @@ class TestSortingFunctions:
                 else:
                     assert guess[key] == value
 
+    def test_guess_what_cached(self):
+        sorting.GUESS_CACHE.clear()
+        with mock.patch.object(sorting.guessit.api, "guessit", wraps=sorting.guessit.api.guessit) as guessit:
+            guess = sorting.guess_what("Test.Show.S01E02.720p.HDTV-GRP")
+            assert guess["episode"] == 2
+            guess["episode"] = 3
+
+            # Same name, also with a password
+            assert sorting.guess_what("Test.Show.S01E02.720p.HDTV-GRP")["episode"] == 2
+            assert sorting.guess_what("Test.Show.S01E02.720p.HDTV-GRP{{secret}}")["title"] == "Test Show"
+            assert guessit.call_count == 1
+        assert sorting.GUESS_CACHE.stats() == {"size": 1, "hits": 2, "misses": 1, "hit_rate": 66.7}
+
+    def test_guess_cache_size(self):
+        cache = sorting.GuessCache(2)
+        for name in ("a", "b", "c"):
+            cache.add(name, sorting.MatchesDict())
+            # Recently used stays in the cache
+            assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.stats()["size"] == 2
+
     @pytest.mark.parametrize("platform", ["linux", "macos", "win32"])
     @pytest.mark.parametrize(
         "path, result_unix, result_win",
@@ -20,6 +20,7 @@ tests.test_urlgrabber - Testing functions in urlgrabber.py
 """
 
 import json
+import threading
 import urllib.error
 import urllib.parse
 
@@ -198,3 +199,83 @@ class TestFilenameFromDispositionHeader:
     def test_filename_from_disposition_header(self, header, result):
         """Test the parsing of different disposition-headers."""
         assert urlgrabber.filename_from_content_disposition(header) == result
+
+
+class TestURLGrabberScheduling:
+    def test_delay_queue(self):
+        grabber = urlgrabber.URLGrabber()
+        now = time.time()
+        grabber.schedule("https://a/later", None, now - 1)
+        grabber.schedule("https://a/first", None, now - 10)
+        grabber.schedule("https://a/waiting", None, now + 60)
+        grabber.schedule("https://a/second", None, now - 5)
+        assert [grabber.next_due()[0] for _ in range(3)] == ["https://a/first", "https://a/second", "https://a/later"]
+
+        # Nothing else is due, so only stopping ends the wait
+        threading.Timer(0.2, grabber.stop).start()
+        assert grabber.next_due() is None
+
+    def test_retry_is_delayed(self):
+        grabber = urlgrabber.URLGrabber()
+        future_nzo = mock.Mock(url_tries=0, url_wait=None)
+        grabber.add("https://a/retry", future_nzo, when=60)
+        assert future_nzo.url_tries == 1
+        assert grabber.delayed[0][0] == future_nzo.url_wait
+
+    def test_host_limit(self):
+        grabber = urlgrabber.URLGrabber()
+        hosts = ("a", "b")
+        urls = [
+            ("https://%s/%d" % (host, n), mock.Mock(url_wait=None, status=Status.GRABBING))
+            for n in range(6)
+            for host in hosts
+        ]
+        lock = threading.Lock()
+        active = {host: 0 for host in hosts}
+        most_active = {host: 0 for host in hosts}
+        grabbed = []
+
+        def grab(url, future_nzo):
+            host = urllib.parse.urlparse(url).hostname
+            with lock:
+                active[host] += 1
+                most_active[host] = max(most_active[host], active[host])
+            time.sleep(0.05)
+            with lock:
+                active[host] -= 1
+                grabbed.append(url)
+
+        with mock.patch.object(sabnzbd, "NzbQueue", mock.Mock(**{"get_urls.return_value": urls}), create=True):
+            with mock.patch.object(grabber, "grab", grab):
+                grabber.start()
+                for _ in range(100):
+                    if len(grabbed) == len(urls):
+                        break
+                    time.sleep(0.05)
+                grabber.stop()
+                grabber.join(timeout=5)
+
+        assert sorted(grabbed) == sorted(url for url, _ in urls)
+        assert most_active == {host: urlgrabber.URLGRABBER_HOST_LIMIT for host in hosts}
+        assert not grabber.host_active
+        assert not grabber.host_waiting
+
+    def test_empty_header_value(self, tmp_path):
+        grabber = urlgrabber.URLGrabber()
+        future_nzo = mock.Mock(removed_from_queue=False, nzo_info={}, cat=None, duplicate=None)
+        fetch_request = mock.Mock(headers={"X-Frame-Options": "", "X-DNZB-Name": "Indexer name"})
+        os.mkdir(os.path.join(tmp_path, urlgrabber.FUTURE_Q_FOLDER))
+
+        with mock.patch.object(urlgrabber, "_build_request", return_value=fetch_request), mock.patch.object(
+            urlgrabber, "_analyse", return_value=(fetch_request, "", True, 0, b"<nzb></nzb>")
+        ) as analyse, mock.patch.object(
+            sabnzbd.nzbparser, "add_nzbfile", return_value=(urlgrabber.AddNzbFileResult.OK, [])
+        ) as add_nzbfile, mock.patch.object(
+            cfg.admin_dir, "get_path", return_value=str(tmp_path)
+        ):
+            grabber.grab("https://a/nzb", future_nzo)
+
+        # Empty values are skipped, the rest of the headers is still used
+        analyse.assert_called_once()
+        fetch_request.close.assert_called_once()
+        assert add_nzbfile.call_args.args[0] == os.path.join(tmp_path, urlgrabber.FUTURE_Q_FOLDER, "Indexer name.nzb")